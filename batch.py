@@ -0,0 +1,8 @@
+# batch.py —— 会话批处理命令行入口（不启动界面）
+# 例：python batch.py ~/Documents/RecordTypeSessions validate duration markers -j 8
+# 例：python batch.py ~/Documents/RecordTypeSessions split --dest ~/Desktop/clips
+import sys
+from src.recordtype.batch import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,18 @@
 # launcher.py —— 打包入口
+import time
+T0 = time.perf_counter()          # 启动计时起点（--profile-startup）
 import tkinter as tk
-from src.recordtype.ui import MainWindow
+from src.recordtype.startup import StartupProfile, profiling_requested
 
 def main():
+    profile = StartupProfile(profiling_requested(), T0)
+    profile.mark("import tkinter")
+    from src.recordtype.ui import MainWindow   # 界面模块在计时开始后再导入
+    profile.mark("import ui")
     root = tk.Tk()
-    MainWindow(root)
+    profile.mark("Tk root")
+    MainWindow(root, profile=profile)
+    profile.mark("MainWindow")
     root.mainloop()
 
 if __name__ == "__main__":
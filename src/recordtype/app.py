@@ -1,11 +1,18 @@
+import time
+T0 = time.perf_counter()          # 启动计时起点（--profile-startup）
 import tkinter as tk
-from .ui import MainWindow
+from .startup import StartupProfile, profiling_requested
 
 def main():
+    profile = StartupProfile(profiling_requested(), T0)
+    profile.mark("import tkinter")
+    from .ui import MainWindow
+    profile.mark("import ui")
     root = tk.Tk()
-    MainWindow(root)
+    profile.mark("Tk root")
+    MainWindow(root, profile=profile)
+    profile.mark("MainWindow")
     root.mainloop()
 
 if __name__ == "__main__":
     main()
-
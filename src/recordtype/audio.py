@@ -1,19 +1,30 @@
 # src/recordtype/audio.py
-import queue
-import wave
 import threading
 import time
 from typing import List, Tuple, Optional
 
-import sounddevice as sd
+import numpy as np
+
+from .ringbuffer import ByteRing
+from .wavio import WavSink, SegmentedWavSink
+from .codec import make_sink
+from .peaks import PeakWriter
+from .vad import VoiceDetector, save_speech
+from .telemetry import RecorderTelemetry
+from .devices import enumerate_inputs, device_label
+from .resample import Resampler
+
+MAX_CAPTURE_CHANNELS = 8    # 按设备原生声道数打开时的上限
 
 
 class AudioRecorder:
     """
     录音器：
     - 支持选择输入设备（index 或 None）
-    - 更稳健的设备枚举（WASAPI -> DirectSound -> MME 逐级回退）
+    - 设备枚举（WASAPI -> DirectSound -> MME 逐级回退，见 devices.py）
     - 16-bit PCM 写 WAV（后台线程写入，避免 UI 卡顿）
+    - 回调只把数据拷进预分配的环形缓冲；写线程攒成大块落盘，WAV 头定期回填
+    - samplerate / channels 是落盘格式；设备按原生采样率与声道数打开，写线程下混 + 重采样（见 resample.py）
     - 提供 elapsed_hms() 与 elapsed_seconds() 供 UI / 锚点使用
     """
 
@@ -23,15 +34,40 @@ class AudioRecorder:
         channels: int = 1,
         sample_width: int = 2,  # 16-bit
         device: Optional[int] = None,
+        ring_seconds: float = 4.0,
+        write_block_seconds: float = 0.5,
+        header_patch_seconds: float = 5.0,
+        segment_seconds: Optional[float] = None,
+        codec: Optional[str] = None,
+        native_capture: bool = True,
     ):
         self.sr = samplerate
         self.channels = channels
         self.sample_width = sample_width
         self.device = device  # 可为 None 或 输入设备索引(int)
+        self.native_capture = native_capture  # False 时直接按落盘格式打开设备（由驱动转换）
+        self.in_sr = samplerate               # 实际打开设备的采样率 / 声道数
+        self.in_channels = channels
+        self.resampler: Optional[Resampler] = None
+        self.capture_stats: dict = {}         # 上次录音的采集格式与转换统计
+
+        # 缓冲/落盘参数
+        self.ring_seconds = ring_seconds                  # 环形缓冲容量（秒）
+        self.write_block_seconds = write_block_seconds    # 写线程每次合并写入的目标长度（秒）
+        self.header_patch_seconds = header_patch_seconds  # WAV 头回填间隔（秒）
+        self.segment_seconds = segment_seconds            # 非 None 时分段落盘（audio_path 为目录）
+        self.codec = codec                                # 非 None 时经编码器压缩落盘（仅单文件模式）
+        self.sink_stats: dict = {}                        # 上次录音结束时的编码统计
 
-        self.stream: Optional[sd.RawInputStream] = None
-        self.wave_file: Optional[wave.Wave_write] = None
-        self.q: "queue.Queue[bytes]" = queue.Queue()
+        self.stream = None          # sounddevice.RawInputStream
+        self.sink = None            # WavSink / SegmentedWavSink
+        self.peaks: Optional[PeakWriter] = None
+        self.vad: Optional[VoiceDetector] = None
+        self.speech_path: Optional[str] = None
+        self.speech_segments: list = []                   # 上次录音检测到的语音段（秒）
+        self.telemetry: Optional[RecorderTelemetry] = None
+        self.telemetry_summary: dict = {}                 # 上次录音结束时的健康统计
+        self.ring: Optional[ByteRing] = None
         self._writer: Optional[threading.Thread] = None
 
         self.is_recording: bool = False
@@ -44,42 +80,12 @@ class AudioRecorder:
     @staticmethod
     def list_input_devices() -> List[Tuple[int, str]]:
         """
-        返回可用输入设备列表：[(index, "index - name (HostAPI)"), ...]
-        策略：优先 Windows WASAPI -> Windows DirectSound -> MME；若失败则兜底。
+        返回可用输入设备列表：[(index, "name (HostAPI)"), ...]
+        策略：优先 Windows WASAPI -> Windows DirectSound -> MME；若都没有则返回全部输入设备。
+        不改动 sounddevice 的全局默认值；界面使用 devices.DeviceRegistry（带缓存与插拔检测）。
         """
-        def _try_with_hostapi(name: str):
-            try:
-                has = sd.query_hostapis()
-                idx = next((i for i, h in enumerate(has) if h.get("name") == name), None)
-                if idx is None:
-                    return []
-                sd.default.hostapi = idx  # 仅影响本进程
-                devs = sd.query_devices()
-                out = []
-                for i, d in enumerate(devs):
-                    if d.get("hostapi") == idx and d.get("max_input_channels", 0) > 0:
-                        out.append((i, f"{i} - {d.get('name', 'Unknown')} ({name})"))
-                return out
-            except Exception:
-                return []
-
-        # 分别尝试三种常见 HostAPI
-        for api in ("Windows WASAPI", "Windows DirectSound", "MME"):
-            out = _try_with_hostapi(api)
-            if out:
-                return out
-
-        # 兜底：不限定 HostAPI，返回所有可用输入设备
-        try:
-            devs = sd.query_devices()
-            return [
-                (i, f"{i} - {d.get('name', 'Unknown')}")
-                for i, d in enumerate(devs)
-                if d.get("max_input_channels", 0) > 0
-            ]
-        except Exception as e:
-            # 抛给上层，由 UI 负责展示错误信息
-            raise e
+        import sounddevice as sd    # 首次使用才导入：导入时会初始化 PortAudio，较慢
+        return [(d.index, device_label(d)) for d in enumerate_inputs(sd)]
 
     def set_device(self, device_index: Optional[int]):
         """设置输入设备索引（None 表示让 PortAudio 选择默认设备）"""
@@ -89,31 +95,81 @@ class AudioRecorder:
     # 录音
     # ----------------------------------------------------------------------
     def _callback(self, indata, frames, time_info, status):
-        # status 非空表示底层有提醒/溢出等，不在这里阻塞写日志
-        if status:
-            # 可在 UI 的 logger 里记录 status
-            pass
-        # RawInputStream + dtype=int16 -> indata 已是 bytes-like；转 bytes 入队
-        self.q.put(bytes(indata))
-
-    def start(self, audio_path: str):
-        """开始录音（异步写入 WAV）。"""
+        # status 非空表示底层有提醒/溢出等：只计数，由 UI 定期写日志，不在回调里做 I/O
+        self.telemetry.on_callback(frames, status)
+        # RawInputStream + dtype=int16 -> indata 已是 bytes-like；直接拷进环形缓冲，满了丢弃并计数
+        self.ring.write(indata)
+
+    def frame_bytes(self) -> int:
+        """落盘格式每帧字节数。"""
+        return self.channels * self.sample_width
+
+    def _capture_format(self, sd) -> Tuple[int, int]:
+        """设备原生的 (采样率, 声道数)；关闭 native_capture 或查询失败时沿用落盘格式。"""
+        if not self.native_capture:
+            return self.sr, self.channels
+        try:
+            info = sd.query_devices(self.device, "input")
+            sr = int(round(float(info["default_samplerate"]))) or self.sr
+            ch = max(1, min(int(info["max_input_channels"]), MAX_CAPTURE_CHANNELS))
+        except Exception:
+            return self.sr, self.channels
+        return sr, ch
+
+    def ring_stats(self) -> dict:
+        """环形缓冲统计：容量、当前占用、峰值、溢出次数与丢弃字节。"""
+        r = self.ring
+        if r is None:
+            return {"capacity": 0, "used": 0, "high_water": 0, "overflows": 0, "dropped_bytes": 0}
+        return {"capacity": r.capacity, "used": r.available(), "high_water": r.high_water,
+                "overflows": r.overflows, "dropped_bytes": r.dropped_bytes}
+
+    def telemetry_snapshot(self) -> dict:
+        """录音健康统计快照（回调/写线程计数 + 环形缓冲统计）；未开始录音时为空。"""
+        if self.telemetry is None:
+            return {}
+        return self.telemetry.snapshot(self.ring_stats())
+
+    def start(self, audio_path: str, peaks_path: Optional[str] = None, speech_path: Optional[str] = None):
+        """开始录音（异步写入 WAV）；给出 peaks_path / speech_path 时同时生成波形峰值 / 语音段文件。"""
         self.audio_path = audio_path
-        # 准备 WAV 文件
-        self.wave_file = wave.open(audio_path, "wb")
-        self.wave_file.setnchannels(self.channels)
-        self.wave_file.setsampwidth(self.sample_width)
-        self.wave_file.setframerate(self.sr)
-
-        # 打开输入流
-        self.stream = sd.RawInputStream(
-            samplerate=self.sr,
-            channels=self.channels,
-            dtype="int16",
-            callback=self._callback,
-            blocksize=0,          # 由后端决定块大小，通常延迟更低
-            device=self.device,   # 可为 None 或 具体 index
-        )
+        self.telemetry_summary = {}
+        self.capture_stats = {}
+        # 准备 WAV 文件：先写占位头，长度在写线程里定期回填
+        self.sink_stats = {}
+        self.sink = self._open_sink(audio_path)
+        self.peaks = PeakWriter(peaks_path, self.sr) if peaks_path else None
+        self.vad = VoiceDetector(self.sr) if speech_path else None
+        self.speech_path = speech_path
+        self.speech_segments = []
+
+        # 打开输入流：优先用设备原生格式（驱动不做转换）；设备不接受时退回落盘格式
+        import sounddevice as sd
+
+        def open_stream(sr, ch):
+            return sd.RawInputStream(
+                samplerate=sr,
+                channels=ch,
+                dtype="int16",
+                callback=self._callback,
+                blocksize=0,          # 由后端决定块大小，通常延迟更低
+                device=self.device,   # 可为 None 或 具体 index
+            )
+
+        fmt = self._capture_format(sd)
+        try:
+            self.stream = open_stream(*fmt)
+        except Exception:
+            if fmt == (self.sr, self.channels): raise
+            fmt = (self.sr, self.channels)
+            self.stream = open_stream(*fmt)
+        self.in_sr, self.in_channels = fmt
+        # 环形缓冲与回调统计按设备格式；格式不同时写线程转换后再落盘
+        fb = self.in_channels * self.sample_width
+        self.ring = ByteRing(int(self.in_sr * self.ring_seconds) * fb, align=fb)
+        self.telemetry = RecorderTelemetry(self.in_sr, fb)
+        self.resampler = None if fmt == (self.sr, self.channels) else \
+            Resampler(self.in_sr, self.sr, self.in_channels, self.channels)
         self.stream.start()
 
         self.is_recording = True
@@ -123,15 +179,48 @@ class AudioRecorder:
         self._writer = threading.Thread(target=self._writer_worker, daemon=True)
         self._writer.start()
 
+    def _open_sink(self, audio_path: str):
+        """按分段 / 编码设置创建写入器；子类可以包一层（多设备录音的对齐写入）。"""
+        if self.segment_seconds:
+            return SegmentedWavSink(audio_path, self.channels, self.sr, self.sample_width,
+                                    segment_seconds=self.segment_seconds)
+        if self.codec:
+            return make_sink(self.codec, audio_path, self.channels, self.sr, self.sample_width)
+        return WavSink(audio_path, self.channels, self.sr, self.sample_width)
+
     def _writer_worker(self):
-        """后台线程：把队列里的音频块写入 WAV。"""
-        while self.is_recording or not self.q.empty():
-            try:
-                chunk = self.q.get(timeout=0.2)
-                if self.wave_file:
-                    self.wave_file.writeframes(chunk)
-            except queue.Empty:
-                continue
+        """后台线程：从环形缓冲合并取出大块写入 WAV，按间隔回填头部长度。"""
+        ring, sink, peaks, vad, tel = self.ring, self.sink, self.peaks, self.vad, self.telemetry
+        rs = self.resampler
+        block = bytearray(max(ring.align, int(self.in_sr * self.write_block_seconds) * ring.align))
+        view = memoryview(block)
+        poll = max(0.01, self.write_block_seconds / 2)
+        last_patch = time.perf_counter()
+        while self.is_recording or ring.available():
+            if self.is_recording and ring.available() < len(block):
+                time.sleep(poll)
+                if ring.available() == 0:
+                    continue
+            n = ring.read_into(block)
+            if n:
+                t0 = time.perf_counter()
+                if rs is not None:
+                    fr = rs.process(np.frombuffer(view[:n], dtype="<i2").reshape(-1, self.in_channels))
+                    data = memoryview(fr).cast("B")
+                else:
+                    fr, data = None, view[:n]
+                sink.write(data)
+                tel.on_write(data.nbytes, time.perf_counter() - t0)
+                if peaks is not None or vad is not None:
+                    if fr is None:
+                        fr = np.frombuffer(data, dtype="<i2").reshape(-1, self.channels)
+                    if peaks is not None: peaks.feed(fr)
+                    if vad is not None: vad.feed(fr)
+            now = time.perf_counter()
+            if now - last_patch >= self.header_patch_seconds:
+                sink.patch()
+                if peaks is not None: peaks.flush()
+                last_patch = now
 
     def elapsed_hms(self) -> str:
         """录音已进行时间（HH:MM:SS）。"""
@@ -168,9 +257,25 @@ class AudioRecorder:
             self._writer.join(timeout=2.0)
         self._writer = None
 
-        if self.wave_file:
-            self.wave_file.close()
-            self.wave_file = None
+        if self.sink:
+            self.sink.close()
+            if hasattr(self.sink, "stats"):
+                self.sink_stats = self.sink.stats()
+            self.sink = None
+        if self.peaks:
+            self.peaks.close()
+            self.peaks = None
+        if self.telemetry:
+            self.telemetry_summary = self.telemetry_snapshot()
+        self.capture_stats = self.resampler.stats() if self.resampler else \
+            {"device_sample_rate": self.in_sr, "device_channels": self.in_channels}
+        self.resampler = None
+        if self.vad:
+            self.speech_segments = self.vad.finish()
+            try:
+                save_speech(self.speech_path, self.speech_segments, self.sr)
+            finally:
+                self.vad = None
 
         self._start_perf = None
         return round(duration, 3)
@@ -1,27 +1,154 @@
-import threading, time
+import os, json, time, hashlib
+
+SNAPSHOT_NAME = "_autosave.md"
+JOURNAL_NAME = "_autosave.journal"
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _common_prefix(a, b, n):
+    """a、b 前 n 个字符中相同前缀的长度：对切片相等做二分（比较在 C 里进行），只比较尚未确认的部分。"""
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]: lo = mid
+        else: hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, n):
+    """同上，相同后缀的长度（不超过 n）。"""
+    la, lb = len(a), len(b)
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - lo] == b[lb - mid:lb - lo]: lo = mid
+        else: hi = mid - 1
+    return lo
+
+
+def _single_edit(old, new):
+    """把 old -> new 归结为一次替换：(起始偏移, 删除长度, 插入文本)。"""
+    n = min(len(old), len(new))
+    i = _common_prefix(old, new, n)
+    j = _common_suffix(old, new, n - i)
+    return i, len(old) - i - j, new[i:len(new) - j]
+
+
+def load_autosave(session_dir):
+    """
+    恢复自动保存的笔记：快照 + 重放日志。没有快照返回 None。
+    日志首行记录它所基于的快照摘要，对不上（快照已更新）就只用快照；
+    崩溃时写了一半的末行直接忽略。
+    """
+    snap = os.path.join(session_dir, SNAPSHOT_NAME)
+    if not os.path.exists(snap):
+        return None
+    text = open(snap, "r", encoding="utf-8").read()
+    jpath = os.path.join(session_dir, JOURNAL_NAME)
+    if not os.path.exists(jpath):
+        return text
+    with open(jpath, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    try:
+        head = json.loads(lines[0])
+    except (ValueError, IndexError):
+        return text
+    if head.get("base") != _digest(text):
+        return text
+    for line in lines[1:]:
+        try:
+            o, d, ins = json.loads(line)
+        except (ValueError, TypeError):
+            break
+        text = text[:o] + ins + text[o + d:]
+    return text
+
 
 class AutoSaver:
-    def __init__(self, get_text_fn, save_fn, interval_sec=30):
-        self.get_text = get_text_fn
-        self.save = save_fn
+    """
+    在 Tk 线程里用 root.after 驱动的自动保存：
+    - Text 的 <<Modified>> 事件里调用 notify_modified() 标记有改动
+    - 每 journal_ms 检查一次，有改动就把这次编辑（单段替换）追加到日志
+    - 每 interval_sec 内容摘要有变化时才写完整快照（临时文件 + 改名），随后重置日志
+    崩溃最多丢失约 journal_ms 的输入，平时也不用反复整篇重写。
+    """
+
+    def __init__(self, root, text, dir_fn, save_fn, interval_sec=30, journal_ms=1000):
+        self.root = root
+        self.text = text
+        self.dir_fn = dir_fn          # 返回当前会话目录（None 表示不保存）
+        self.save = save_fn           # 原子写文本：save_fn(path, text)
         self.interval = interval_sec
-        self._stop = threading.Event()
-        self._t = None
+        self.journal_ms = journal_ms
+        self._after = None
+        self._last_text = ""
+        self._digest = None
+        self._last_snapshot = 0.0
+        self._journal = None
+        self._dirty = False
+
+    def notify_modified(self):
+        self._dirty = True
+
+    def _read(self):
+        return self.text.get("1.0", "end-1c")
+
+    def _snapshot(self, d, cur):
+        self.save(os.path.join(d, SNAPSHOT_NAME), cur)
+        self._digest = _digest(cur)
+        self._last_snapshot = time.monotonic()
+        # 快照已包含全部改动：日志从这个快照重新开始
+        if self._journal: self._journal.close()
+        self._journal = open(os.path.join(d, JOURNAL_NAME), "w", encoding="utf-8")
+        self._journal.write(json.dumps({"base": self._digest}) + "\n")
+        self._journal.flush()
 
     def start(self):
-        self._stop.clear()
-        self._t = threading.Thread(target=self._loop, daemon=True)
-        self._t.start()
-
-    def _loop(self):
-        while not self._stop.is_set():
-            try:
-                self.save(self.get_text())
-            except Exception:
-                pass
-            time.sleep(self.interval)
+        self.stop()
+        d = self.dir_fn()
+        if not d: return
+        self._last_text = self._read()
+        self._dirty = False
+        try:
+            self._snapshot(d, self._last_text)
+        except Exception:
+            pass
+        self._after = self.root.after(self.journal_ms, self._tick)
+
+    def flush(self):
+        """立即把未记录的改动写入日志；到了间隔且内容有变化时写快照。"""
+        d = self.dir_fn()
+        if not d or self._journal is None: return
+        if self._dirty:
+            self._dirty = False
+            cur = self._read()
+            if cur != self._last_text:
+                o, dl, ins = _single_edit(self._last_text, cur)
+                self._journal.write(json.dumps([o, dl, ins], ensure_ascii=False) + "\n")
+                self._journal.flush()
+                self._last_text = cur
+        if time.monotonic() - self._last_snapshot >= self.interval:
+            if _digest(self._last_text) != self._digest:
+                self._snapshot(d, self._last_text)
+            else:
+                self._last_snapshot = time.monotonic()
+
+    def _tick(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
+        self._after = self.root.after(self.journal_ms, self._tick)
 
     def stop(self):
-        self._stop.set()
-        if self._t and self._t.is_alive():
-            self._t.join(timeout=1.0)
+        if self._after:
+            try: self.root.after_cancel(self._after)
+            except Exception: pass
+            self._after = None
+        if self._journal:
+            try: self.flush()
+            except Exception: pass
+            self._journal.close(); self._journal = None
@@ -0,0 +1,306 @@
+# src/recordtype/batch.py
+"""
+会话批处理（不依赖 Tk / sounddevice）：对根目录下所有 session_* 执行维护操作。
+- validate  校验音频头（WAV / 分段 / .rtlc），--repair 时按文件实际大小修正
+- duration  由音频头算出时长与格式，写回 meta.json
+- markers   解析 notes.md 统计时间戳；由 anchors.json 重建缺失、损坏或条数不符的 anchors.bin
+- peaks     补建 / 补全 peaks.bin
+- speech    补算 speech.json
+- export    把会话目录复制到 --dest
+- split     在每个标记处切开录音，片段写到 --dest/<会话名>_clips/
+多个会话在 ProcessPoolExecutor 中并行；同时在途的任务数有上限，工作进程处理一定数量后重启、
+可限制地址空间，内存占用不随会话数增长。每完成一个会话向检查点文件追加一行 JSON，
+中断后重新运行会跳过已成功的会话。
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+OPERATIONS = ("validate", "duration", "markers", "peaks", "speech", "export", "split")
+CHECKPOINT_NAME = ".recordtype_batch.jsonl"
+TASKS_PER_CHILD = 200        # 每个工作进程处理这么多会话后重启，释放碎片化的内存
+INFLIGHT_PER_WORKER = 4      # 每个工作进程最多排队的任务数
+
+
+# ---------- 单个会话的操作（在工作进程中执行） ----------
+def _read_meta(session_dir):
+    try:
+        with open(os.path.join(session_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def op_validate(session_dir, repair=False, **_):
+    from .storage import session_audio_path, _audio_format_and_frames, _seal_segments
+    from .wavio import repair_wav_header, read_segment_index, list_segments, TRACKS_DIRNAME
+    from .codec import repair_rtlc
+    from .multitrack import repair_tracks
+    audio = session_audio_path(session_dir)
+    if audio is None:
+        raise FileNotFoundError("未找到音频")
+    repaired = False
+    if os.path.basename(os.path.normpath(audio)) == TRACKS_DIRNAME:
+        if repair: repaired = repair_tracks(audio)
+    elif os.path.isdir(audio):
+        _fmt, sealed = read_segment_index(audio)
+        unsealed = [n for n in list_segments(audio) if n not in sealed]
+        if unsealed and repair:
+            _seal_segments(audio); repaired = True
+        elif unsealed:
+            raise ValueError(f"{len(unsealed)} 个分段未封存")
+    elif audio.endswith(".rtlc"):
+        if repair: repaired = repair_rtlc(audio)
+    elif repair:
+        repaired = repair_wav_header(audio)
+    sr, ch, sw, nframes = _audio_format_and_frames(audio)
+    return {"audio": os.path.basename(audio), "sample_rate": sr, "channels": ch,
+            "sample_width": sw, "frames": nframes, "repaired": repaired}
+
+
+def op_duration(session_dir, **_):
+    from .storage import session_audio_path, _audio_format_and_frames, save_json
+    audio = session_audio_path(session_dir)
+    if audio is None:
+        raise FileNotFoundError("未找到音频")
+    sr, ch, sw, nframes = _audio_format_and_frames(audio)
+    duration = round(nframes / float(sr), 3)
+    meta = _read_meta(session_dir)
+    new = dict(meta)
+    new.update({"sample_rate": sr, "channels": ch, "sample_width": sw, "duration_seconds": duration})
+    new.setdefault("audio_path", audio)
+    if new != meta:
+        save_json(os.path.join(session_dir, "meta.json"), new)
+    return {"duration_seconds": duration, "changed": new != meta}
+
+
+def op_markers(session_dir, **_):
+    from array import array
+    from .notes import parse_notes_file, save_anchors, load_anchors_bin, ANCHORS_BIN
+    out = {"timestamps": 0, "anchors": 0, "rebuilt": False}
+    notes = os.path.join(session_dir, "notes.md")
+    if os.path.exists(notes):
+        out["timestamps"] = len(parse_notes_file(notes)[1])
+    js = os.path.join(session_dir, "anchors.json")
+    binp = os.path.join(session_dir, ANCHORS_BIN)
+    if os.path.exists(js):
+        with open(js, "r", encoding="utf-8") as f:
+            anchors = json.load(f)
+        out["anchors"] = len(anchors)
+        # save_anchors 先写 bin 再写 JSON，mtime 不能说明新旧；JSON 只保留 3 位小数，
+        # 所以只在 bin 缺失、损坏或条数不一致时从 JSON 重建
+        try:
+            stale = len(load_anchors_bin(binp)[0]) != len(anchors)
+        except (OSError, ValueError, struct.error):
+            stale = True
+        if stale:
+            save_anchors(session_dir, array("d", (float(a["t"]) for a in anchors)),
+                         array("i", (int(a["len"]) for a in anchors)))
+            out["rebuilt"] = True
+    return out
+
+
+def op_peaks(session_dir, **_):
+    from .storage import session_audio_path
+    from .peaks import PEAKS_FILENAME, build_peaks, finalize_peaks
+    path = os.path.join(session_dir, PEAKS_FILENAME)
+    if os.path.exists(path):
+        try:
+            return {"built": False, "finalized": finalize_peaks(path)}
+        except Exception:
+            os.remove(path)
+    audio = session_audio_path(session_dir)
+    if audio is None:
+        raise FileNotFoundError("未找到音频")
+    build_peaks(audio, path)
+    return {"built": True, "finalized": False}
+
+
+def op_speech(session_dir, force=False, **_):
+    from .vad import analyze_session
+    return {"segments": len(analyze_session(session_dir, force=force))}
+
+
+def op_export(session_dir, dest=None, **_):
+    from .storage import export_dir
+    if not dest:
+        raise ValueError("export 需要 --dest")
+    target = os.path.join(dest, os.path.basename(os.path.normpath(session_dir)))
+    if os.path.exists(target):
+        return {"target": target, "skipped": True}
+    return {"target": export_dir(session_dir, dest), "skipped": False}
+
+
+def op_split(session_dir, dest=None, **_):
+    from .clips import split_session
+    if not dest:
+        raise ValueError("split 需要 --dest")
+    # 与回放页“导出片段”一致写到 <会话名>_clips；export 写的 <会话名> 是会话副本，不能混入片段
+    target = os.path.join(dest, os.path.basename(os.path.normpath(session_dir)) + "_clips")
+    # 工作进程已按会话并行，这里每个会话只用两个写线程
+    return {"target": target, "clips": len(split_session(session_dir, target, workers=2))}
+
+
+_OPS = {"validate": op_validate, "duration": op_duration, "markers": op_markers,
+        "peaks": op_peaks, "speech": op_speech, "export": op_export, "split": op_split}
+
+
+def process_session(session_dir, ops, options):
+    """依次执行 ops；某项失败不影响其余各项。返回 {"session", "ok", "results", "errors", "seconds"}。"""
+    t0 = time.perf_counter()
+    results, errors = {}, {}
+    for op in ops:
+        try:
+            results[op] = _OPS[op](session_dir, **options)
+        except Exception as e:
+            errors[op] = f"{type(e).__name__}: {e}"
+    return {"session": session_dir, "ok": not errors, "results": results, "errors": errors,
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def _init_worker(max_memory_mb):
+    """工作进程初始化：POSIX 上限制地址空间，超出时该会话以 MemoryError 失败而不是拖垮整机。"""
+    if not max_memory_mb:
+        return
+    try:
+        import resource
+        limit = int(max_memory_mb) << 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+# ---------- 调度 ----------
+def list_sessions(root):
+    try:
+        return sorted(e.path for e in os.scandir(root) if e.name.startswith("session_") and e.is_dir())
+    except OSError:
+        return []
+
+
+def load_checkpoint(path, ops):
+    """读取检查点：返回用同一组操作成功处理过的会话集合。截断的最后一行忽略。"""
+    done = set()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try: rec = json.loads(line)
+                except ValueError: continue
+                if rec.get("ok") and rec.get("ops") == list(ops):
+                    done.add(rec["session"])
+    except OSError:
+        pass
+    return done
+
+
+def run_batch(root, ops, options=None, workers=None, checkpoint=None, restart=False,
+              max_memory_mb=None, progress=None, stop_event=None):
+    """
+    对 root 下所有会话执行 ops。checkpoint 为 None 时用 root/.recordtype_batch.jsonl。
+    progress(done, total, record) 每完成一个会话回调一次。返回 {"total", "skipped", "ok", "failed"}。
+    """
+    ops = [op for op in OPERATIONS if op in ops]
+    options = options or {}
+    checkpoint = checkpoint or os.path.join(root, CHECKPOINT_NAME)
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    sessions = list_sessions(root)
+    done = load_checkpoint(checkpoint, ops)
+    todo = [d for d in sessions if d not in done]
+    stats = {"total": len(sessions), "skipped": len(sessions) - len(todo), "ok": 0, "failed": 0}
+    workers = workers or os.cpu_count() or 1
+    kwargs = {"max_workers": workers, "initializer": _init_worker, "initargs": (max_memory_mb,)}
+    if sys.version_info >= (3, 11):
+        kwargs["max_tasks_per_child"] = TASKS_PER_CHILD
+    it = iter(todo)
+    with open(checkpoint, "a", encoding="utf-8") as ck, ProcessPoolExecutor(**kwargs) as pool:
+        pending = set()
+        def fill():
+            while len(pending) < workers * INFLIGHT_PER_WORKER:
+                if stop_event is not None and stop_event.is_set(): return
+                d = next(it, None)
+                if d is None: return
+                pending.add(pool.submit(process_session, d, ops, options))
+        fill()
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                try:
+                    rec = fut.result()
+                except Exception as e:   # 工作进程崩溃（BrokenProcessPool 等）
+                    raise RuntimeError(f"工作进程异常退出：{e}") from e
+                rec["ops"] = ops
+                ck.write(json.dumps(rec, ensure_ascii=False) + "\n"); ck.flush()
+                stats["ok" if rec["ok"] else "failed"] += 1
+                if progress:
+                    progress(stats["skipped"] + stats["ok"] + stats["failed"], stats["total"], rec)
+            fill()
+    return stats
+
+
+# ---------- 命令行 ----------
+class ConsoleProgress:
+    """stderr 上的一行进度：完成数、速率、预计剩余时间；失败的会话单独打印。"""
+
+    def __init__(self, skipped, interval=0.5, stream=sys.stderr):
+        self.skipped = skipped
+        self.interval = interval
+        self.stream = stream
+        self.t0 = time.perf_counter()
+        self.last = 0.0
+        self.failed = 0
+
+    def __call__(self, done, total, rec):
+        if not rec["ok"]:
+            self.failed += 1
+            self.stream.write(f"\r失败 {rec['session']}: {rec['errors']}\n")
+        now = time.perf_counter()
+        if now - self.last < self.interval and done < total:
+            return
+        self.last = now
+        rate = (done - self.skipped) / max(1e-6, now - self.t0)
+        eta = (total - done) / rate if rate > 0 else 0
+        self.stream.write(f"\r{done}/{total}  {rate:.1f} 个/s  剩余 {eta:.0f} s  失败 {self.failed}   ")
+        self.stream.flush()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RecordType 会话批处理")
+    ap.add_argument("root", help="会话根目录（包含 session_* 子目录）")
+    ap.add_argument("ops", nargs="+", choices=OPERATIONS, help="要执行的操作，按固定顺序执行")
+    ap.add_argument("-j", "--workers", type=int, help="工作进程数（默认 CPU 核数）")
+    ap.add_argument("--dest", help="export / split 的目标目录")
+    ap.add_argument("--repair", action="store_true", help="validate 时修正头部长度 / 封存分段")
+    ap.add_argument("--force", action="store_true", help="speech 时重新检测已有结果的会话")
+    ap.add_argument("--checkpoint", help=f"检查点文件（默认 <root>/{CHECKPOINT_NAME}）")
+    ap.add_argument("--restart", action="store_true", help="忽略已有检查点，从头处理")
+    ap.add_argument("--max-memory-mb", type=int, help="每个工作进程的地址空间上限（POSIX）")
+    args = ap.parse_args(argv)
+
+    if "export" in args.ops or "split" in args.ops:
+        if not args.dest:
+            ap.error("export / split 需要 --dest")
+        os.makedirs(args.dest, exist_ok=True)
+    options = {"dest": args.dest, "repair": args.repair, "force": args.force}
+    ops = [op for op in OPERATIONS if op in args.ops]
+    checkpoint = args.checkpoint or os.path.join(args.root, CHECKPOINT_NAME)
+    skipped = 0 if args.restart else len(set(list_sessions(args.root)) & load_checkpoint(checkpoint, ops))
+    t0 = time.perf_counter()
+    try:
+        stats = run_batch(args.root, ops, options, workers=args.workers, checkpoint=checkpoint,
+                          restart=args.restart, max_memory_mb=args.max_memory_mb,
+                          progress=ConsoleProgress(skipped))
+    except KeyboardInterrupt:
+        sys.stderr.write("\n已中断；重新运行同一命令会从检查点继续。\n")
+        return 130
+    sys.stderr.write(f"\n共 {stats['total']} 个会话：成功 {stats['ok']}，失败 {stats['failed']}，"
+                     f"跳过（检查点）{stats['skipped']}，用时 {time.perf_counter() - t0:.1f} s\n")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
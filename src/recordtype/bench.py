@@ -0,0 +1,412 @@
+# src/recordtype/bench.py
+"""
+无界面性能基准（python -m src.recordtype.bench）：
+- 在临时目录生成合成数据：数小时的 WAV、上万个时间戳的 notes.md、大 anchors、数千条会话的会话库
+- 计时：WavPlayer 打开/跳转、笔记解析与 _open_session_path、标记查找、高亮、偏移↔索引换算、
+  load_recent / add_recent / 会话库扫描、录音写线程的重采样
+- 默认用桩替换 sounddevice（不打开任何声卡），Tk 根窗口隐藏；无显示器的 Linux 上用 xvfb-run 运行，
+  没有可用显示时只有控件相关项（打开会话、高亮、进度条重绘）记为 skipped；
+  标记查找与偏移↔索引换算在不建窗口的索引上计时，有无显示结果可比
+- 结果写成 JSON，--compare 与另一版本的结果逐项对比中位数
+用户数据目录（会话索引、全文索引）与会话根目录都重定向到临时目录，不会碰到真实数据。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+SCHEMA = 1
+DEFAULTS = {"hours": 3.0, "samplerate": 44100, "markers": 12000, "anchors": 50000,
+            "sessions": 5000, "repeat": 5, "seed": 1234}
+QUICK = {"hours": 0.1, "markers": 2000, "anchors": 5000, "sessions": 300, "repeat": 3}
+
+
+# ---------- sounddevice 桩 ----------
+class _StubStream:
+    """代替 RawInputStream / RawOutputStream：接受同样的参数，不产生回调。"""
+
+    def __init__(self, *args, **kwargs):
+        self.active = False
+
+    def start(self): self.active = True
+    def stop(self): self.active = False
+    def close(self): self.active = False
+
+
+def install_sounddevice_stub():
+    """在导入 recordtype 的播放/录音模块之前调用：用一个只有一个虚拟输入设备的桩模块替换 sounddevice。"""
+    sd = types.ModuleType("sounddevice")
+    sd.RawInputStream = sd.RawOutputStream = sd.InputStream = sd.OutputStream = _StubStream
+    sd.default = types.SimpleNamespace(hostapi=0, device=(None, None), samplerate=None)
+    sd.query_hostapis = lambda *a, **k: [{"name": "Stub", "devices": [0]}]
+    devices = [{"name": "Stub Microphone", "hostapi": 0, "max_input_channels": 1,
+                "max_output_channels": 0, "default_samplerate": 44100.0}]
+    sd.query_devices = lambda device=None, kind=None: (devices if kind is None else devices[0]) \
+        if device is None else devices[device]
+    sd._terminate = sd._initialize = lambda: None
+    sys.modules["sounddevice"] = sd
+    return sd
+
+
+# ---------- 合成数据 ----------
+def _hms(sec):
+    h, r = divmod(int(sec), 3600); m, s = divmod(r, 60)
+    return f"[{h:02d}:{m:02d}:{s:02d}]"
+
+
+def make_wav(path, seconds, samplerate, rng):
+    """写一个单声道 16-bit WAV：1 秒低电平噪声块循环写入，内存占用与时长无关。"""
+    import numpy as np
+    from .wavio import wav_header
+    nframes = int(seconds * samplerate)
+    block = (np.random.default_rng(rng.randrange(1 << 30)).standard_normal(samplerate) * 800).astype("<i2").tobytes()
+    with open(path, "wb") as f:
+        f.write(wav_header(1, samplerate, 2, nframes * 2))
+        left = nframes * 2
+        while left > 0:
+            f.write(block[:left]); left -= len(block)
+    return nframes
+
+
+def make_notes(path, seconds, markers, rng):
+    """写带 markers 个 [HH:MM:SS] 的 notes.md，时间单调递增，段落长度随机。"""
+    from .notes import NOTES_HEADER
+    words = ["录音", "笔记", "回放", "标记", "timeline", "review", "会议", "要点", "action", "item"]
+    step = seconds / max(1, markers)
+    parts = [NOTES_HEADER]
+    for i in range(markers):
+        n = rng.randint(4, 30)
+        parts.append(f"{_hms(i * step)} " + " ".join(rng.choice(words) for _ in range(n)))
+        parts.append("\n\n" if rng.random() < 0.3 else "\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+
+
+def make_anchors(session_dir, seconds, count, text_len):
+    from array import array
+    from .notes import save_anchors
+    times = array("d", (seconds * i / count for i in range(count)))
+    offs = array("i", (text_len * i // count for i in range(count)))
+    save_anchors(session_dir, times, offs)
+
+
+def make_library(root, count, rng):
+    """count 个小会话目录（meta.json + notes.md + 空 audio.wav 头），供会话库扫描/最近列表使用。"""
+    from .wavio import wav_header
+    from .storage import save_json
+    from .notes import NOTES_HEADER
+    dirs = []
+    for i in range(count):
+        d = os.path.join(root, f"session_20250101_{i:06d}")
+        os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, "audio.wav"), "wb") as f:
+            f.write(wav_header(1, 16000, 2, 0))
+        with open(os.path.join(d, "notes.md"), "w", encoding="utf-8") as f:
+            f.write(NOTES_HEADER + f"[00:00:0{i % 10}] 会话 {i} 的笔记\n")
+        save_json(os.path.join(d, "meta.json"), {"duration_seconds": round(rng.uniform(60, 7200), 3)})
+        dirs.append(d)
+    return dirs
+
+
+# ---------- 计时 ----------
+def _summary(samples, ops=1):
+    ms = sorted(s * 1000.0 for s in samples)
+    out = {"n": len(ms), "ops": ops, "min_ms": round(ms[0], 4), "median_ms": round(statistics.median(ms), 4),
+           "mean_ms": round(statistics.fmean(ms), 4), "max_ms": round(ms[-1], 4)}
+    if ops > 1:
+        out["per_op_us"] = round(statistics.median(ms) * 1000.0 / ops, 4)
+    return out
+
+
+class Bench:
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.only or any(name.startswith(p) for p in self.only)
+
+    def run(self, name, fn, ops=1, repeat=None, setup=None):
+        """重复执行 fn()（每次之前调用 setup()，不计时），记录耗时；ops 为一次 fn 内的操作数。"""
+        if not self.wanted(name): return
+        samples = []
+        for _ in range(repeat or self.repeat):
+            if setup: setup()
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+        self.results[name] = _summary(samples, ops)
+        print(f"{name:<32} median {self.results[name]['median_ms']:>10.3f} ms"
+              + (f"  ({self.results[name]['per_op_us']:.3f} us/op)" if ops > 1 else ""), flush=True)
+
+    def skip(self, name, reason):
+        if not self.wanted(name): return
+        self.results[name] = {"skipped": reason}
+        print(f"{name:<32} skipped: {reason}", flush=True)
+
+
+def _redirect_user_dirs(tmp):
+    """会话根目录与用户数据目录都放进临时目录（~/Documents、~/.local/share、%LOCALAPPDATA%）。"""
+    saved = {k: os.environ.get(k) for k in ("HOME", "USERPROFILE", "LOCALAPPDATA")}
+    home = os.path.join(tmp, "home")
+    os.makedirs(home, exist_ok=True)
+    os.environ["HOME"] = os.environ["USERPROFILE"] = home
+    os.environ["LOCALAPPDATA"] = os.path.join(home, "AppData")
+    return saved
+
+
+def _restore_env(saved):
+    for k, v in saved.items():
+        if v is None: os.environ.pop(k, None)
+        else: os.environ[k] = v
+
+
+# ---------- 各组基准 ----------
+def bench_player(b, audio, seconds, rng):
+    from .player import WavPlayer
+
+    def load():
+        WavPlayer(audio).close()
+    b.run("player.load", load)
+
+    p = WavPlayer(audio)
+    try:
+        targets = [rng.uniform(0, seconds) for _ in range(200)]
+        def seek():
+            for t in targets:
+                p.seek(t); p.current_time()
+        b.run("player.seek", seek, ops=len(targets))
+
+        # 跳转后渲染线程产出第一块数据的延迟（没有输出流时渲染线程自己清空缓冲）
+        def seek_ready():
+            for t in targets[:20]:
+                p.seek(t)
+                gen = p._gen
+                while p._flush_ack != gen or p._ring.available() == 0:
+                    time.sleep(0.0005)
+        b.run("player.seek_to_audio", seek_ready, ops=20)
+    finally:
+        p.close()
+
+
+def bench_notes(b, notes):
+    from .notes import parse_notes_file, sorted_markers
+    b.run("notes.parse_file", lambda: parse_notes_file(notes))
+    clean, times, offs = parse_notes_file(notes)
+    b.run("notes.sorted_markers", lambda: sorted_markers(times, offs))
+    return clean
+
+
+def bench_anchors(b, session_dir):
+    from .notes import load_anchor_markers
+    b.run("anchors.load_bin", lambda: load_anchor_markers(os.path.join(session_dir, "anchors.bin")))
+    b.run("anchors.load_json", lambda: load_anchor_markers(os.path.join(session_dir, "anchors.json")))
+
+
+def bench_capture(b):
+    """录音写线程的格式转换：每次处理 0.5 s 设备数据（48k/44.1k 立体声 -> 16k 单声道）。"""
+    import numpy as np
+    from .resample import Resampler
+    for name, rate in (("capture.resample_48k", 48000), ("capture.resample_44k", 44100)):
+        rs = Resampler(rate, 16000, 2, 1)
+        block = np.random.default_rng(0).integers(-3000, 3000, (rate // 2, 2)).astype("<i2")
+        b.run(name, lambda: rs.process(block))
+
+
+def bench_library(b, lib_root, dirs, rng):
+    from .storage import scan_sessions, load_recent, add_recent, query_sessions
+    b.run("library.scan_cold", lambda: scan_sessions(lib_root), repeat=1)
+    b.run("library.scan_warm", lambda: scan_sessions(lib_root))
+    b.run("library.load_recent", lambda: load_recent(limit=len(dirs)))
+    b.run("library.query_page", lambda: query_sessions("笔记", sort="duration", limit=200))
+    sample = rng.sample(dirs, min(100, len(dirs)))
+    def add():
+        for d in sample: add_recent(d)
+    b.run("library.add_recent", add, ops=len(sample), repeat=max(1, b.repeat // 2))
+
+
+def _make_root():
+    """隐藏的 Tk 根窗口；没有显示时返回 (None, 原因)。"""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return None, f"{e}; run under xvfb-run"
+    root.withdraw()
+    return root, None
+
+
+def _review_index(session_dir):
+    """不建窗口的回放页索引：MainWindow 的查找/换算方法只用这几张表，不访问 Tk，无显示时也能测。"""
+    from .ui import MainWindow
+    from .clips import session_markers
+    win = MainWindow.__new__(MainWindow)
+    win.review_clean_text, win.review_markers = session_markers(session_dir)
+    win._build_line_index(win.review_clean_text)
+    win._build_marker_index()
+    return win
+
+
+def bench_ui(b, session_dir, seconds, rng):
+    lookups = ("ui.marker_lookup", "ui.time_at_offset", "ui.offset_to_index", "ui.index_to_offset")
+    widgets = ("ui.open_session", "ui.highlight", "ui.progress_redraw")
+    if not any(b.wanted(n) for n in lookups + widgets): return
+    ts = [rng.uniform(0, seconds) for _ in range(10000)]
+
+    # 纯二分查找：在不含控件的索引上测，有没有显示结果都可比
+    if any(b.wanted(n) for n in lookups):
+        ix = _review_index(session_dir)
+        offs = [rng.randrange(max(1, len(ix.review_clean_text))) for _ in range(10000)]
+
+        def lookup():
+            for t in ts: ix._segment_at_time(t)
+        b.run("ui.marker_lookup", lookup, ops=len(ts))
+
+        def time_at():
+            for o in offs: ix._time_at_offset(o)
+        b.run("ui.time_at_offset", time_at, ops=len(offs))
+
+        def to_index():
+            for o in offs: ix._offset_to_index(o)
+        b.run("ui.offset_to_index", to_index, ops=len(offs))
+
+        idx = [tuple(map(int, ix._offset_to_index(o).split("."))) for o in offs]
+        def to_offset():
+            for line, col in idx: ix._index_to_offset(line, col)
+        b.run("ui.index_to_offset", to_offset, ops=len(idx))
+
+    if not any(b.wanted(n) for n in widgets): return
+    root, why = _make_root()
+    if root is None:
+        for n in widgets: b.skip(n, why)
+        return
+    from .ui import MainWindow
+    win = MainWindow(root)
+    try:
+        root.update()
+        b.run("ui.open_session", lambda: (win._open_session_path(session_dir), root.update_idletasks()))
+        win.refresh.cancel()
+
+        hts = sorted(ts[:2000])
+        def hilite():
+            win._hilite_idx = None
+            for t in hts: win._highlight_at_time(t)
+            root.update_idletasks()
+        b.run("ui.highlight", hilite, ops=len(hts))
+
+        b.run("ui.progress_redraw", lambda: (win._redraw_progress_layers(), root.update_idletasks()))
+    finally:
+        if win.player: win.player.close()
+        root.destroy()
+
+
+# ---------- 结果 ----------
+def environment():
+    from .ui import APP_VERSION
+    return {"app_version": APP_VERSION, "python": platform.python_version(),
+            "implementation": platform.python_implementation(), "platform": platform.platform(),
+            "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+def compare(current, baseline_path):
+    """按中位数对比两次结果，打印比值（>1 表示变慢）。"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\n对比 {baseline_path}（当前 / 基线）")
+    for name, r in current["results"].items():
+        old = base.get("results", {}).get(name)
+        if not old or "median_ms" not in old or "median_ms" not in r:
+            continue
+        ratio = r["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        flag = "  <-- 变慢" if ratio > 1.2 else ("  <-- 变快" if ratio < 0.8 else "")
+        print(f"{name:<32} {old['median_ms']:>10.3f} -> {r['median_ms']:>10.3f} ms  x{ratio:.2f}{flag}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RecordType 无界面性能基准")
+    ap.add_argument("--hours", type=float, help=f"合成录音时长（默认 {DEFAULTS['hours']}）")
+    ap.add_argument("--samplerate", type=int)
+    ap.add_argument("--markers", type=int, help="notes.md 中时间戳个数")
+    ap.add_argument("--anchors", type=int, help="anchors.bin/json 中锚点个数")
+    ap.add_argument("--sessions", type=int, help="会话库中的会话个数")
+    ap.add_argument("--repeat", type=int, help="每项重复次数")
+    ap.add_argument("--seed", type=int)
+    ap.add_argument("--quick", action="store_true", help="小规模数据，用于冒烟检查")
+    ap.add_argument("--only", action="append", help="只运行名称以此开头的项，可重复")
+    ap.add_argument("--real-audio", action="store_true", help="使用真实 sounddevice（默认用桩）")
+    ap.add_argument("--workdir", help="数据目录（默认临时目录，结束后删除）")
+    ap.add_argument("--keep", action="store_true", help="保留生成的数据")
+    ap.add_argument("-o", "--output", help="结果 JSON 路径")
+    ap.add_argument("--compare", help="与另一份结果 JSON 对比")
+    args = ap.parse_args(argv)
+
+    params = dict(DEFAULTS)
+    if args.quick: params.update(QUICK)
+    for k in DEFAULTS:
+        if getattr(args, k) is not None: params[k] = getattr(args, k)
+    if not args.real_audio:
+        install_sounddevice_stub()
+
+    rng = random.Random(params["seed"])
+    tmp = args.workdir or tempfile.mkdtemp(prefix="rt_bench_")
+    os.makedirs(tmp, exist_ok=True)
+    saved_env = _redirect_user_dirs(tmp)
+    b = Bench(params["repeat"], args.only)
+    try:
+        from .peaks import build_peaks, PEAKS_FILENAME
+        from .vad import analyze_session
+
+        seconds = params["hours"] * 3600
+        sess = os.path.join(tmp, "session_bench")
+        os.makedirs(sess, exist_ok=True)
+        audio = os.path.join(sess, "audio.wav")
+        t0 = time.perf_counter()
+        make_wav(audio, seconds, params["samplerate"], rng)
+        make_notes(os.path.join(sess, "notes.md"), seconds, params["markers"], rng)
+        print(f"生成 {params['hours']} h 录音与笔记：{time.perf_counter() - t0:.1f} s", flush=True)
+        # 峰值与语音段预先生成，避免打开会话时后台线程干扰计时（这两步本身也计时一次）
+        b.run("setup.build_peaks", lambda: build_peaks(audio, os.path.join(sess, PEAKS_FILENAME)), repeat=1)
+        b.run("setup.analyze_speech", lambda: analyze_session(sess, force=True), repeat=1)
+
+        bench_player(b, audio, seconds, rng)
+        clean = bench_notes(b, os.path.join(sess, "notes.md"))
+        anchors_dir = os.path.join(tmp, "anchors")
+        os.makedirs(anchors_dir, exist_ok=True)
+        make_anchors(anchors_dir, seconds, params["anchors"], len(clean))
+        bench_anchors(b, anchors_dir)
+        bench_capture(b)
+
+        if any(b.wanted(n) for n in ("library.",)):
+            lib_root = os.path.join(tmp, "library")
+            t0 = time.perf_counter()
+            dirs = make_library(lib_root, params["sessions"], rng)
+            print(f"生成 {len(dirs)} 个会话：{time.perf_counter() - t0:.1f} s", flush=True)
+            bench_library(b, lib_root, dirs, rng)
+
+        bench_ui(b, sess, seconds, rng)
+    finally:
+        _restore_env(saved_env)
+        if not args.keep and not args.workdir:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    result = {"schema": SCHEMA, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "params": params,
+              "stub_audio": not args.real_audio, "env": environment(), "results": b.results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    if args.compare:
+        compare(result, args.compare)
+    return result
+
+
+if __name__ == "__main__":
+    main()
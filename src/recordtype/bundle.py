@@ -0,0 +1,283 @@
+# src/recordtype/bundle.py
+"""
+会话文件包（.rtsb）：把一个会话目录存成单个文件，便于在网络共享上复制与打开。
+文件布局（小端）：
+    头部 64 字节：magic "RTSB", u16 版本, u16 标志, u32 段数, u64 目录偏移, u64 目录长度
+    各段数据：每段起点按 4096 字节对齐，内容与会话目录中的原文件逐字节相同
+    目录：u16 会话名长度 + 会话名，随后每段 u64 偏移, u64 长度, u32 CRC32, u16 名称长度 + 名称（/ 分隔的相对路径）
+打开时只读头部和目录（与录音长度无关）；音频段直接内存映射，笔记、锚点、峰值、语音段按偏移读取。
+导出/导入都是流式拷贝，带进度回调，可选写入/校验每段的 CRC32。
+"""
+import os
+import json
+import shutil
+import struct
+import zlib
+
+MAGIC = b"RTSB"
+VERSION = 1
+EXTENSION = ".rtsb"
+HEADER = struct.Struct("<4sHHIQQ")    # magic, version, flags, count, toc_offset, toc_size
+HEADER_BYTES = 64
+ENTRY = struct.Struct("<QQIH")        # offset, size, crc32, name_len；随后 name
+NAME = struct.Struct("<H")
+ALIGN = 4096
+FLAG_CRC = 1
+COPY_CHUNK = 1 << 20
+_SKIP_SUFFIXES = (".tmp",)            # 写了一半的临时文件不打包
+
+
+def is_bundle(path) -> bool:
+    """按扩展名和 magic 判断；只读 4 字节。"""
+    if not (isinstance(path, str) and path.endswith(EXTENSION) and os.path.isfile(path)):
+        return False
+    with open(path, "rb") as f:
+        return f.read(4) == MAGIC
+
+
+class Bundle:
+    """只读打开文件包：sections 为 {名称: (偏移, 长度, crc32)}。"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, ver, self.flags, count, toc_off, toc_size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("不是会话文件包")
+            if ver > VERSION:
+                raise ValueError(f"不支持的文件包版本：{ver}")
+            if not toc_off:
+                raise ValueError("文件包不完整（缺少目录）")
+            f.seek(toc_off)
+            toc = f.read(toc_size)
+        (n,) = NAME.unpack_from(toc, 0); pos = NAME.size
+        self.name = toc[pos:pos + n].decode("utf-8"); pos += n
+        self.sections = {}
+        for _ in range(count):
+            off, size, crc, n = ENTRY.unpack_from(toc, pos); pos += ENTRY.size
+            self.sections[toc[pos:pos + n].decode("utf-8")] = (off, size, crc)
+            pos += n
+
+    def has(self, name) -> bool:
+        return name in self.sections
+
+    def section(self, name):
+        """(偏移, 长度)；没有该段抛 KeyError。"""
+        off, size, _crc = self.sections[name]
+        return off, size
+
+    def read(self, name) -> bytes:
+        off, size = self.section(name)
+        with open(self.path, "rb") as f:
+            f.seek(off)
+            return f.read(size)
+
+    def read_text(self, name) -> str:
+        return self.read(name).decode("utf-8")
+
+    def audio_sections(self):
+        """会话音频对应的段：单个 audio.wav / audio / audio.rtlc，或 audio_segments/ 下按序的各分段 / audio_tracks/ 下的各轨。"""
+        from .wavio import SEGMENTS_DIRNAME, TRACKS_DIRNAME
+        for name in ("audio.wav", "audio", "audio.rtlc"):
+            if name in self.sections:
+                return [name]
+        for dirname, prefix in ((SEGMENTS_DIRNAME, "seg_"), (TRACKS_DIRNAME, "track_")):
+            names = sorted(n for n in self.sections
+                           if n.startswith(f"{dirname}/{prefix}") and n.endswith(".wav"))
+            if names:
+                return names
+        return []
+
+    def verify(self, progress=None):
+        """按 CRC32 校验全部段；没有校验和时返回 False，校验失败抛 ValueError。"""
+        if not self.flags & FLAG_CRC:
+            return False
+        total = sum(size for _off, size, _crc in self.sections.values())
+        done = 0
+        with open(self.path, "rb") as f:
+            for name, (off, size, crc) in self.sections.items():
+                f.seek(off)
+                got = _copy(f, None, size, lambda n: progress and progress(done + n, total))
+                if got != crc:
+                    raise ValueError(f"校验失败：{name}")
+                done += size
+        return True
+
+
+def _copy(src, dst, size, progress=None):
+    """从 src 当前位置拷贝 size 字节到 dst（None 时只计算），返回 CRC32。"""
+    crc, left, done = 0, size, 0
+    buf = bytearray(min(COPY_CHUNK, max(1, size)))
+    view = memoryview(buf)
+    while left > 0:
+        n = src.readinto(view[:min(left, len(buf))])
+        if not n:
+            raise ValueError("文件包被截断")
+        crc = zlib.crc32(view[:n], crc)
+        if dst is not None: dst.write(view[:n])
+        left -= n; done += n
+        if progress: progress(done)
+    return crc
+
+
+# ---------- 读取会话内容 ----------
+def open_bundle_frames(path):
+    """映射文件包中的会话音频，返回 (frames, samplerate, channels)，用法与 wavio.open_frames 相同。"""
+    from .wavio import _map_wav, SegmentedFrames, TRACKS_DIRNAME, TRACKS_INDEX
+    b = Bundle(path)
+    names = b.audio_sections()
+    if not names:
+        raise ValueError("文件包中没有音频")
+    if names[0].endswith(".rtlc"):
+        from .codec import RtlcFrames
+        off, size = b.section(names[0])
+        fr = RtlcFrames(path, base=off, size=size)
+        return fr, fr.sr, fr.channels
+    if len(names) == 1 and "/" not in names[0]:
+        return _map_wav(path, *b.section(names[0]))
+    if names[0].startswith(TRACKS_DIRNAME + "/"):
+        from .multitrack import MixedFrames, track_gains
+        index = f"{TRACKS_DIRNAME}/{TRACKS_INDEX}"
+        gains = track_gains(json.loads(b.read(index)), [n.split("/")[-1] for n in names]) if b.has(index) else None
+        fr = MixedFrames.from_maps([_map_wav(path, *b.section(n)) for n in names], gains)
+        return fr, fr.sr, fr.channels
+    fr = SegmentedFrames.from_maps(_map_wav(path, *b.section(n)) for n in names)
+    return fr, fr.sr, fr.channels
+
+
+def bundle_anchor_markers(b: Bundle):
+    """文件包中的锚点 -> [(sec, offset), ...]；没有锚点返回 []。"""
+    from .notes import ANCHORS_BIN, load_anchors_bin, anchor_markers_from_bin, anchor_markers_from_json
+    if b.has(ANCHORS_BIN):
+        return anchor_markers_from_bin(*load_anchors_bin(b.path, b.section(ANCHORS_BIN)[0]))
+    if b.has("anchors.json"):
+        return anchor_markers_from_json(json.loads(b.read("anchors.json")))
+    return []
+
+
+def bundle_peaks(b: Bundle):
+    """文件包中的波形峰值（直接映射）；没有或未完成时返回 None。"""
+    from .peaks import PEAKS_FILENAME, PeakPyramid
+    if not b.has(PEAKS_FILENAME):
+        return None
+    try:
+        return PeakPyramid(b.path, base=b.section(PEAKS_FILENAME)[0])
+    except ValueError:
+        return None
+
+
+def bundle_speech(b: Bundle):
+    """文件包中的语音段 [(start_s, end_s), ...]；没有返回 None。"""
+    from .vad import SPEECH_FILENAME
+    if not b.has(SPEECH_FILENAME):
+        return None
+    try:
+        data = json.loads(b.read(SPEECH_FILENAME))
+        return [(float(a), float(c)) for a, c in data["segments"]]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+# ---------- 导出 / 导入 ----------
+def _session_files(session_dir):
+    """会话目录下的文件（相对路径，/ 分隔）；笔记等小文件在前，音频在后。"""
+    out = []
+    for dirpath, dirnames, filenames in os.walk(session_dir):
+        dirnames.sort()
+        for fn in sorted(filenames):
+            if fn.endswith(_SKIP_SUFFIXES): continue
+            full = os.path.join(dirpath, fn)
+            out.append((os.path.relpath(full, session_dir).replace(os.sep, "/"), full))
+    return sorted(out, key=lambda x: (x[0].startswith("audio"), x[0]))
+
+
+def export_bundle(session_dir, dst, checksum=True, progress=None):
+    """
+    把会话目录打包为单个文件。dst 为目录时生成 <dst>/<会话名>.rtsb。
+    先写临时文件，完成后改名；progress(done_bytes, total_bytes) 定期回调。返回文件包路径。
+    """
+    name = os.path.basename(os.path.normpath(session_dir))
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, name + EXTENSION)
+    if os.path.exists(dst):
+        raise FileExistsError("目标已存在同名文件包")
+    files = _session_files(session_dir)
+    sizes = [os.path.getsize(full) for _rel, full in files]
+    total, done = sum(sizes), 0
+    tmp = dst + ".tmp"
+    entries = []
+    try:
+        with open(tmp, "wb") as out:
+            out.write(bytes(HEADER_BYTES))
+            for (rel, full), size in zip(files, sizes):
+                pad = -out.tell() % ALIGN
+                if pad: out.write(bytes(pad))
+                off = out.tell()
+                with open(full, "rb") as src:
+                    crc = _copy(src, out, size, lambda n: progress and progress(done + n, total))
+                entries.append((rel, off, size, crc if checksum else 0))
+                done += size
+            toc_off = out.tell()
+            nb = name.encode("utf-8")
+            toc = [NAME.pack(len(nb)), nb]
+            for rel, off, size, crc in entries:
+                rb = rel.encode("utf-8")
+                toc += [ENTRY.pack(off, size, crc, len(rb)), rb]
+            toc = b"".join(toc)
+            out.write(toc)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, VERSION, FLAG_CRC if checksum else 0, len(entries), toc_off, len(toc)))
+            out.flush(); os.fsync(out.fileno())
+        os.replace(tmp, dst)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    if progress: progress(total, total)
+    return dst
+
+
+def _safe_session_name(name: str) -> str:
+    """目录表中的会话名只能是单个目录名：拒绝空名、路径分隔符、.. 与盘符。"""
+    base = os.path.basename(name)
+    if (not base or base in (".", "..") or base != name or "/" in name or "\\" in name
+            or ":" in name or os.path.splitdrive(name)[0]):
+        raise ValueError(f"非法的会话名：{name!r}")
+    return base
+
+
+def import_bundle(path, dest_root, verify=True, progress=None):
+    """
+    把文件包还原为 <dest_root>/<会话名>/ 目录（先解到临时目录再改名）。
+    verify 且文件包带校验和时逐段核对 CRC32。返回会话目录。
+    """
+    b = Bundle(path)
+    target = os.path.join(dest_root, _safe_session_name(b.name))
+    root = os.path.realpath(dest_root)
+    if os.path.dirname(os.path.realpath(target)) != root:
+        raise ValueError(f"非法的会话名：{b.name}")
+    if os.path.exists(target):
+        raise FileExistsError("目标已存在同名文件夹")
+    tmp = target + ".tmp"
+    check = verify and b.flags & FLAG_CRC
+    total = sum(size for _off, size, _crc in b.sections.values())
+    done = 0
+    try:
+        with open(path, "rb") as src:
+            for rel, (off, size, crc) in b.sections.items():
+                if rel.startswith("/") or ".." in rel.split("/"):
+                    raise ValueError(f"非法的段名：{rel}")
+                out_path = os.path.join(tmp, *rel.split("/"))
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                src.seek(off)
+                with open(out_path, "wb") as out:
+                    got = _copy(src, out, size, lambda n: progress and progress(done + n, total))
+                if check and got != crc:
+                    raise ValueError(f"校验失败：{rel}")
+                done += size
+        os.replace(tmp, target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if progress: progress(total, total)
+    return target
@@ -0,0 +1,144 @@
+# src/recordtype/clips.py
+"""
+按笔记标记导出音频片段：
+- 标记（[HH:MM:SS] 时间戳，没有时用隐形锚点）把录音切成段：每段从一个标记到下一个标记，最后一段到录音末尾
+- 每段单独写成 WAV：按标记时间算出帧范围，从映射的音频上直接切片（单个 WAV 时不拷贝），分块写入
+- 多个片段在线程池中并行写出（写文件时释放 GIL），progress(done_frames, total_frames) 汇报进度
+- 片段按其在全部分段中的序号命名，只导出一部分时文件名与整段切分一致；
+  目标目录下的 clips.json（每个片段的文件名、起止时间与所在笔记的首行）按文件名合并，不覆盖其他片段
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_FRAMES = 1 << 18        # 每次写入的帧数
+CLIPS_INDEX = "clips.json"
+TITLE_CHARS = 40
+
+
+def clip_name(i: int, start: float) -> str:
+    h, r = divmod(int(start), 3600); m, s = divmod(r, 60)
+    return f"clip_{i + 1:03d}_{h:02d}-{m:02d}-{s:02d}.wav"
+
+
+def marker_segments(markers, total: float) -> List[Tuple[float, float, int]]:
+    """标记 [(sec, offset), ...]（按时间排序）-> [(start, end, offset), ...]；长度为 0 的段略去。"""
+    times = [float(sec) for sec, _off in markers]
+    out = []
+    for i in range(len(markers)):
+        start = max(0.0, times[i])
+        end = min(total, times[i + 1]) if i + 1 < len(times) else total
+        if end > start:
+            out.append((start, end, int(markers[i][1])))
+    return out
+
+
+def segment_title(text: str, offset: int) -> str:
+    """片段对应笔记的首行（去掉首尾空白，截断到 TITLE_CHARS 个字符）。"""
+    line = text[max(0, offset):].lstrip().split("\n", 1)[0].strip()
+    return line[:TITLE_CHARS]
+
+
+def _write_clip(frames, sr, channels, a, b, path, advance, stop_event):
+    from .wavio import WavSink
+    tmp = path + ".tmp"
+    sink = WavSink(tmp, channels, sr, 2)
+    try:
+        for x in range(a, b, CHUNK_FRAMES):
+            if stop_event is not None and stop_event.is_set():
+                raise RuntimeError("cancelled")
+            y = min(b, x + CHUNK_FRAMES)
+            part = np.ascontiguousarray(frames[x:y])    # 映射的 WAV：只是视图
+            sink.write(memoryview(part).cast("B"))
+            advance(y - x)
+    except BaseException:
+        sink.close(); os.remove(tmp); raise
+    sink.close()
+    os.replace(tmp, path)
+    return path
+
+
+def _load_index(path) -> list:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            clips = json.load(f).get("clips", [])
+        return [c for c in clips if isinstance(c, dict) and "file" in c]
+    except (OSError, ValueError, AttributeError):
+        return []
+
+
+def export_clips(audio_path, segments, out_dir, text: str = "", indices=None, workers: Optional[int] = None,
+                 progress=None, stop_event=None):
+    """
+    把 segments（marker_segments 结果中的若干段）各自写成 out_dir/clip_NNN_HH-MM-SS.wav，同名文件覆盖。
+    indices 为各段在 marker_segments 全部结果中的序号（决定 NNN），省略时按 0, 1, 2…。
+    text 为笔记正文，用于 clips.json 中的标题。返回写出的路径列表（按段顺序）。
+    """
+    from .wavio import open_frames
+    from .storage import save_json
+    frames, sr, channels = open_frames(audio_path)
+    n = len(frames)
+    jobs = []
+    if indices is None:
+        indices = range(len(segments))
+    for i, (start, end, off) in zip(indices, segments):
+        a = min(n, int(round(start * sr))); b = min(n, int(round(end * sr)))
+        if b > a:
+            jobs.append((clip_name(i, start), a, b, start, end, off))
+    os.makedirs(out_dir, exist_ok=True)
+    total = sum(b - a for _name, a, b, *_rest in jobs)
+    state = {"done": 0}
+    lock = threading.Lock()
+
+    def advance(k):
+        with lock:
+            state["done"] += k
+            done = state["done"]
+        if progress: progress(done, total)
+
+    workers = workers or min(4, os.cpu_count() or 1)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs) or 1))) as pool:
+            futures = [pool.submit(_write_clip, frames, sr, channels, a, b, os.path.join(out_dir, name),
+                                   advance, stop_event)
+                       for name, a, b, *_rest in jobs]
+            paths = [f.result() for f in futures]
+    finally:
+        if hasattr(frames, "close"): frames.close()
+    index = os.path.join(out_dir, CLIPS_INDEX)
+    clips = {c["file"]: c for c in _load_index(index)}
+    for name, _a, _b, start, end, off in jobs:
+        clips[name] = {"file": name, "start": round(start, 3), "end": round(end, 3),
+                       "title": segment_title(text, off)}
+    save_json(index, {"source": os.path.abspath(audio_path), "sample_rate": sr, "channels": channels,
+                      "clips": sorted(clips.values(), key=lambda c: c["file"])})
+    if progress: progress(total, total)
+    return paths
+
+
+def session_markers(session_dir):
+    """(笔记正文, 标记)：与回放页一致，没有时间戳时用隐形锚点，都没有时为 [(0.0, 0)]。"""
+    from .notes import parse_notes_file, sorted_markers, load_anchor_markers, ANCHORS_BIN
+    notes = os.path.join(session_dir, "notes.md")
+    clean, times, offsets = parse_notes_file(notes) if os.path.exists(notes) else ("", [], [])
+    markers = sorted_markers(times, offsets)
+    if not markers and any(os.path.exists(os.path.join(session_dir, n)) for n in (ANCHORS_BIN, "anchors.json")):
+        markers = load_anchor_markers(session_dir)
+    return clean, markers or [(0.0, 0)]
+
+
+def split_session(session_dir, out_dir, workers: Optional[int] = None, progress=None, stop_event=None):
+    """批量模式：在每个标记处切开整个会话，片段写到 out_dir。返回写出的路径列表。"""
+    from .storage import session_audio_path, _audio_format_and_frames
+    audio = session_audio_path(session_dir)
+    if audio is None:
+        raise FileNotFoundError("未找到音频")
+    sr, _ch, _sw, nframes = _audio_format_and_frames(audio)
+    clean, markers = session_markers(session_dir)
+    segments = marker_segments(markers, nframes / float(sr))
+    return export_clips(audio, segments, out_dir, text=clean, workers=workers,
+                        progress=progress, stop_event=stop_event)
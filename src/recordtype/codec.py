@@ -0,0 +1,402 @@
+# src/recordtype/codec.py
+"""
+RTLC：面向语音笔记的流式无损压缩格式（NumPy 向量化的预测 + Rice 编码）。
+
+- 每 block_frames 帧一个独立块，块内各声道独立：固定阶(0/1/2)预测残差 -> zigzag -> Rice
+- 一元部分、余数部分、逃逸值分开存放，编解码全部是数组运算，没有逐样本的 Python 循环
+- 文件尾部写块索引，回放时只解码需要的块；崩溃后没有索引也能顺序扫描块头重建
+
+文件布局：
+    头部   <4sHHIIQQ  magic, version, channels, samplerate, block_frames, total_frames, index_offset
+    块     <4sII      b"BLK1", nframes, payload_len，随后是各声道数据
+    声道   <BBHII     order, k, 保留, unary_nbytes, n_escape，随后 unary / 余数 / 逃逸值(<u4)
+    索引   <4sI       b"RIDX", count，随后 offsets(<u8) 与 frames(<u4)
+"""
+import os
+import json
+import struct
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+MAGIC = b"RTLC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQQ")
+BLOCK = struct.Struct("<4sII")
+CHANNEL = struct.Struct("<BBHII")
+INDEX = struct.Struct("<4sI")
+BLOCK_MAGIC = b"BLK1"
+INDEX_MAGIC = b"RIDX"
+ESC = 32                     # 一元前缀上限；达到即表示逃逸，原值另存
+DEFAULT_BLOCK_FRAMES = 4096
+EXTENSION = ".rtlc"
+
+
+# ----------------------------------------------------------------------
+# 单块编解码
+# ----------------------------------------------------------------------
+def _encode_channel(x: np.ndarray) -> bytes:
+    x = x.astype(np.int64)
+    n = len(x)
+    best = None
+    for order in (0, 1, 2):
+        r = np.diff(x, n=order, prepend=np.zeros(order, np.int64)) if order else x
+        cost = int(np.abs(r).sum())
+        if best is None or cost < best[0]:
+            best = (cost, order, r)
+    _cost, order, r = best
+    u = ((r << 1) ^ (r >> 63)).astype(np.uint64)          # zigzag
+    mean = float(u.mean()) if n else 0.0
+    k = int(min(20, max(0, np.floor(np.log2(mean * 0.69 + 1.0)))))
+    q = u >> np.uint64(k)
+    esc = q >= ESC
+    qq = np.minimum(q, ESC).astype(np.int64)
+
+    ones = np.cumsum(qq + 1) - 1
+    ubits = np.zeros(int(ones[-1]) + 1 if n else 0, dtype=np.uint8)
+    ubits[ones] = 1
+    unary = np.packbits(ubits).tobytes()
+
+    if k:
+        rem = np.where(esc, 0, u & np.uint64((1 << k) - 1))
+        shifts = np.arange(k - 1, -1, -1, dtype=np.uint64)
+        rbits = ((rem[:, None] >> shifts) & np.uint64(1)).astype(np.uint8).ravel()
+        remainder = np.packbits(rbits).tobytes()
+    else:
+        remainder = b""
+    escapes = u[esc].astype("<u4").tobytes()
+    return CHANNEL.pack(order, k, 0, len(unary), int(esc.sum())) + unary + remainder + escapes
+
+
+def _decode_channel(buf, pos: int, n: int):
+    order, k, _r, ulen, nesc = CHANNEL.unpack_from(buf, pos)
+    pos += CHANNEL.size
+    ones = np.flatnonzero(np.unpackbits(np.frombuffer(buf, np.uint8, ulen, pos)))[:n]
+    pos += ulen
+    qq = np.diff(ones, prepend=-1) - 1
+    rlen = (n * k + 7) // 8
+    if k:
+        rbits = np.unpackbits(np.frombuffer(buf, np.uint8, rlen, pos))[:n * k].reshape(n, k)
+        rem = rbits.astype(np.int64) @ (1 << np.arange(k - 1, -1, -1, dtype=np.int64))
+    else:
+        rem = np.zeros(n, np.int64)
+    pos += rlen
+    u = (qq.astype(np.int64) << k) | rem
+    esc = qq >= ESC
+    if nesc:
+        u[esc] = np.frombuffer(buf, "<u4", nesc, pos).astype(np.int64)
+    pos += nesc * 4
+    r = (u >> 1) ^ -(u & 1)
+    for _ in range(order):
+        r = np.cumsum(r)
+    return r, pos
+
+
+def encode_block(frames: np.ndarray) -> bytes:
+    """frames: int16 [n, channels] -> 一个完整的块（含块头）。"""
+    payload = b"".join(_encode_channel(frames[:, c]) for c in range(frames.shape[1]))
+    return BLOCK.pack(BLOCK_MAGIC, len(frames), len(payload)) + payload
+
+
+def decode_block(buf, channels: int) -> np.ndarray:
+    """buf 以块头开始；返回 int16 [n, channels]。"""
+    magic, n, _plen = BLOCK.unpack_from(buf, 0)
+    if magic != BLOCK_MAGIC:
+        raise ValueError("RTLC 块头损坏")
+    out = np.empty((n, channels), dtype=np.int16)
+    pos = BLOCK.size
+    for c in range(channels):
+        r, pos = _decode_channel(buf, pos, n)
+        out[:, c] = r
+    return out
+
+
+# ----------------------------------------------------------------------
+# 写入（录音写线程 / 批量转换）
+# ----------------------------------------------------------------------
+class RtlcSink:
+    """
+    与 WavSink 相同的接口（write / patch / close），写线程攒满一块就编码落盘。
+    stats() 给出压缩率与编码 CPU 耗时，供写入 meta.json。
+    """
+
+    def __init__(self, path, channels, samplerate, sample_width=2, block_frames=DEFAULT_BLOCK_FRAMES):
+        if sample_width != 2:
+            raise ValueError("RTLC 仅支持 16-bit PCM")
+        self.path = path
+        self.channels = channels
+        self.sr = samplerate
+        self.block_frames = block_frames
+        self.frame_bytes = channels * sample_width
+        self.f = open(path, "wb")
+        self.f.write(HEADER.pack(MAGIC, VERSION, channels, samplerate, block_frames, 0, 0))
+        self._pending = bytearray()
+        self._offsets = []
+        self._frames = []
+        self.total_frames = 0
+        self.data_bytes = 0          # 原始 PCM 字节数
+        self.encoded_bytes = HEADER.size
+        self.encode_cpu = 0.0
+
+    def _emit(self, raw):
+        t0 = time.thread_time()
+        frames = np.frombuffer(raw, dtype="<i2").reshape(-1, self.channels)
+        blk = encode_block(frames)
+        self.encode_cpu += time.thread_time() - t0
+        self._offsets.append(self.encoded_bytes)
+        self._frames.append(len(frames))
+        self.f.write(blk)
+        self.encoded_bytes += len(blk)
+        self.total_frames += len(frames)
+
+    def write(self, buf):
+        self._pending += buf
+        self.data_bytes += len(buf)
+        block_bytes = self.block_frames * self.frame_bytes
+        if len(self._pending) < block_bytes:
+            return
+        mv = memoryview(self._pending)
+        pos = 0
+        while len(self._pending) - pos >= block_bytes:
+            self._emit(mv[pos:pos + block_bytes]); pos += block_bytes
+        mv.release()
+        del self._pending[:pos]
+
+    def patch(self):
+        self.f.flush()
+
+    def close(self):
+        try:
+            if self._pending:
+                self._emit(bytes(self._pending)); self._pending = bytearray()
+            index_offset = self.encoded_bytes
+            self.f.write(INDEX.pack(INDEX_MAGIC, len(self._offsets)))
+            self.f.write(np.asarray(self._offsets, dtype="<u8").tobytes())
+            self.f.write(np.asarray(self._frames, dtype="<u4").tobytes())
+            self.f.seek(0)
+            self.f.write(HEADER.pack(MAGIC, VERSION, self.channels, self.sr, self.block_frames,
+                                     self.total_frames, index_offset))
+        finally:
+            self.f.close()
+
+    def stats(self) -> dict:
+        audio_sec = self.total_frames / float(self.sr) if self.sr else 0.0
+        return {
+            "codec": "rtlc",
+            "block_frames": self.block_frames,
+            "pcm_bytes": self.data_bytes,
+            "encoded_bytes": self.encoded_bytes,
+            "ratio": round(self.data_bytes / float(max(1, self.encoded_bytes)), 3),
+            "encode_cpu_seconds": round(self.encode_cpu, 3),
+            "encode_cpu_per_audio_second": round(self.encode_cpu / audio_sec, 5) if audio_sec else 0.0,
+        }
+
+
+# ----------------------------------------------------------------------
+# 读取（回放，按块随机访问）
+# ----------------------------------------------------------------------
+def _scan_blocks(f, start, end):
+    """没有索引时（录音中途崩溃）顺序扫描块头；截断的尾块丢弃。"""
+    offsets, frames = [], []
+    pos = start
+    while pos + BLOCK.size <= end:
+        f.seek(pos)
+        magic, n, plen = BLOCK.unpack(f.read(BLOCK.size))
+        if magic != BLOCK_MAGIC or pos + BLOCK.size + plen > end:
+            break
+        offsets.append(pos); frames.append(n)
+        pos += BLOCK.size + plen
+    return offsets, frames, pos
+
+
+class RtlcFrames:
+    """
+    与 np.memmap 帧数组同样用法：len() 与 [a:b] 切片，可在多个线程中同时切片；
+    只读取并解码切片覆盖的块，最近用过的块缓存在内存里。
+    """
+
+    def __init__(self, path, cache_blocks=8, base=0, size=None):
+        # base/size：嵌在会话文件包中时该段的位置；文件内各偏移都相对于 base
+        self.path = path
+        self._f = open(path, "rb")
+        self._f.seek(base)
+        magic, ver, ch, sr, bf, total, index_off = HEADER.unpack(self._f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("不是 RTLC 文件")
+        self.channels, self.sr, self.block_frames = ch, sr, bf
+        if index_off:
+            self._f.seek(base + index_off)
+            _m, count = INDEX.unpack(self._f.read(INDEX.size))
+            offs = np.frombuffer(self._f.read(8 * count), "<u8").astype(np.int64)
+            frs = np.frombuffer(self._f.read(4 * count), "<u4").astype(np.int64)
+            self.ends = list(offs[1:] + base) + [base + index_off]
+            offs = offs + base
+        else:
+            end = base + (os.path.getsize(path) - base if size is None else size)
+            offs, frs, end = _scan_blocks(self._f, base + HEADER.size, end)
+            self.ends = offs[1:] + [end]
+            offs = np.asarray(offs, np.int64); frs = np.asarray(frs, np.int64)
+        self.offsets = offs
+        self.starts = np.concatenate(([0], np.cumsum(frs)[:-1])) if len(frs) else np.zeros(0, np.int64)
+        self._len = int(frs.sum()) if len(frs) else 0
+        self.shape = (self._len, self.channels)
+        self._cache = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._len
+
+    def _block(self, i):
+        # 可被多个线程同时切片（并行导出片段）：缓存的查找/更新与文件读取都在锁内，解码在锁外
+        with self._lock:
+            blk = self._cache.get(i)
+            if blk is not None:
+                self._cache.move_to_end(i); return blk
+            off = int(self.offsets[i])
+            self._f.seek(off)
+            buf = self._f.read(int(self.ends[i]) - off)
+        blk = decode_block(buf, self.channels)
+        with self._lock:
+            self._cache[i] = blk
+            self._cache.move_to_end(i)
+            while len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        return blk
+
+    def __getitem__(self, sl):
+        if not isinstance(sl, slice):
+            raise TypeError("RtlcFrames 只支持切片")
+        a, b, _ = sl.indices(self._len)
+        if b <= a:
+            return np.zeros((0, self.channels), dtype=np.int16)
+        i = int(np.searchsorted(self.starts, a, side="right")) - 1
+        out = []
+        while a < b:
+            base = int(self.starts[i]); blk = self._block(i)
+            hi = min(b, base + len(blk))
+            out.append(blk[a - base:hi - base])
+            a = hi; i += 1
+        return out[0] if len(out) == 1 else np.concatenate(out)
+
+    def close(self):
+        self._f.close()
+
+
+def repair_rtlc(path) -> bool:
+    """崩溃留下的无索引文件：扫描块头、截掉残块并补写索引。有改动返回 True。"""
+    with open(path, "r+b") as f:
+        magic, ver, ch, sr, bf, total, index_off = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or index_off:
+            return False
+        offs, frs, end = _scan_blocks(f, HEADER.size, os.path.getsize(path))
+        f.seek(end); f.truncate()
+        f.write(INDEX.pack(INDEX_MAGIC, len(offs)))
+        f.write(np.asarray(offs, dtype="<u8").tobytes())
+        f.write(np.asarray(frs, dtype="<u4").tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, ch, sr, bf, int(sum(frs)), end))
+    return True
+
+
+# ----------------------------------------------------------------------
+# 编码器注册 / 批量转换
+# ----------------------------------------------------------------------
+ENCODERS = {"rtlc": (EXTENSION, RtlcSink)}
+
+
+def make_sink(codec, path, channels, samplerate, sample_width):
+    """按名称创建编码写入器；未知名称抛 ValueError。"""
+    try:
+        _ext, cls = ENCODERS[codec]
+    except KeyError:
+        raise ValueError(f"未知的编码格式：{codec}")
+    return cls(path, channels, samplerate, sample_width)
+
+
+def convert_wav(src, dst, block_frames=DEFAULT_BLOCK_FRAMES, verify=True):
+    """把 WAV 流式转成 RTLC（逐块读取，内存占用与时长无关）；返回压缩统计。"""
+    from .wavio import open_frames
+    frames, sr, ch = open_frames(src)
+    sink = RtlcSink(dst, ch, sr, 2, block_frames)
+    try:
+        step = block_frames * 64
+        for a in range(0, len(frames), step):
+            sink.write(np.ascontiguousarray(frames[a:a + step]).tobytes())
+    finally:
+        sink.close()
+    if verify:
+        out = RtlcFrames(dst)
+        try:
+            if len(out) != len(frames):
+                raise ValueError("校验失败：帧数不一致")
+            for a in range(0, len(frames), step):
+                if not np.array_equal(out[a:a + step], frames[a:a + step]):
+                    raise ValueError("校验失败：解码结果与原始音频不一致")
+        finally:
+            out.close()
+    return sink.stats()
+
+
+def compress_session(session_dir, remove_source=True):
+    """
+    把会话里的 audio.wav 转为 audio.rtlc（先写临时文件，校验通过后再替换），
+    并把压缩统计写入 meta.json。没有可转换的 WAV 时返回 None。
+    """
+    from .storage import save_json
+    src = os.path.join(session_dir, "audio.wav")
+    dst = os.path.join(session_dir, "audio" + EXTENSION)
+    if not os.path.isfile(src) or os.path.exists(dst):
+        return None
+    tmp = dst + ".tmp"
+    try:
+        stats = convert_wav(src, tmp)
+    except Exception:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    os.replace(tmp, dst)
+    meta_path = os.path.join(session_dir, "meta.json")
+    meta = {}
+    if os.path.exists(meta_path):
+        try: meta = json.load(open(meta_path, "r", encoding="utf-8"))
+        except Exception: meta = {}
+    meta["audio_path"] = dst
+    meta["compression"] = stats
+    save_json(meta_path, meta)      # 原子替换：中途崩溃也不会留下截断的 meta.json
+    if remove_source:
+        os.remove(src)
+    return stats
+
+
+def _session_finished(session_dir) -> bool:
+    """meta.json 已写入时长：录音已正常结束（正在录音或崩溃未恢复的会话不压缩）。"""
+    try:
+        with open(os.path.join(session_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("duration_seconds") is not None
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def compress_sessions(root, progress=None, stop_event=None, remove_source=True, skip=()):
+    """
+    批量压缩 root 下所有已结束的会话（供后台线程调用）；skip 中的会话（正在录音、正在回放）跳过。
+    progress(done, total, session_dir, stats_or_error) 每完成一个会话回调一次。
+    """
+    skip = {os.path.realpath(d) for d in skip if d}
+    dirs = [os.path.join(root, n) for n in sorted(os.listdir(root))
+            if n.startswith("session_") and os.path.isfile(os.path.join(root, n, "audio.wav"))]
+    dirs = [d for d in dirs if os.path.realpath(d) not in skip and _session_finished(d)]
+    results = {}
+    for i, d in enumerate(dirs, 1):
+        if stop_event is not None and stop_event.is_set():
+            break
+        try:
+            res = compress_session(d, remove_source=remove_source)
+        except Exception as e:
+            res = e
+        results[d] = res
+        if progress:
+            progress(i, len(dirs), d, res)
+    return results
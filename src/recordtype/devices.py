@@ -0,0 +1,152 @@
+# src/recordtype/devices.py
+"""
+输入设备注册表：
+- 一次枚举全部输入设备并缓存；不再改动 sounddevice 的全局默认值（sd.default.hostapi）
+- 设备用稳定身份（HostAPI 名 + 设备名 + 同名序号）标识，而不是随插拔变化的 PortAudio 序号
+- 插拔检测要重新初始化 PortAudio，这里用的是 sounddevice 的私有函数 sd._terminate() / sd._initialize()
+  （sounddevice 没有公开的重扫接口，升级时需要确认仍然存在）。重初始化会关闭现有流、且较慢，所以只在
+  用户点“刷新设备”、resolve() 找不到选中设备、以及每 POLL_SECONDS 秒一次的低频轮询时进行，
+  有音频流打开时跳过
+- start() 前用 resolve() 把选中的身份换算成当前序号：两次重初始化之间 PortAudio 的设备表不变，
+  缓存的序号一直有效
+所有 PortAudio 调用都在 lock 内进行；界面打开录音/播放流时也持有它，避免与后台重扫并发。
+界面线程只用非阻塞方式获取 lock（重扫进行中时提示或稍后重试），不会因后台重新初始化而卡住。
+"""
+import threading
+from collections import namedtuple
+from typing import Callable, List, Optional
+
+HOSTAPI_PREFERENCE = ("Windows WASAPI", "Windows DirectSound", "MME")
+POLL_SECONDS = 60.0
+
+# key: (hostapi 名, 设备名, 同名序号)；index 只在本次枚举内有效
+InputDevice = namedtuple("InputDevice", "key index name hostapi channels samplerate")
+
+
+def device_label(dev: InputDevice) -> str:
+    name = dev.name if not dev.key[2] else f"{dev.name} #{dev.key[2] + 1}"
+    return f"{name} ({dev.hostapi})" if dev.hostapi else name
+
+
+def enumerate_inputs(sd) -> List[InputDevice]:
+    """
+    查询一次 PortAudio：优先 WASAPI -> DirectSound -> MME 中第一个有输入设备的 HostAPI，
+    都没有时返回全部输入设备。
+    """
+    hostapis = sd.query_hostapis()
+    devs = sd.query_devices()
+    api_names = [h.get("name", "") for h in hostapis]
+
+    def build(filter_api):
+        out, seen = [], {}
+        for i, d in enumerate(devs):
+            if d.get("max_input_channels", 0) <= 0: continue
+            api = api_names[d.get("hostapi", 0)] if d.get("hostapi", 0) < len(api_names) else ""
+            if filter_api is not None and api != filter_api: continue
+            name = d.get("name", "Unknown")
+            n = seen.get((api, name), 0); seen[(api, name)] = n + 1
+            out.append(InputDevice((api, name, n), i, name, api, int(d.get("max_input_channels", 0)),
+                                   float(d.get("default_samplerate") or 0)))
+        return out
+
+    for api in HOSTAPI_PREFERENCE:
+        if api in api_names:
+            out = build(api)
+            if out: return out
+    return build(None)
+
+
+class DeviceRegistry:
+    """
+    缓存的输入设备列表。generation 在列表变化时加一，界面据此决定是否刷新下拉框。
+    can_rescan()：后台轮询前调用，返回 False（正在录音/播放）时本轮不重新初始化 PortAudio。
+    """
+
+    def __init__(self, can_rescan: Optional[Callable[[], bool]] = None, poll_seconds: float = POLL_SECONDS):
+        self.lock = threading.RLock()
+        self.devices: List[InputDevice] = []
+        self.generation = 0
+        self.error: Optional[Exception] = None
+        self.ready = False
+        self._can_rescan = can_rescan or (lambda: True)
+        self._poll_seconds = poll_seconds
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    # ---------- 枚举 ----------
+    def _scan(self, reinit: bool):
+        import sounddevice as sd    # 首次使用才导入（会初始化 PortAudio）
+        with self.lock:
+            if reinit:
+                # PortAudio 只在初始化时建立设备表：插拔后必须重新初始化才能看到（私有 API）
+                sd._terminate(); sd._initialize()
+            try:
+                devices = enumerate_inputs(sd)
+                self.error = None
+            except Exception as e:
+                self.error = e
+                devices = []
+            if [d[:2] for d in devices] != [d[:2] for d in self.devices]:
+                self.devices = devices
+                self.generation += 1
+            self.ready = True
+            return self.devices
+
+    def refresh(self, reinit: bool = False) -> List[InputDevice]:
+        """同步枚举（reinit 时先重新初始化 PortAudio）；有流打开时调用者不应 reinit。"""
+        return self._scan(reinit)
+
+    def start(self):
+        """后台线程：立即枚举一次，之后每 poll_seconds 秒或 request_rescan() 时在空闲时重扫。"""
+        if self._thread and self._thread.is_alive(): return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def request_rescan(self):
+        """让后台线程尽快重新初始化并重扫（用户点“刷新设备”）。"""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set(); self._wake.set()
+
+    def _worker(self):
+        first = True
+        while not self._stop.is_set():
+            try:
+                if first:
+                    self._scan(False)
+                else:
+                    with self.lock:
+                        if self._can_rescan():
+                            self._scan(True)
+            except Exception as e:
+                self.error = e; self.ready = True
+            first = False
+            self._wake.wait(self._poll_seconds); self._wake.clear()
+
+    # ---------- 查找 ----------
+    def find(self, key) -> Optional[InputDevice]:
+        for d in self.devices:
+            if d.key == key: return d
+        return None
+
+    def resolve(self, key, rescan: bool = True) -> Optional[int]:
+        """
+        选中设备的当前 PortAudio 序号；key 为 None 时返回 None（默认设备）。
+        缓存里找不到且 rescan 时重新初始化 PortAudio 再找一次；仍不存在抛 LookupError。
+        """
+        return self.resolve_all([key], rescan)[0]
+
+    def resolve_all(self, keys, rescan: bool = True) -> List[Optional[int]]:
+        """多个设备一起解析：最多重新初始化一次，所有序号都来自同一张设备表。"""
+        with self.lock:
+            devs = [None if k is None else self.find(k) for k in keys]
+            if rescan and any(d is None and k is not None for d, k in zip(devs, keys)) and self._can_rescan():
+                self._scan(True)
+                devs = [None if k is None else self.find(k) for k in keys]
+        for d, k in zip(devs, keys):
+            if d is None and k is not None:
+                raise LookupError(f"输入设备已断开：{k[1]}")
+        return [None if d is None else d.index for d in devs]
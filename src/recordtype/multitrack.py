@@ -0,0 +1,383 @@
+# src/recordtype/multitrack.py
+"""
+多设备同时录音：
+- 每个输入设备一个 TrackRecorder（AudioRecorder 子类）：各自的输入流、回调、环形缓冲与写线程
+- 回调只记录时间戳：首帧的采集时刻（perf_counter 时钟，按 PortAudio 报告的输入延迟回推）
+  与最近一块的 (此前累计帧数, 采集时刻)，整体替换一个元组，写线程读取无需加锁
+- 写线程经 AlignedSink 落盘：开头补静音，把各轨对齐到同一起点 t0；
+  之后按实测采样率与标称值之比估计时钟漂移，每块最多增删 0.2% 的帧，逐步追上公共时间轴
+- 结果为 audio_tracks/track_NN.wav + tracks.json；需要时由 merge_tracks 另外导出一个多声道 WAV
+  （界面在停止后放到后台线程执行），会话本身始终保留各轨
+回放时 MixedFrames 把各轨按帧相加（单声道轨铺到所有声道），与普通会话一样支持 len() 和切片；
+笔记标记是公共时间轴上的秒数，对所有轨同样有效。
+"""
+import json
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from .audio import AudioRecorder
+from .wavio import WavSink, _map_wav, find_wav_data, repair_wav_header, TRACKS_DIRNAME, TRACKS_INDEX
+
+MULTICHANNEL_NAME = "audio_multichannel.wav"   # 导出的多声道文件（不是会话音频，回放不用它）
+DRIFT_MIN_SECONDS = 30.0      # 估计漂移所需的最短基线（回调到达时刻的抖动约为毫秒级）
+DRIFT_MAX_PPM = 2000.0        # 估计值超出这个范围视为异常，按该值截断
+MAX_CORRECTION = 1.0 / 500    # 每块最多增删的帧比例
+
+
+def track_name(i: int) -> str:
+    return f"track_{i:02d}.wav"
+
+
+def list_tracks(dirpath):
+    return sorted(n for n in os.listdir(dirpath) if n.startswith("track_") and n.endswith(".wav"))
+
+
+def is_tracks_dir(path) -> bool:
+    return os.path.isdir(path) and (os.path.basename(os.path.normpath(path)) == TRACKS_DIRNAME
+                                    or os.path.exists(os.path.join(path, TRACKS_INDEX)))
+
+
+# ---------- 录音 ----------
+class AlignedSink:
+    """包在 WavSink 外：开头补静音对齐到 t0，并按估计的时钟漂移增删帧。"""
+
+    def __init__(self, inner, track: "TrackRecorder", t0: float):
+        self.inner = inner
+        self.track = track
+        self.t0 = t0
+        self.fb = track.frame_bytes()
+        self.sr = track.sr
+        self.pad = None           # 开头补的静音帧数
+        self.frames_in = 0        # 从设备收到的帧
+        self.frames_out = 0       # 实际写入的帧（含补的静音）
+        self.inserted = 0
+        self.dropped = 0
+        self.ratio = 1.0
+
+    def _start(self):
+        first = self.track.first_perf
+        self.pad = max(0, int(round((first - self.t0) * self.sr))) if first is not None else 0
+        zeros = bytes(min(self.pad, self.sr) * self.fb)
+        left = self.pad
+        while left > 0:
+            n = min(left, self.sr)
+            self.inner.write(zeros[:n * self.fb]); left -= n
+        self.frames_out = self.pad
+
+    def _estimate_ratio(self):
+        """设备标称采样率 / 实测采样率（perf_counter 为参考时钟）；基线不足时为 1。重采样不改变这个比值。"""
+        first, clock = self.track.first_perf, self.track.clock
+        if first is None or clock is None:
+            return self.ratio
+        frames, t = clock
+        span = t - first
+        if span < DRIFT_MIN_SECONDS or frames <= 0:
+            return self.ratio
+        measured = frames / span
+        lim = DRIFT_MAX_PPM * 1e-6
+        return min(1.0 + lim, max(1.0 - lim, self.track.in_sr / measured))
+
+    def write(self, buf):
+        mv = memoryview(buf)
+        if self.pad is None:
+            self._start()
+        n = mv.nbytes // self.fb
+        self.frames_in += n
+        self.ratio = self._estimate_ratio()
+        delta = self.pad + int(round(self.frames_in * self.ratio)) - (self.frames_out + n)
+        limit = max(1, int(n * MAX_CORRECTION))
+        delta = max(-limit, min(limit, delta))
+        if delta < 0:
+            # 设备时钟偏快：从块尾丢掉几帧
+            mv = mv[:(n + delta) * self.fb]
+            self.dropped -= delta
+        self.inner.write(mv)
+        self.frames_out += mv.nbytes // self.fb
+        if delta > 0 and n:
+            # 设备时钟偏慢：重复块尾最后一帧
+            last = bytes(mv[-self.fb:])
+            self.inner.write(last * delta)
+            self.frames_out += delta
+            self.inserted += delta
+
+    def patch(self):
+        self.inner.patch()
+
+    def close(self):
+        self.inner.close()
+
+    def stats(self) -> dict:
+        return {"offset_frames": self.pad or 0, "frames_in": self.frames_in, "frames_out": self.frames_out,
+                "drift_ppm": round((1.0 / self.ratio - 1.0) * 1e6, 2),
+                "inserted_frames": self.inserted, "dropped_frames": self.dropped}
+
+
+class TrackRecorder(AudioRecorder):
+    """多设备录音中的一轨：回调额外记录采集时刻，写入经 AlignedSink 对齐。"""
+
+    def __init__(self, t0: float, **kwargs):
+        super().__init__(**kwargs)
+        self.t0 = t0
+        self.first_perf: Optional[float] = None
+        self.clock = None          # (此前累计帧数, 本块首帧的采集时刻)
+        self._frames_before = 0
+
+    def _callback(self, indata, frames, time_info, status):
+        now = time.perf_counter()
+        # 本块首帧的采集时刻：PortAudio 给出输入延迟时按其回推，否则按块长估计
+        try:
+            lat = time_info.currentTime - time_info.inputBufferAdcTime
+        except AttributeError:
+            lat = 0.0
+        if not 0.0 < lat < 1.0:
+            lat = frames / self.in_sr
+        adc = now - lat
+        if self.first_perf is None:
+            self.first_perf = adc
+        self.clock = (self._frames_before, adc)
+        self._frames_before += frames
+        super()._callback(indata, frames, time_info, status)
+
+    def _open_sink(self, audio_path: str):
+        return AlignedSink(WavSink(audio_path, self.channels, self.sr, self.sample_width), self, self.t0)
+
+
+def _merge_snapshots(snaps: List[dict]) -> dict:
+    """多轨健康统计合并：计数相加，比例与分位数取最差一轨，供状态栏 / 日志沿用单轨格式。"""
+    snaps = [s for s in snaps if s]
+    if not snaps:
+        return {}
+    out = dict(snaps[0])
+    for k in ("callbacks", "frames_in", "input_overflows", "input_underflows", "late_callbacks",
+              "ring_capacity_bytes", "ring_high_water_bytes", "ring_overflows", "ring_dropped_bytes",
+              "writes", "bytes_written"):
+        out[k] = sum(s[k] for s in snaps)
+    out["ring_high_water_ratio"] = max(s["ring_high_water_ratio"] for s in snaps)
+    out["callback_jitter"] = max((s["callback_jitter"] for s in snaps), key=lambda h: h["p95_ms"])
+    out["write_latency"] = max((s["write_latency"] for s in snaps), key=lambda h: h["p95_ms"])
+    out["tracks"] = snaps
+    return out
+
+
+class MultiRecorder:
+    """
+    同时从多个输入设备录音，接口与 AudioRecorder 一致（界面按同样方式调用）。
+    devices：PortAudio 输入设备序号列表；每个设备写一轨到 audio_tracks/。
+    """
+
+    def __init__(self, devices, samplerate: int = 44100, channels: int = 1, sample_width: int = 2,
+                 labels=None):
+        self.device = list(devices)
+        self.labels = list(labels or [None] * len(self.device))
+        self.sr = samplerate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.segment_seconds = None
+        self.codec = None
+        self.sink_stats: dict = {}
+        self.capture_stats: dict = {}          # 各轨的设备格式记在 tracks_info 中
+        self.telemetry_summary: dict = {}
+        self.speech_segments: list = []
+        self.tracks_info: list = []
+        self.tracks: List[TrackRecorder] = []
+        self.is_recording = False
+        self.audio_path: Optional[str] = None
+        self._start_perf: Optional[float] = None
+
+    def set_device(self, devices):
+        self.device = list(devices)
+
+    def start(self, audio_path: str, peaks_path: Optional[str] = None, speech_path: Optional[str] = None):
+        """audio_path 为 audio_tracks 目录。波形峰值与语音段在回放时按混音结果补算，这里不生成。"""
+        os.makedirs(audio_path, exist_ok=True)
+        self.audio_path = audio_path
+        self.telemetry_summary = {}
+        self.tracks_info = []
+        t0 = time.perf_counter()
+        self.tracks = []
+        try:
+            for i, dev in enumerate(self.device):
+                tr = TrackRecorder(t0, samplerate=self.sr, channels=self.channels,
+                                   sample_width=self.sample_width, device=dev)
+                tr.start(os.path.join(audio_path, track_name(i)))
+                self.tracks.append(tr)
+        except Exception:
+            for tr in self.tracks:
+                try: tr.stop()
+                except Exception: pass
+            self.tracks = []
+            raise
+        self._start_perf = t0
+        self.is_recording = True
+        self._write_index(final=False)
+
+    def _write_index(self, final: bool):
+        from .storage import save_json
+        info = []
+        for i, tr in enumerate(self.tracks):
+            st = tr.sink_stats if final else {}
+            info.append({"file": track_name(i), "device_index": self.device[i], "device": self.labels[i],
+                         "channels": tr.channels, "device_sample_rate": tr.in_sr,
+                         "device_channels": tr.in_channels, **st})
+        self.tracks_info = info
+        save_json(os.path.join(self.audio_path, TRACKS_INDEX),
+                  {"version": 1, "sample_rate": self.sr, "sample_width": self.sample_width,
+                   "complete": final, "tracks": info})
+
+    def elapsed_hms(self) -> str:
+        sec = self.elapsed_seconds()
+        h, r = divmod(int(sec), 3600)
+        m, s = divmod(r, 60)
+        return f"{h:02d}:{m:02d}:{s:02d}"
+
+    def elapsed_seconds(self) -> float:
+        if not self._start_perf:
+            return 0.0
+        return max(0.0, time.perf_counter() - self._start_perf)
+
+    def telemetry_snapshot(self) -> dict:
+        return _merge_snapshots([tr.telemetry_snapshot() for tr in self.tracks])
+
+    def stop(self) -> float:
+        duration = self.elapsed_seconds()
+        self.is_recording = False
+        errors = []
+        for tr in self.tracks:
+            try: tr.stop()
+            except Exception as e: errors.append(e)
+        self.telemetry_summary = _merge_snapshots([tr.telemetry_summary for tr in self.tracks])
+        self._write_index(final=True)
+        self.sink_stats = {}
+        self._start_perf = None
+        if errors:
+            raise errors[0]
+        return round(duration, 3)
+
+
+# ---------- 回放 ----------
+def track_gains(index: dict, names):
+    """tracks.json 中各轨的 gain（缺省 1.0），按 names 的顺序。"""
+    try:
+        gains = {t["file"]: float(t.get("gain", 1.0)) for t in index.get("tracks", [])}
+    except (AttributeError, KeyError, TypeError, ValueError):
+        gains = {}
+    return [gains.get(n, 1.0) for n in names]
+
+
+class MixedFrames:
+    """
+    各轨（已在录音时对齐）按帧相加：len() 为最长一轨，[a:b] 返回 int16 [n, channels]。
+    单声道轨加到所有声道，多声道轨按声道对应相加；相加结果截断到 int16 范围。
+    """
+
+    def __init__(self, dirpath):
+        names = list_tracks(dirpath)
+        try:
+            with open(os.path.join(dirpath, TRACKS_INDEX), "r", encoding="utf-8") as f:
+                gains = track_gains(json.load(f), names)
+        except (OSError, ValueError):
+            gains = None
+        self._add_tracks([_map_wav(os.path.join(dirpath, n)) for n in names], gains)
+
+    @classmethod
+    def from_maps(cls, maps, gains=None):
+        """由已映射的 (data, sr, ch) 列表构造（会话文件包中的各轨）。"""
+        self = cls.__new__(cls)
+        self._add_tracks(list(maps), gains)
+        return self
+
+    def _add_tracks(self, maps, gains=None):
+        if not maps:
+            raise ValueError("没有音轨")
+        rates = {sr for _d, sr, _ch in maps}
+        if len(rates) > 1:
+            raise ValueError("各轨采样率不一致")
+        self.sr = rates.pop()
+        self.tracks = [d for d, _sr, _ch in maps]
+        self.gains = list(gains or [1.0] * len(maps))
+        self.channels = max(ch for _d, _sr, ch in maps)
+        self._len = max(len(d) for d in self.tracks)
+        self.shape = (self._len, self.channels)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, sl):
+        if not isinstance(sl, slice):
+            raise TypeError("MixedFrames 只支持切片")
+        a, b, _ = sl.indices(self._len)
+        if b <= a:
+            return np.zeros((0, self.channels), dtype=np.int16)
+        acc = np.zeros((b - a, self.channels), dtype=np.int32)
+        for data, g in zip(self.tracks, self.gains):
+            part = np.asarray(data[a:min(b, len(data))])
+            if not len(part): continue
+            if g != 1.0:
+                part = (part * g).astype(np.int32)
+            m = len(part)
+            if part.shape[1] == 1:
+                acc[:m] += part
+            else:
+                acc[:m, :part.shape[1]] += part
+        np.clip(acc, -32768, 32767, out=acc)
+        return acc.astype(np.int16)
+
+
+def open_tracks(dirpath):
+    fr = MixedFrames(dirpath)
+    return fr, fr.sr, fr.channels
+
+
+def tracks_format_and_frames(dirpath):
+    """(sample_rate, 混音声道数, sample_width, 总帧数)：只读各轨头部。"""
+    sr, ch, sw, total = 44100, 1, 2, 0
+    for n in list_tracks(dirpath):
+        c, sr, sw, _off, frames = find_wav_data(os.path.join(dirpath, n))
+        ch = max(ch, c); total = max(total, frames)
+    return sr, ch, sw, total
+
+
+def repair_tracks(dirpath) -> bool:
+    """崩溃后修正各轨 WAV 头长度；有改动返回 True。"""
+    changed = False
+    for n in list_tracks(dirpath):
+        changed |= repair_wav_header(os.path.join(dirpath, n))
+    return changed
+
+
+def merge_tracks(dirpath, out_path, chunk_frames=1 << 16, progress=None, stop_event=None):
+    """
+    把各轨（已对齐）并排写成一个多声道 WAV：第 i 轨的各声道依次排列，短的轨补零。
+    只用于导出（声道数为各轨之和，普通立体声输出放不了）；先写临时文件，完成后改名。
+    progress(done_frames, total_frames) 每块回调一次；stop_event 置位时中止并删除临时文件。
+    """
+    names = list_tracks(dirpath)
+    maps = [_map_wav(os.path.join(dirpath, n)) for n in names]
+    if not maps:
+        raise ValueError("没有音轨")
+    sr = maps[0][1]
+    total = max(len(d) for d, _sr, _ch in maps)
+    out_ch = sum(ch for _d, _sr, ch in maps)
+    tmp = out_path + ".tmp"
+    sink = WavSink(tmp, out_ch, sr, 2)
+    try:
+        for a in range(0, total, chunk_frames):
+            if stop_event is not None and stop_event.is_set():
+                raise RuntimeError("cancelled")
+            b = min(total, a + chunk_frames)
+            block = np.zeros((b - a, out_ch), dtype="<i2")
+            col = 0
+            for data, _sr, ch in maps:
+                part = np.asarray(data[a:min(b, len(data))])
+                block[:len(part), col:col + ch] = part
+                col += ch
+            sink.write(block.tobytes())
+            if progress: progress(b, total)
+    except BaseException:
+        sink.close(); os.remove(tmp); raise
+    sink.close()
+    os.replace(tmp, out_path)
+    return out_path
@@ -0,0 +1,150 @@
+# src/recordtype/notes.py
+"""
+笔记解析（不依赖 Tk）：
+- 去掉 [HH:MM:SS] 时间戳，得到纯文本
+- 同时记录每个时间戳在纯文本中的字符偏移
+- 单遍扫描、偏移累加，可按块流式读取很大的 notes.md
+回放页与批处理工具共用这里的结果。
+"""
+import os
+import re
+import json
+import struct
+from array import array
+
+import numpy as np
+
+from .storage import save_text
+
+TIMESTAMP_RE = re.compile(r"\[(\d{2}):(\d{2}):(\d{2})\]")
+_TAG_LEN = len("[00:00:00]")
+NOTES_HEADER = "# 笔记\n\n"      # 保存 notes.md 时加在正文前
+
+ANCHORS_BIN = "anchors.bin"
+_ANCHOR_MAGIC = b"RTAN"
+_ANCHOR_HEADER = struct.Struct("<4sHI")   # magic, version, count；随后 float64[count] 秒、int32[count] 偏移
+
+
+class NotesParser:
+    """
+    增量解析器：feed() 逐块喂入文本，finish() 返回 (clean, times, offsets)。
+    - times：array('d')，时间戳秒数（按出现顺序）
+    - offsets：array('q')，对应的纯文本字符偏移
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._clean_len = 0
+        self._carry = ""
+        self.times = array("d")
+        self.offsets = array("q")
+
+    def _emit(self, s):
+        if s:
+            self._parts.append(s)
+            self._clean_len += len(s)
+
+    def feed(self, chunk: str):
+        buf = self._carry + chunk
+        i = 0
+        for m in TIMESTAMP_RE.finditer(buf):
+            self._emit(buf[i:m.start()])
+            i = m.end()
+            h, m2, s = map(int, m.groups())
+            self.times.append(float(h*3600 + m2*60 + s))
+            self.offsets.append(self._clean_len)
+        tail = buf[i:]
+        # 末尾可能是被块边界截断的半个时间戳，留到下一块再判断
+        k = tail.rfind("[", max(0, len(tail) - (_TAG_LEN - 1)))
+        if k == -1:
+            self._emit(tail); self._carry = ""
+        else:
+            self._emit(tail[:k]); self._carry = tail[k:]
+
+    def finish(self):
+        self._emit(self._carry); self._carry = ""
+        return "".join(self._parts), self.times, self.offsets
+
+
+def parse_notes(text: str):
+    """一次性解析整段文本，返回 (clean, times, offsets)。"""
+    p = NotesParser()
+    p.feed(text)
+    return p.finish()
+
+
+def parse_notes_file(path: str, chunk_size: int = 1 << 20):
+    """按块流式读取并解析 notes.md，返回 (clean, times, offsets)。"""
+    p = NotesParser()
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk: break
+            p.feed(chunk)
+    return p.finish()
+
+
+def sorted_markers(times, offsets):
+    """按时间稳定排序，返回 [(sec, offset), ...]。"""
+    return sorted(zip(times, offsets), key=lambda x: x[0])
+
+
+def save_anchors(session_dir: str, times, offsets):
+    """
+    写锚点：anchors.bin（列式二进制，回放时一次映射读取）+ 紧凑的 anchors.json（兼容旧版本）。
+    times 为 array('d') 秒数，offsets 为 array('i') notes.md 中的字符偏移。
+    """
+    tmp = os.path.join(session_dir, ANCHORS_BIN + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_ANCHOR_HEADER.pack(_ANCHOR_MAGIC, 1, len(times)))
+        f.write(np.asarray(times, dtype="<f8").tobytes())
+        f.write(np.asarray(offsets, dtype="<i4").tobytes())
+    os.replace(tmp, os.path.join(session_dir, ANCHORS_BIN))
+    save_text(os.path.join(session_dir, "anchors.json"),
+              json.dumps([{"t": round(t, 3), "len": o} for t, o in zip(times, offsets)],
+                         separators=(",", ":")))
+
+
+def load_anchors_bin(path: str, base: int = 0):
+    """映射 anchors.bin（或文件包中从 base 开始的该段），返回 (times, offsets) 两个 NumPy 数组（只读视图）。"""
+    with open(path, "rb") as f:
+        f.seek(base)
+        magic, _ver, n = _ANCHOR_HEADER.unpack(f.read(_ANCHOR_HEADER.size))
+    if magic != _ANCHOR_MAGIC:
+        raise ValueError("不是锚点文件")
+    if n == 0:
+        return np.zeros(0, "<f8"), np.zeros(0, "<i4")
+    mm = np.memmap(path, dtype=np.uint8, mode="r", offset=base + _ANCHOR_HEADER.size, shape=(n * 12,))
+    return mm[:n * 8].view("<f8"), mm[n * 8:].view("<i4")
+
+
+def load_anchor_markers(path: str):
+    """
+    读取锚点 -> [(sec, offset), ...]：path 可为会话目录、anchors.bin 或 anchors.json。
+    按时间排序，并合并连续相同偏移的锚点（只保留最早一个）。
+    """
+    if os.path.isdir(path):
+        p = os.path.join(path, ANCHORS_BIN)
+        path = p if os.path.exists(p) else os.path.join(path, "anchors.json")
+    if path.endswith(".bin"):
+        return anchor_markers_from_bin(*load_anchors_bin(path))
+    return anchor_markers_from_json(json.load(open(path, "r", encoding="utf-8")))
+
+
+def anchor_markers_from_bin(t, o):
+    """load_anchors_bin 的结果 -> 排序去重后的 [(sec, offset), ...]。"""
+    order = np.argsort(t, kind="stable")
+    return _dedup_markers(zip(t[order].tolist(), o[order].tolist()))
+
+
+def anchor_markers_from_json(anchors):
+    """anchors.json 的内容 -> 排序去重后的 [(sec, offset), ...]。"""
+    return _dedup_markers(sorted(((float(a["t"]), int(a["len"])) for a in anchors), key=lambda x: x[0]))
+
+
+def _dedup_markers(markers):
+    dedup, last_off = [], -1
+    for sec, off in markers:
+        if off != last_off:
+            dedup.append((sec, off)); last_off = off
+    return dedup
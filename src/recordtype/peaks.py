@@ -0,0 +1,189 @@
+# src/recordtype/peaks.py
+"""
+波形峰值金字塔（会话目录下的 peaks.bin）：
+- 第 0 层：每 block_frames 帧一对 (min, max)，录音写线程边录边追加
+- 之后每层把上一层每 FACTOR 个合并为一个，录音结束时一次算出并写入目录表
+- 回放页按画布像素宽度挑选合适的层，绘制代价与录音长度无关
+
+文件布局：
+    头部   <4sHIIQ  magic, version, samplerate, block_frames, dir_offset（0 表示未完成）
+    第 0 层 int16 [n, 2]，随后是更高层
+    目录   <4sI     b"PDIR", nlevels，随后每层 <QQI offset, count, frames_per_entry
+"""
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"RTPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHIIQ")
+DIR = struct.Struct("<4sI")
+LEVEL = struct.Struct("<QQI")
+DIR_MAGIC = b"PDIR"
+BLOCK_FRAMES = 256
+FACTOR = 4
+MIN_TOP = 64          # 最粗一层不少于这么多项时停止
+PEAKS_FILENAME = "peaks.bin"
+
+
+def _reduce(level: np.ndarray, factor: int) -> np.ndarray:
+    """把 [n, 2] 的 (min, max) 每 factor 项合并；尾部不足一组的也单独成一项。"""
+    n = len(level)
+    if n == 0:
+        return level
+    full = n // factor * factor
+    out = []
+    if full:
+        blk = level[:full].reshape(-1, factor, 2)
+        out.append(np.stack([blk[:, :, 0].min(axis=1), blk[:, :, 1].max(axis=1)], axis=1))
+    if full < n:
+        tail = level[full:]
+        out.append(np.array([[tail[:, 0].min(), tail[:, 1].max()]], dtype=level.dtype))
+    return np.concatenate(out) if len(out) > 1 else out[0]
+
+
+def build_levels(level0: np.ndarray):
+    """从第 0 层算出整座金字塔，返回 [(frames_per_entry, array), ...]。"""
+    levels = [(BLOCK_FRAMES, level0)]
+    cur, fpe = level0, BLOCK_FRAMES
+    while len(cur) > MIN_TOP * FACTOR:
+        cur = _reduce(cur, FACTOR); fpe *= FACTOR
+        levels.append((fpe, cur))
+    return levels
+
+
+class PeakWriter:
+    """
+    录音写线程使用：feed() 接收 int16 [n, channels] 帧，满一块就追加第 0 层；
+    close() 补上尾块、生成更高层并写目录表。
+    """
+
+    def __init__(self, path, samplerate, block_frames=BLOCK_FRAMES):
+        self.path = path
+        self.sr = samplerate
+        self.block_frames = block_frames
+        self.f = open(path, "wb")
+        self.f.write(HEADER.pack(MAGIC, VERSION, samplerate, block_frames, 0))
+        self._carry = None
+        self._chunks = []
+
+    def feed(self, frames: np.ndarray):
+        # 多声道取所有声道的极值
+        lo = frames.min(axis=1) if frames.ndim > 1 else frames
+        hi = frames.max(axis=1) if frames.ndim > 1 else frames
+        mono = np.stack([lo, hi], axis=1)
+        if self._carry is not None and len(self._carry):
+            mono = np.concatenate([self._carry, mono])
+        full = len(mono) // self.block_frames * self.block_frames
+        self._carry = mono[full:].copy()
+        if not full:
+            return
+        blk = mono[:full].reshape(-1, self.block_frames, 2)
+        pk = np.stack([blk[:, :, 0].min(axis=1), blk[:, :, 1].max(axis=1)], axis=1).astype("<i2")
+        self._chunks.append(pk)
+        self.f.write(pk.tobytes())
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        try:
+            if self._carry is not None and len(self._carry):
+                pk = np.array([[self._carry[:, 0].min(), self._carry[:, 1].max()]], dtype="<i2")
+                self._chunks.append(pk); self.f.write(pk.tobytes())
+            level0 = np.concatenate(self._chunks) if self._chunks else np.zeros((0, 2), "<i2")
+            _write_pyramid(self.f, level0, self.sr, self.block_frames)
+        finally:
+            self.f.close()
+
+
+def _write_pyramid(f, level0, samplerate, block_frames):
+    """f 已写好头部和第 0 层：追加更高层与目录表，并回填 dir_offset。"""
+    levels = build_levels(level0)
+    entries = [(HEADER.size, len(level0), block_frames)]
+    f.seek(0, 2)
+    for fpe, arr in levels[1:]:
+        entries.append((f.tell(), len(arr), fpe))
+        f.write(np.ascontiguousarray(arr, dtype="<i2").tobytes())
+    dir_off = f.tell()
+    f.write(DIR.pack(DIR_MAGIC, len(entries)))
+    for e in entries:
+        f.write(LEVEL.pack(*e))
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, samplerate, block_frames, dir_off))
+
+
+def finalize_peaks(path) -> bool:
+    """崩溃后只有第 0 层的文件：补算高层并写目录表。有改动返回 True。"""
+    with open(path, "r+b") as f:
+        magic, _ver, sr, bf, dir_off = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or dir_off:
+            return False
+        n = (os.path.getsize(path) - HEADER.size) // 4
+        f.truncate(HEADER.size + n * 4)
+        level0 = np.frombuffer(f.read(n * 4), "<i2").reshape(-1, 2)
+        _write_pyramid(f, level0, sr, bf)
+    return True
+
+
+def build_peaks(audio_path, out_path, chunk_frames=1 << 20, stop_event=None):
+    """为旧会话离线生成 peaks.bin（分块读取，内存占用与时长无关）。先写临时文件再替换。"""
+    from .wavio import open_frames
+    frames, sr, _ch = open_frames(audio_path)
+    tmp = out_path + ".tmp"
+    w = PeakWriter(tmp, sr)
+    try:
+        for a in range(0, len(frames), chunk_frames):
+            if stop_event is not None and stop_event.is_set():
+                raise RuntimeError("cancelled")
+            w.feed(np.asarray(frames[a:a + chunk_frames]))
+    except Exception:
+        w.f.close(); os.remove(tmp); raise
+    w.close()
+    os.replace(tmp, out_path)
+    return out_path
+
+
+class PeakPyramid:
+    """只读映射 peaks.bin；columns() 把指定层聚合成恰好 width 列。"""
+
+    def __init__(self, path, base=0):
+        # base：嵌在会话文件包中时该段的起点；文件内各偏移都相对于 base
+        with open(path, "rb") as f:
+            f.seek(base)
+            magic, _ver, self.sr, self.block_frames, dir_off = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("不是峰值文件")
+            if not dir_off:
+                raise ValueError("峰值文件未完成")
+            f.seek(base + dir_off)
+            _m, n = DIR.unpack(f.read(DIR.size))
+            entries = [LEVEL.unpack(f.read(LEVEL.size)) for _ in range(n)]
+        self.levels = []
+        for off, count, fpe in entries:
+            arr = (np.memmap(path, dtype="<i2", mode="r", offset=base + off, shape=(count, 2))
+                   if count else np.zeros((0, 2), "<i2"))
+            self.levels.append((fpe, arr))
+
+    def level_for(self, width: int):
+        """项数不少于 width 的最粗一层（每个像素至少一项）；都不够时返回最细一层。"""
+        best = self.levels[0]
+        for fpe, arr in self.levels:
+            if len(arr) >= width:
+                best = (fpe, arr)
+        return best
+
+    def columns(self, width: int):
+        """返回 (mins, maxs)，各 width 项，取值已归一化到 [-1, 1]。"""
+        width = max(1, int(width))
+        _fpe, arr = self.level_for(width)
+        n = len(arr)
+        if n == 0:
+            z = np.zeros(width, np.float32); return z, z
+        edges = (np.arange(width + 1) * n) // width
+        idx = np.minimum(edges[:-1], n - 1)
+        arr = np.asarray(arr)
+        mins = np.minimum.reduceat(arr[:, 0], idx).astype(np.float32) / 32768.0
+        maxs = np.maximum.reduceat(arr[:, 1], idx).astype(np.float32) / 32768.0
+        return mins, maxs
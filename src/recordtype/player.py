@@ -1,82 +1,229 @@
 # player.py
-import wave
+import bisect
 import threading
+import time
+from collections import deque
+
 import numpy as np
-import sounddevice as sd
+
+from .ringbuffer import ByteRing
+from .stretch import WsolaStretcher, clamp_speed
+from .wavio import open_frames
+
+RENDER_AHEAD_SECONDS = 0.3    # 预渲染输出的缓冲长度（也是改速/跳转生效的最大延迟）
+RENDER_HOPS = 4               # 渲染线程每次生成的 WSOLA 帧数
+
 
 class WavPlayer:
-    """基于 sounddevice 的轻量播放器，支持播放/暂停/跳转/进度获取"""
+    """
+    基于 sounddevice 的轻量播放器，支持播放/暂停/跳转/进度获取/变速（0.75x–3x，保持音高）。
+    渲染线程提前把输出（1x 直接拷贝，其余经 WSOLA）写进单生产者/单消费者环形缓冲，
+    PortAudio 回调只从缓冲拷贝、不足补零，不加锁也不分配音频数据。
+    current_time() 始终是源录音的时间轴。
+    跳过静音模式下，渲染线程只渲染语音段（set_speech() 给出），段间静音直接跳过。
+    """
     def __init__(self, wav_path: str):
         self.wav_path = wav_path
         self.sr = 44100
         self.channels = 1
-        self._frames = None          # numpy int16 [n, channels]
-        self._pos = 0                # 当前位置(帧)
-        self._lock = threading.RLock()
+        self._frames = None          # numpy int16 [n, channels]（np.memmap / 分段映射，只映射不拷贝）
+        self._nframes = 0
+        self._lock = threading.RLock()   # 只在主线程/渲染线程之间使用，回调不碰
         self._stream = None
         self._playing = False
+        self.speed = 1.0
+        self.skip_silence = False
+        self._speech = ([], [])      # 语音段 (起点列表, 终点列表)（帧），按时间排序；整体替换
         self._load_wav()
 
     def _load_wav(self):
-        with wave.open(self.wav_path, "rb") as wf:
-            self.channels = wf.getnchannels()
-            self.sr = wf.getframerate()
-            nframes = wf.getnframes()
-            raw = wf.readframes(nframes)
-        data = np.frombuffer(raw, dtype=np.int16)
-        if self.channels > 1:
-            data = data.reshape(-1, self.channels)
-        else:
-            data = data.reshape(-1, 1)
+        # 只解析头部并映射 data 块：打开耗时与录音长度无关；wav_path 也可以是分段目录
+        data, self.sr, self.channels = open_frames(self.wav_path)
         self._frames = data
-        self._pos = 0
+        self._nframes = len(data)
+        self._fb = 2 * self.channels
+        self._ring = ByteRing(int(self.sr * RENDER_AHEAD_SECONDS) * self._fb, align=self._fb)
+        self._silence = memoryview(bytes(self.sr * self._fb))
+        self._stretch = WsolaStretcher(self.sr, self.channels)
+        # 跳转/改速时 _gen 加一；渲染线程请求回调清空缓冲（_flush_req），回调清完回写 _flush_ack
+        self._gen = 0
+        self._seek_frame = 0
+        self._flush_req = 0
+        self._flush_ack = 0
+        self._out_played = 0         # 本次清空以来回调已播放的输出帧数（只由回调改写）
+        self._render_eof = False
+        # (gen, 输出起点帧, 源起点帧, 每输出帧对应的源帧数)，由渲染线程追加，current_time() 查询
+        self._checkpoints = deque(maxlen=256)
+        self._alive = True
+        self._render_thread = threading.Thread(target=self._render_worker, daemon=True)
+        self._render_thread.start()
 
-    def _callback(self, outdata, frames, time_info, status):
+    # ---------- 渲染线程 ----------
+    def _render_worker(self):
+        gen = -1
+        out_written = 0
+        src = 0.0
+        while self._alive:
+            frames = self._frames
+            if frames is None:
+                break
+            if gen != self._gen:
+                with self._lock:
+                    gen = self._gen
+                    src = float(self._seek_frame)
+                    speed = self.speed
+                    self._render_eof = False
+                    if self._stream is None:
+                        # 没有消费者：直接清空
+                        self._ring.clear(); self._out_played = 0; self._flush_ack = gen
+                    self._flush_req = gen
+                # 等回调清掉旧数据后再写新数据
+                while self._alive and self._flush_ack != gen and self._gen == gen:
+                    time.sleep(0.002)
+                if self._gen != gen:
+                    continue
+                self._stretch.reset(int(src))
+                out_written = 0
+            if self._render_eof:
+                time.sleep(0.01); continue
+            hop = self._stretch.Ha
+            if self._ring.free() < RENDER_HOPS * hop * self._fb:
+                time.sleep(0.005); continue
+            limit = self._nframes
+            starts, ends = self._speech
+            if self.skip_silence and ends:
+                # 跳到当前或下一个语音段；之后没有语音就结束
+                i = bisect.bisect_right(ends, src)
+                if i >= len(ends):
+                    self._mark_eof(gen); continue
+                if src < starts[i]:
+                    src = float(starts[i]); self._stretch.reset(int(src))
+                limit = ends[i]
+            if speed == 1.0:
+                a = int(src)
+                chunk = np.ascontiguousarray(frames[a:min(a + RENDER_HOPS * hop, limit)], dtype=np.int16)
+                start, end = float(a), float(a + len(chunk))
+            else:
+                chunk, start, end = self._stretch.render(frames, speed, RENDER_HOPS)
+            if self._gen != gen:
+                continue
+            if len(chunk):
+                self._checkpoints.append((gen, out_written, start, speed))
+                self._ring.write(chunk)
+                out_written += len(chunk)
+            src = end
+            if src >= self._nframes:
+                self._mark_eof(gen)
+
+    def _mark_eof(self, gen):
+        # 只有仍是当前这一代时才算播完：其间的 seek() 已经开始了新的渲染
         with self._lock:
-            if not self._playing or self._frames is None:
-                outdata[:] = 0
-                return
-            end = min(self._pos + frames, len(self._frames))
-            chunk = self._frames[self._pos:end]
-            outdata[:len(chunk), :self.channels] = chunk
-            if len(chunk) < frames:
-                outdata[len(chunk):] = 0
+            if gen == self._gen:
+                self._render_eof = True
+
+    # ---------- 音频回调（不加锁、不分配音频缓冲） ----------
+    def _callback(self, outdata, frames, time_info, status):
+        out = memoryview(outdata)
+        nbytes = out.nbytes
+        if self._flush_req != self._flush_ack:
+            self._ring.clear(); self._out_played = 0; self._flush_ack = self._flush_req
+        if not self._playing:
+            out[:] = self._silence[:nbytes]
+            return
+        n = self._ring.read_into(out)
+        self._out_played += n // self._fb
+        if n < nbytes:
+            out[n:] = self._silence[:nbytes - n]
+            if self._render_eof and self._ring.available() == 0:
                 self._playing = False
-            self._pos = end
 
     def play(self):
         with self._lock:
             if self._stream is None:
-                self._stream = sd.OutputStream(
+                import sounddevice as sd    # 首次播放才导入（初始化 PortAudio 较慢）
+                # 原始流：回调拿到的是字节缓冲，可直接从环形缓冲拷贝
+                self._stream = sd.RawOutputStream(
                     samplerate=self.sr, channels=self.channels, dtype="int16",
                     callback=self._callback, blocksize=0)
                 self._stream.start()
+            if self._render_eof and self._ring.available() == 0:
+                self._restart_at(0)
             self._playing = True
 
+    def is_playing(self) -> bool:
+        """正在输出声音（暂停、停止或播放到末尾后为 False）。"""
+        return self._playing
+
+    def stream_open(self) -> bool:
+        """输出流是否已打开（打开后直到 close() 都占用 PortAudio）。"""
+        return self._stream is not None
+
     def pause(self):
-        with self._lock:
-            self._playing = False
+        self._playing = False
 
     def stop(self):
-        with self._lock:
-            self._playing = False
-            self._pos = 0
+        self._playing = False
+        self._restart_at(0)
 
     def close(self):
+        self._playing = False
+        self._alive = False
+        if self._render_thread.is_alive():
+            self._render_thread.join(timeout=1.0)
         with self._lock:
-            self._playing = False
             if self._stream is not None:
                 self._stream.stop(); self._stream.close()
                 self._stream = None
+            # 释放映射 / 文件句柄，便于之后移动/删除会话目录
+            if hasattr(self._frames, "close"):
+                self._frames.close()
+            self._frames = None
+            self._nframes = 0
+
+    def _restart_at(self, frame: int):
+        with self._lock:
+            self._seek_frame = max(0, min(int(frame), self._nframes))
+            self._gen += 1
+            self._render_eof = False    # 否则播完后 seek() 再 play() 会被当作“已到末尾”而回到开头
 
     def seek(self, t_seconds: float):
+        t_seconds = max(0.0, min(t_seconds, self.duration()))
+        self._restart_at(t_seconds * self.sr)
+
+    def set_speed(self, speed: float):
+        """改变播放速度（0.75–3.0）：从当前源位置按新速度重新渲染。"""
+        speed = clamp_speed(speed)
+        if speed == self.speed:
+            return
         with self._lock:
-            t_seconds = max(0.0, min(t_seconds, self.duration()))
-            self._pos = int(t_seconds * self.sr)
+            pos = self.current_time()
+            self.speed = speed
+            self._restart_at(pos * self.sr)
 
-    def current_time(self) -> float:
+    def set_speech(self, segments):
+        """语音段 [(start_s, end_s), ...]，供跳过静音使用。"""
+        segs = sorted((int(a * self.sr), int(b * self.sr)) for a, b in segments or [])
+        self._speech = ([a for a, _b in segs], [b for _a, b in segs])
+
+    def set_skip_silence(self, enabled: bool):
+        """开启/关闭跳过语音段之间的静音：从当前源位置重新渲染。"""
+        enabled = bool(enabled)
+        if enabled == self.skip_silence:
+            return
         with self._lock:
-            return self._pos / float(self.sr)
+            pos = self.current_time()
+            self.skip_silence = enabled
+            self._restart_at(pos * self.sr)
+
+    def current_time(self) -> float:
+        gen = self._gen
+        played = self._out_played
+        if self._flush_ack == gen:
+            # 最近一个起点不晚于已播放位置的渲染块，按速度换算回源时间
+            for g, out0, src0, ratio in reversed(tuple(self._checkpoints)):
+                if g == gen and out0 <= played:
+                    return min(src0 + (played - out0) * ratio, self._nframes) / float(self.sr)
+        return self._seek_frame / float(self.sr)
 
     def duration(self) -> float:
-        return len(self._frames) / float(self.sr)
+        return self._nframes / float(self.sr)
@@ -0,0 +1,84 @@
+# src/recordtype/refresh.py
+import time
+
+FRAME_MS = 40          # 播放中的目标刷新间隔（约 25 帧/秒）
+MAX_FRAME_MS = 250     # 机器再慢也至少每这么久刷新一次
+BUDGET = 0.25          # 刷新最多占用主线程时间的比例
+SMOOTHING = 0.2        # 绘制耗时的指数平均系数
+
+
+class RefreshScheduler:
+    """
+    回放页的刷新调度（Tk 线程，root.after 驱动）：
+    - request()：跳转、点击、尺寸变化等只登记一次 after_idle，连续多次请求合并为一次绘制
+    - start()：开始播放时调用；之后每帧绘制一次，active() 返回 False（暂停、停止、播放到末尾）时
+      画完最后一帧就停下，空闲时没有任何定时器
+    - 下一帧在本帧画完之后才预约，间隔按绘制耗时自适应：耗时超出 BUDGET 比例时降低帧率，
+      慢机器上刷新变稀而不会积压
+    paint() 负责实际绘制；cancel() 在打开新会话或关闭窗口时丢弃所有待执行的刷新。
+    """
+
+    def __init__(self, root, paint, active, frame_ms=FRAME_MS, max_frame_ms=MAX_FRAME_MS, budget=BUDGET):
+        self.root = root
+        self.paint = paint
+        self.active = active
+        self.frame_ms = frame_ms
+        self.max_frame_ms = max_frame_ms
+        self.budget = budget
+        self.interval_ms = frame_ms
+        self.paint_ms = None      # 绘制耗时的平滑值
+        self.paints = 0
+        self._tick_job = None
+        self._tick_soon = False   # _tick_job 是否已是 after_idle（不必再提前）
+        self._idle_job = None
+
+    @property
+    def running(self) -> bool:
+        return self._tick_job is not None
+
+    def request(self):
+        """登记一次重绘：已有待执行的重绘时不重复登记；逐帧刷新中则把下一帧提前到空闲时。"""
+        if self._tick_job is not None:
+            if not self._tick_soon:
+                self.root.after_cancel(self._tick_job)
+                self._tick_job = self.root.after_idle(self._tick); self._tick_soon = True
+        elif self._idle_job is None:
+            self._idle_job = self.root.after_idle(self._on_idle)
+
+    def start(self):
+        """开始逐帧刷新（已在运行时什么也不做）。"""
+        if self._tick_job is None:
+            self._cancel_idle()
+            self._tick_job = self.root.after_idle(self._tick); self._tick_soon = True
+
+    def cancel(self):
+        self._cancel_idle()
+        if self._tick_job is not None:
+            self.root.after_cancel(self._tick_job); self._tick_job = None
+
+    def _cancel_idle(self):
+        if self._idle_job is not None:
+            self.root.after_cancel(self._idle_job); self._idle_job = None
+
+    def _on_idle(self):
+        self._idle_job = None
+        self._paint()
+
+    def _tick(self):
+        self._tick_job = None; self._tick_soon = False
+        self._paint()
+        if self.active():
+            self._tick_job = self.root.after(self.interval_ms, self._tick)
+
+    def _paint(self):
+        t0 = time.perf_counter()
+        try:
+            self.paint()
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            self.paint_ms = ms if self.paint_ms is None else self.paint_ms + SMOOTHING * (ms - self.paint_ms)
+            self.paints += 1
+            self.interval_ms = int(min(self.max_frame_ms, max(self.frame_ms, self.paint_ms / self.budget)))
+
+    def stats(self) -> dict:
+        return {"interval_ms": self.interval_ms, "paint_ms": round(self.paint_ms or 0.0, 3), "paints": self.paints}
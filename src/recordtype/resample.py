@@ -0,0 +1,95 @@
+# src/recordtype/resample.py
+"""
+录音写线程中的格式转换：声道下混 + 多相（polyphase）重采样。
+- 设备按自身采样率与声道数打开，回调照旧只拷贝原始数据；转换全部在写线程按大块进行
+- 采样率比化为最简分数 up/down；原型低通为 Kaiser 窗 sinc，拆成 up 个相位、每相 taps 个系数
+- 每个输出样本对应一个输入位置与相位：整块一次取出所有窗口（sliding_window_view，零拷贝），
+  与各自相位的系数逐行点积，没有 Python 层逐样本循环
+- 块与块之间保留 taps-1 帧历史，输出与整段一次处理的结果相同
+"""
+from math import gcd
+
+import numpy as np
+
+TAPS_PER_PHASE = 32       # 每相系数个数（越多过渡带越窄）
+KAISER_BETA = 8.0
+ROLLOFF = 0.92            # 通带截止相对目标奈奎斯特频率的比例
+
+
+def downmix(frames: np.ndarray, out_channels: int) -> np.ndarray:
+    """int16 [n, cin] -> float32 [n, out_channels]：单声道取各声道均值，其余按声道序号循环取用。"""
+    x = frames.astype(np.float32)
+    cin = x.shape[1]
+    if out_channels == cin:
+        return x
+    if out_channels == 1:
+        return x.mean(axis=1, keepdims=True)
+    return x[:, np.arange(out_channels) % cin]
+
+
+def _polyphase_table(up: int, down: int, taps: int) -> np.ndarray:
+    """[up, taps] float32：table[p, t] 乘以窗口中第 t 个输入（时间正序，最后一个是当前输入）。"""
+    n = up * taps
+    fc = ROLLOFF * 0.5 / max(up, down)            # 截止频率（相对 up 倍上采样后的采样率）
+    i = np.arange(n) - (n - 1) / 2.0
+    h = 2.0 * fc * np.sinc(2.0 * fc * i) * np.kaiser(n, KAISER_BETA)
+    h *= up / h.sum() if h.sum() else 1.0         # 补偿插零造成的增益损失，直流增益为 1
+    # h[p + j*up] 作用于 x[n - j]；窗口按时间正序排列，所以 j 反过来放
+    return h.reshape(taps, up).T[:, ::-1].astype(np.float32).copy()
+
+
+class Resampler:
+    """
+    流式转换器：process(int16 [n, in_channels]) -> int16 [m, out_channels]（C 连续，可直接写入 sink）。
+    in_rate == out_rate 时只做声道转换。
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, in_channels: int, out_channels: int = 1,
+                 taps: int = TAPS_PER_PHASE):
+        g = gcd(int(in_rate), int(out_rate))
+        self.in_rate, self.out_rate = int(in_rate), int(out_rate)
+        self.in_channels, self.out_channels = in_channels, out_channels
+        self.up, self.down = self.out_rate // g, self.in_rate // g
+        self.taps = taps if (self.up, self.down) != (1, 1) else 1
+        self.table = _polyphase_table(self.up, self.down, self.taps) if self.taps > 1 else None
+        self._hist = np.zeros((self.taps - 1, out_channels), np.float32)
+        self._n_in = 0            # 已收到的输入帧数
+        self._k_out = 0           # 已产生的输出帧数
+
+    @property
+    def passthrough(self) -> bool:
+        return self.table is None and self.in_channels == self.out_channels
+
+    def _resample(self, x: np.ndarray) -> np.ndarray:
+        T, up, down = self.taps, self.up, self.down
+        buf = np.concatenate((self._hist, x)) if len(self._hist) else x
+        n_total = self._n_in + len(x)
+        # 输出 k 用到输入 floor(k*down/up)，该输入必须已经到达：k*down < n_total*up
+        k_end = (n_total * up + down - 1) // down
+        ks = np.arange(self._k_out, k_end, dtype=np.int64)
+        pos = ks * down
+        cur, phase = pos // up, pos % up
+        # buf[i] 对应输入 _n_in-(T-1)+i；以 cur 结尾的窗口从 buf[cur-_n_in] 开始
+        start = cur - self._n_in
+        win = np.lib.stride_tricks.sliding_window_view(buf, T, axis=0)   # [len-T+1, ch, T]
+        y = np.einsum("kct,kt->kc", win[start], self.table[phase], optimize=True)
+        self._hist = buf[len(buf) - (T - 1):].copy()
+        self._n_in = n_total
+        self._k_out = k_end
+        return y
+
+    def process(self, frames: np.ndarray) -> np.ndarray:
+        if not len(frames):
+            return np.zeros((0, self.out_channels), dtype="<i2")
+        x = downmix(frames, self.out_channels)
+        if self.table is not None:
+            y = self._resample(x)
+        else:
+            y = x; self._n_in += len(x); self._k_out += len(x)
+        return np.clip(np.rint(y), -32768, 32767).astype("<i2")
+
+    def stats(self) -> dict:
+        return {"device_sample_rate": self.in_rate, "device_channels": self.in_channels,
+                "sample_rate": self.out_rate, "channels": self.out_channels,
+                "ratio": f"{self.up}/{self.down}", "taps_per_phase": self.taps,
+                "frames_in": self._n_in, "frames_out": self._k_out}
@@ -0,0 +1,75 @@
+# src/recordtype/ringbuffer.py
+"""
+单生产者/单消费者字节环形缓冲：
+- 容量在构造时一次性分配，之后读写只做切片拷贝，不再分配音频数据
+- 生产者只改写指针 _w，消费者只改读指针 _r（都是累计字节数），不需要加锁
+- 满了就整块丢弃并计数，绝不阻塞音频回调
+"""
+
+
+class ByteRing:
+    def __init__(self, capacity: int, align: int = 1):
+        # 容量按帧对齐，保证读出的数据始终是整帧
+        align = max(1, int(align))
+        capacity = max(align, int(capacity) // align * align)
+        self.capacity = capacity
+        self.align = align
+        self._buf = bytearray(capacity)
+        self._mv = memoryview(self._buf)
+        self._w = 0
+        self._r = 0
+        self.overflows = 0       # 因缓冲满被丢弃的写入次数
+        self.dropped_bytes = 0   # 被丢弃的字节数
+        self.high_water = 0      # 缓冲占用峰值（字节）
+
+    def available(self) -> int:
+        """可读字节数。"""
+        return self._w - self._r
+
+    def free(self) -> int:
+        return self.capacity - (self._w - self._r)
+
+    def write(self, data) -> bool:
+        """生产者：写入一整块；空间不足时整块丢弃并返回 False。"""
+        src = memoryview(data)
+        if src.format != "B" or src.ndim != 1:
+            src = src.cast("B")
+        n = src.nbytes
+        used = self._w - self._r
+        if n > self.capacity - used:
+            self.overflows += 1
+            self.dropped_bytes += n
+            return False
+        pos = self._w % self.capacity
+        first = min(n, self.capacity - pos)
+        self._mv[pos:pos + first] = src[:first]
+        if first < n:
+            self._mv[:n - first] = src[first:]
+        self._w += n
+        if used + n > self.high_water:
+            self.high_water = used + n
+        return True
+
+    def read_into(self, out, max_bytes: int = None) -> int:
+        """消费者：把可读数据拷贝到 out（可写 buffer），返回拷贝的字节数。"""
+        dst = memoryview(out)
+        avail = self._w - self._r
+        n = min(avail, dst.nbytes if max_bytes is None else min(max_bytes, dst.nbytes))
+        n -= n % self.align
+        if n <= 0:
+            return 0
+        pos = self._r % self.capacity
+        first = min(n, self.capacity - pos)
+        dst[:first] = self._mv[pos:pos + first]
+        if first < n:
+            dst[first:n] = self._mv[:n - first]
+        self._r += n
+        return n
+
+    def clear(self):
+        self._r = self._w
+
+    def reset_stats(self):
+        self.overflows = 0
+        self.dropped_bytes = 0
+        self.high_water = 0
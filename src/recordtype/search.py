@@ -0,0 +1,185 @@
+# src/recordtype/search.py
+"""
+全部会话笔记的全文检索（SQLite FTS5 倒排索引）：
+- 文本先按 notes.py 的规则去掉 [HH:MM:SS]，与回放页看到的纯文本一致
+- 中日韩文字按单字 + 相邻二字切分，拉丁字母/数字按词（小写）切分，再交给 FTS5 建索引
+- 纯文本与标记（秒数/偏移）一并存库，命中后直接算出字符偏移与对应的标记时间，不再读文件
+"""
+import os
+import re
+import sqlite3
+from array import array
+
+import numpy as np
+
+from .notes import parse_notes_file
+from .storage import ensure_user_data_dir
+
+INDEX_VERSION = 1
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[0-9a-z]+")
+
+
+def index_path():
+    return os.path.join(ensure_user_data_dir(), "search_index.sqlite3")
+
+
+def tokenize(text: str):
+    """切词：中日韩字符输出单字与二字组，其他输出小写词。"""
+    out = []
+    for m in _TOKEN_RE.finditer(text.lower()):
+        run = m.group()
+        if run[0] <= "z":
+            out.append(run)
+        else:
+            out.extend(run)
+            out.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return out
+
+
+def _match_expr(query: str):
+    """把查询变成 FTS5 表达式：中日韩文字取二字组（单字时取单字），所有词 AND；最后一个英文词按前缀匹配。"""
+    terms = []
+    parts = list(_TOKEN_RE.finditer(query.lower()))
+    for k, m in enumerate(parts):
+        run = m.group()
+        if run[0] <= "z":
+            terms.append(f'"{run}"*' if k == len(parts) - 1 else f'"{run}"')
+        elif len(run) == 1:
+            terms.append(f'"{run}"')
+        else:
+            terms.extend(f'"{run[i:i + 2]}"' for i in range(len(run) - 1))
+    return " AND ".join(terms)
+
+
+def _connect():
+    con = sqlite3.connect(index_path(), timeout=10)
+    if con.execute("PRAGMA user_version").fetchone()[0] < INDEX_VERSION:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime REAL NOT NULL,
+                clean TEXT NOT NULL,
+                times BLOB NOT NULL,
+                offsets BLOB NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(tokens);
+        """)
+        con.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        con.commit()
+    return con
+
+
+def _index_one(con, session_dir, mtime):
+    clean, times, offsets = parse_notes_file(os.path.join(session_dir, "notes.md"))
+    row = con.execute("SELECT id FROM docs WHERE path=?", (session_dir,)).fetchone()
+    args = (mtime, clean, times.tobytes(), array("q", offsets).tobytes())
+    if row:
+        doc_id = row[0]
+        con.execute("UPDATE docs SET mtime=?, clean=?, times=?, offsets=? WHERE id=?", args + (doc_id,))
+        con.execute("DELETE FROM fts WHERE rowid=?", (doc_id,))
+    else:
+        doc_id = con.execute("INSERT INTO docs(path, mtime, clean, times, offsets) VALUES (?, ?, ?, ?, ?)",
+                             (session_dir,) + args).lastrowid
+    con.execute("INSERT INTO fts(rowid, tokens) VALUES (?, ?)", (doc_id, " ".join(tokenize(clean))))
+
+
+def _drop(con, session_dir):
+    row = con.execute("SELECT id FROM docs WHERE path=?", (session_dir,)).fetchone()
+    if row:
+        con.execute("DELETE FROM fts WHERE rowid=?", (row[0],))
+        con.execute("DELETE FROM docs WHERE id=?", (row[0],))
+
+
+def index_session(session_dir):
+    """录音结束保存后调用：把该会话的笔记（重新）加入索引。"""
+    session_dir = os.path.abspath(session_dir)
+    notes = os.path.join(session_dir, "notes.md")
+    con = _connect()
+    try:
+        if os.path.exists(notes):
+            _index_one(con, session_dir, os.path.getmtime(notes))
+        else:
+            _drop(con, session_dir)
+        con.commit()
+    finally:
+        con.close()
+
+
+def update_index(session_dirs):
+    """增量更新：只处理 notes.md mtime 变化过的会话，并删除已不在列表里的条目。返回更新数。"""
+    con = _connect()
+    try:
+        known = dict(con.execute("SELECT path, mtime FROM docs"))
+        wanted, updated = set(), 0
+        for d in session_dirs:
+            d = os.path.abspath(d)
+            notes = os.path.join(d, "notes.md")
+            try: mtime = os.path.getmtime(notes)
+            except OSError: continue
+            wanted.add(d)
+            if known.get(d) == mtime: continue
+            try: _index_one(con, d, mtime)
+            except Exception: continue
+            updated += 1
+            if updated % 200 == 0: con.commit()
+        for d in known:
+            if d not in wanted: _drop(con, d)
+        con.commit()
+        return updated
+    finally:
+        con.close()
+
+
+def _locate(clean, query):
+    """命中在纯文本中的 (字符偏移, 匹配长度)：优先整句，其次第一个词；都找不到返回 (0, 0)。"""
+    low = clean.lower()
+    q = query.strip().lower()
+    pos = low.find(q) if q else -1
+    if pos >= 0:
+        return pos, len(q)
+    m = _TOKEN_RE.search(q)
+    if m:
+        tok = m.group()
+        tok = tok[:2] if tok[0] > "z" else tok
+        pos = low.find(tok)
+        if pos >= 0:
+            return pos, len(tok)
+    return 0, 0
+
+
+def search(query: str, limit: int = 50):
+    """
+    返回按相关度排序的命中列表：
+    [{"path", "offset", "time", "length", "snippet", "score"}, ...]
+    offset 为回放页纯文本中的字符偏移，length 为实际匹配的字符数（正文中找不到原词时为 0），
+    time 为覆盖该位置的标记时间（秒）。
+    """
+    expr = _match_expr(query)
+    if not expr:
+        return []
+    con = _connect()
+    try:
+        rows = con.execute("""
+            SELECT docs.path, docs.clean, docs.times, docs.offsets, bm25(fts) AS score
+            FROM fts JOIN docs ON docs.id = fts.rowid
+            WHERE fts MATCH ? ORDER BY score LIMIT ?
+        """, (expr, limit)).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        con.close()
+    hits = []
+    for path, clean, tb, ob, score in rows:
+        off, length = _locate(clean, query)
+        # 覆盖该位置的标记：偏移不超过 off 的标记中时间最晚者（与回放页点击跳转一致）
+        times = np.frombuffer(tb, dtype=np.float64)
+        covered = times[np.frombuffer(ob, dtype=np.int64) <= off]
+        t = float(covered.max()) if len(covered) else 0.0
+        a = max(0, off - 20)
+        hits.append({
+            "path": path, "offset": off, "time": t, "length": length,
+            "snippet": " ".join(clean[a:off + 40].split()), "score": -score,
+        })
+    return hits
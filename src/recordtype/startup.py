@@ -0,0 +1,76 @@
+# src/recordtype/startup.py
+"""
+启动耗时测量：--profile-startup 参数或环境变量 RECORDTYPE_PROFILE_STARTUP=1 时启用。
+入口在导入任何重模块之前创建 StartupProfile，之后各阶段调用 mark()；
+窗口首次空闲（已绘制）且设备列表就绪后输出报告：stderr、app 日志，以及用户数据目录下的 startup_profile.json。
+未启用时 mark() 什么也不做。
+"""
+import os
+import sys
+import time
+
+ENV_VAR = "RECORDTYPE_PROFILE_STARTUP"
+FLAG = "--profile-startup"
+REPORT_NAME = "startup_profile.json"
+
+
+def profiling_requested(argv=None) -> bool:
+    argv = sys.argv[1:] if argv is None else argv
+    return FLAG in argv or os.environ.get(ENV_VAR, "") not in ("", "0")
+
+
+class StartupProfile:
+    def __init__(self, enabled: bool, t0: float = None):
+        self.enabled = enabled
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.phases = []          # [(名称, 距启动的秒数)]
+        self._pending = {"window", "devices"}
+        self.reported = False
+
+    def mark(self, name: str):
+        if self.enabled:
+            self.phases.append((name, time.perf_counter() - self.t0))
+
+    def done(self, what: str, logger=None):
+        """what 为 "window"（首次空闲）或 "devices"（设备列表就绪）；两者都到齐后输出报告，返回 True。"""
+        if not self.enabled or self.reported:
+            return False
+        self.mark(f"ready: {what}")
+        self._pending.discard(what)
+        if self._pending:
+            return False
+        self.report(logger)
+        return True
+
+    def rows(self):
+        prev, out = 0.0, []
+        for name, t in self.phases:
+            out.append({"phase": name, "at_ms": round(t * 1000, 1), "delta_ms": round((t - prev) * 1000, 1)})
+            prev = t
+        return out
+
+    def report(self, logger=None):
+        self.reported = True
+        rows = self.rows()
+        lines = [f"{r['at_ms']:>9.1f} ms  (+{r['delta_ms']:>7.1f})  {r['phase']}" for r in rows]
+        text = "启动耗时：\n" + "\n".join(lines)
+        if sys.stderr:
+            try: print(text, file=sys.stderr, flush=True)
+            except Exception: pass
+        if logger:
+            logger.info("startup profile: %s", "; ".join(f"{r['phase']}={r['at_ms']}ms" for r in rows))
+        try:
+            from .storage import ensure_user_data_dir, save_json
+            save_json(os.path.join(ensure_user_data_dir(), REPORT_NAME),
+                      {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "frozen": bool(getattr(sys, "frozen", False)),
+                       "phases": rows})
+        except Exception:
+            pass
+        return rows
+
+
+_DISABLED = StartupProfile(False)
+
+
+def disabled() -> StartupProfile:
+    return _DISABLED
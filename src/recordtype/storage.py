@@ -1,4 +1,13 @@
-import os, json, datetime as dt, shutil, sys, platform
+import os, json, datetime as dt, shutil, sys, platform, time, sqlite3
+
+from .wavio import (
+    SEGMENTS_DIRNAME, SEGMENT_INDEX, TRACKS_DIRNAME, find_wav_data, repair_wav_header,
+    read_segment_index, list_segments,
+)
+from .codec import RtlcFrames, repair_rtlc
+from .peaks import PEAKS_FILENAME, finalize_peaks
+from .autosave import load_autosave
+from .bundle import is_bundle
 
 # ---------- 路径 ----------
 def _user_data_root():
@@ -36,14 +45,35 @@ def new_session_dir(base_dir=None):
     os.makedirs(path, exist_ok=True)
     return path
 
+def session_audio_path(session_dir):
+    """会话音频位置：audio.wav / audio（隐藏扩展名）/ audio.rtlc / 分段目录 / 多轨目录；都没有返回 None。文件包返回其自身。"""
+    if is_bundle(session_dir):
+        return session_dir
+    for name in ("audio.wav", "audio", "audio.rtlc", SEGMENTS_DIRNAME, TRACKS_DIRNAME):
+        p = os.path.join(session_dir, name)
+        if os.path.exists(p):
+            return p
+    return None
+
 # ---------- 基础 IO ----------
+def _atomic_write(path, write_fn):
+    # 先写同目录临时文件再改名：中途崩溃也不会留下被截断的目标文件
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            write_fn(f)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
 def save_text(path, text):
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(text)
+    _atomic_write(path, lambda f: f.write(text))
 
 def save_json(path, obj):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    _atomic_write(path, lambda f: json.dump(obj, f, ensure_ascii=False, indent=2))
 
 def export_dir(src, dst_dir):
     base = os.path.basename(src)
@@ -53,26 +83,305 @@ def export_dir(src, dst_dir):
     shutil.copytree(src, target)
     return target
 
-# ---------- 最近会话 ----------
-def load_recent(limit=200):
+# ---------- 会话目录（SQLite 索引） ----------
+# 会话库不再每次读写 recent_sessions.json 并逐个 stat 目录：
+# 每个会话的路径、时长、大小、笔记预览、标记数缓存在 catalog.sqlite3，
+# 扫描时按目录 mtime 只更新变化过的会话。
+CATALOG_VERSION = 1
+SORT_KEYS = {
+    "recent": "recent_at DESC",
+    "name": "name COLLATE NOCASE ASC",
+    "duration": "duration DESC",
+    "size": "size DESC",
+}
+
+def catalog_path():
+    return os.path.join(ensure_user_data_dir(), "catalog.sqlite3")
+
+def _catalog():
+    con = sqlite3.connect(catalog_path(), timeout=10)
+    if con.execute("PRAGMA user_version").fetchone()[0] < CATALOG_VERSION:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                mtime REAL NOT NULL DEFAULT 0,
+                duration REAL,
+                size INTEGER NOT NULL DEFAULT 0,
+                preview TEXT NOT NULL DEFAULT '',
+                markers INTEGER NOT NULL DEFAULT 0,
+                recent_at REAL NOT NULL DEFAULT 0,
+                hidden INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_recent ON sessions(hidden, recent_at);
+        """)
+        con.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+        _import_recent_json(con)
+        con.commit()
+    return con
+
+def _import_recent_json(con):
+    """首次建库时把旧版 recent_sessions.json 并入（保持原有顺序）。"""
     p = recent_json_path()
-    if not os.path.exists(p):
-        return []
     try:
-        arr = json.load(open(p, "r", encoding="utf-8"))
-        # 只保留存在的目录
-        arr = [x for x in arr if os.path.isdir(x)]
-        return arr[:limit]
+        arr = json.load(open(p, "r", encoding="utf-8")) if os.path.exists(p) else []
+    except Exception:
+        arr = []
+    now = time.time()
+    for i, d in enumerate(arr):
+        con.execute("INSERT OR IGNORE INTO sessions(path, name, recent_at) VALUES (?, ?, ?)",
+                    (d, os.path.basename(os.path.normpath(d)), now - i))
+
+def _dir_size(d):
+    total = 0
+    for e in os.scandir(d):
+        try:
+            total += _dir_size(e.path) if e.is_dir(follow_symlinks=False) else e.stat().st_size
+        except OSError:
+            pass
+    return total
+
+def session_info(session_dir):
+    """读取一个会话的摘要：时长、占用空间、笔记预览、标记数。"""
+    from .notes import parse_notes_file, NOTES_HEADER, ANCHORS_BIN, load_anchor_markers
+    info = {"duration": None, "size": 0, "preview": "", "markers": 0}
+    try:
+        meta = json.load(open(os.path.join(session_dir, "meta.json"), "r", encoding="utf-8"))
+        info["duration"] = meta.get("duration_seconds")
     except Exception:
-        return []
+        pass
+    if info["duration"] is None:
+        audio = session_audio_path(session_dir)
+        try:
+            sr, _ch, _sw, n = _audio_format_and_frames(audio)
+            info["duration"] = round(n / float(sr), 3)
+        except Exception:
+            pass
+    try: info["size"] = _dir_size(session_dir)
+    except OSError: pass
+    notes = os.path.join(session_dir, "notes.md")
+    if os.path.exists(notes):
+        try:
+            clean, times, _offs = parse_notes_file(notes)
+            if clean.startswith(NOTES_HEADER): clean = clean[len(NOTES_HEADER):]
+            info["preview"] = " ".join(clean[:400].split())[:80]
+            info["markers"] = len(times)
+            if not times and any(os.path.exists(os.path.join(session_dir, n))
+                                 for n in (ANCHORS_BIN, "anchors.json")):
+                info["markers"] = len(load_anchor_markers(session_dir))
+        except Exception:
+            pass
+    return info
+
+def _upsert(con, session_dir, mtime, recent_at=None, unhide=False):
+    info = session_info(session_dir)
+    name = os.path.basename(os.path.normpath(session_dir))
+    con.execute("""
+        INSERT INTO sessions(path, name, mtime, duration, size, preview, markers, recent_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET
+            name=excluded.name, mtime=excluded.mtime, duration=excluded.duration,
+            size=excluded.size, preview=excluded.preview, markers=excluded.markers
+    """, (session_dir, name, mtime, info["duration"], info["size"], info["preview"],
+          info["markers"], recent_at if recent_at is not None else mtime))
+    if recent_at is not None:
+        con.execute("UPDATE sessions SET recent_at=? WHERE path=?", (recent_at, session_dir))
+    if unhide:
+        con.execute("UPDATE sessions SET hidden=0 WHERE path=?", (session_dir,))
+
+def scan_sessions(root=None, progress=None):
+    """
+    增量扫描会话根目录：目录 mtime 未变的会话不再读取；
+    已登记但目录消失的条目删除（被手动移出列表的保持隐藏）。返回更新的会话数。
+    """
+    root = root or default_sessions_root()
+    con = _catalog()
+    try:
+        known = dict(con.execute("SELECT path, mtime FROM sessions"))
+        seen, updated = set(), 0
+        try:
+            entries = [e for e in os.scandir(root) if e.name.startswith("session_") and e.is_dir()]
+        except OSError:
+            entries = []
+        for i, e in enumerate(entries, 1):
+            p = os.path.abspath(e.path); seen.add(p)
+            try: mtime = e.stat().st_mtime
+            except OSError: continue
+            if known.get(p) == mtime: continue
+            _upsert(con, p, mtime); updated += 1
+            if updated % 200 == 0: con.commit()
+            if progress: progress(i, len(entries))
+        # 根目录下已不存在的会话从索引中移除；其他位置通过“浏览添加”的保留
+        root_abs = os.path.abspath(root)
+        for p in known:
+            if os.path.dirname(p) == root_abs and p not in seen:
+                con.execute("DELETE FROM sessions WHERE path=?", (p,))
+        con.commit()
+        return updated
+    finally:
+        con.close()
+
+_LIKE_FILTER = " AND (name LIKE ? ESCAPE '\\' OR preview LIKE ? ESCAPE '\\')"
+
+def _like_pattern(text):
+    """筛选文字按字面匹配：转义 LIKE 通配符 % _ 与转义符本身。"""
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def query_sessions(text="", sort="recent", limit=200, offset=0):
+    """按条件分页查询会话，返回 dict 列表；text 同时匹配名称与笔记预览。"""
+    order = SORT_KEYS.get(sort, SORT_KEYS["recent"])
+    sql = "SELECT path, name, mtime, duration, size, preview, markers FROM sessions WHERE hidden=0"
+    args = []
+    if text:
+        sql += _LIKE_FILTER
+        args += [_like_pattern(text)] * 2
+    sql += f" ORDER BY {order} LIMIT ? OFFSET ?"
+    args += [limit, offset]
+    con = _catalog()
+    try:
+        cols = ("path", "name", "mtime", "duration", "size", "preview", "markers")
+        return [dict(zip(cols, row)) for row in con.execute(sql, args)]
+    finally:
+        con.close()
+
+def count_sessions(text=""):
+    sql = "SELECT COUNT(*) FROM sessions WHERE hidden=0"
+    args = []
+    if text:
+        sql += _LIKE_FILTER
+        args += [_like_pattern(text)] * 2
+    con = _catalog()
+    try:
+        return con.execute(sql, args).fetchone()[0]
+    finally:
+        con.close()
+
+def catalog_paths():
+    """会话库中所有未隐藏会话的路径（供全文索引增量同步）。"""
+    con = _catalog()
+    try:
+        return [r[0] for r in con.execute("SELECT path FROM sessions WHERE hidden=0")]
+    finally:
+        con.close()
+
+# ---------- 最近会话（兼容旧接口，数据来自索引） ----------
+def load_recent(limit=200):
+    return [r["path"] for r in query_sessions(limit=limit)]
 
 def add_recent(session_dir, limit=200):
-    arr = load_recent(limit*2)
-    # 去重：本次优先
-    arr = [session_dir] + [x for x in arr if x != session_dir]
-    save_json(recent_json_path(), arr[:limit])
+    session_dir = os.path.abspath(session_dir)
+    con = _catalog()
+    try:
+        try: mtime = os.path.getmtime(session_dir)
+        except OSError: mtime = 0
+        _upsert(con, session_dir, mtime, recent_at=time.time(), unhide=True)
+        con.commit()
+    finally:
+        con.close()
 
 def remove_recent(session_dir):
-    arr = load_recent()
-    arr = [x for x in arr if x != session_dir]
-    save_json(recent_json_path(), arr)
+    # 只隐藏，避免下次扫描又把它加回来
+    con = _catalog()
+    try:
+        con.execute("UPDATE sessions SET hidden=1 WHERE path=?", (session_dir,))
+        con.commit()
+    finally:
+        con.close()
+
+# ---------- 崩溃恢复 ----------
+def _audio_format_and_frames(audio):
+    """返回 (sample_rate, channels, sample_width, 总帧数)。"""
+    if os.path.basename(os.path.normpath(audio)) == TRACKS_DIRNAME:
+        from .multitrack import tracks_format_and_frames
+        return tracks_format_and_frames(audio)
+    if os.path.isdir(audio):
+        sr, ch, sw, total = 44100, 1, 2, 0
+        for name in list_segments(audio):
+            ch, sr, sw, _off, n = find_wav_data(os.path.join(audio, name))
+            total += n
+        return sr, ch, sw, total
+    if audio.endswith(".rtlc"):
+        fr = RtlcFrames(audio)
+        try: return fr.sr, fr.channels, 2, len(fr)
+        finally: fr.close()
+    ch, sr, sw, _off, n = find_wav_data(audio)
+    return sr, ch, sw, n
+
+def _seal_segments(seg_dir):
+    """修正未封存分段的头部，并补写 index.jsonl 记录。"""
+    _fmt, sealed = read_segment_index(seg_dir)
+    with open(os.path.join(seg_dir, SEGMENT_INDEX), "a", encoding="utf-8") as idx:
+        for name in list_segments(seg_dir):
+            if name in sealed: continue
+            p = os.path.join(seg_dir, name)
+            repair_wav_header(p)
+            n = find_wav_data(p)[4]
+            idx.write(json.dumps({"file": name, "frames": n}) + "\n")
+
+def recover_session(session_dir):
+    """
+    修复一个未正常结束的会话（没有 meta.json）：
+    - 修正 WAV 头长度 / 封存分段
+    - 补全 peaks.bin 的金字塔高层
+    - 用自动保存的快照 + 编辑日志补出 notes.md
+    - 写入带 recovered 标记的 meta.json
+    只读头部，不扫描音频数据。
+    """
+    audio = session_audio_path(session_dir)
+    if audio is None:
+        return False
+    if os.path.basename(os.path.normpath(audio)) == TRACKS_DIRNAME:
+        from .multitrack import repair_tracks
+        repair_tracks(audio)
+    elif os.path.isdir(audio):
+        _seal_segments(audio)
+    elif audio.endswith(".rtlc"):
+        repair_rtlc(audio)
+    else:
+        repair_wav_header(audio)
+
+    notes = os.path.join(session_dir, "notes.md")
+    if not os.path.exists(notes):
+        text = load_autosave(session_dir) or ""
+        save_text(notes, "# 笔记\n\n" + text)
+
+    peaks = os.path.join(session_dir, PEAKS_FILENAME)
+    if os.path.exists(peaks):
+        try: finalize_peaks(peaks)
+        except Exception: os.remove(peaks)   # 回放时会重新生成
+
+    sr, ch, sw, nframes = _audio_format_and_frames(audio)
+    save_json(os.path.join(session_dir, "meta.json"), {
+        "sample_rate": sr, "channels": ch, "sample_width": sw,
+        "device_index": None, "audio_path": audio,
+        "duration_seconds": round(nframes / float(sr), 3), "recovered": True,
+    })
+    return True
+
+def recover_sessions(root=None, idle_seconds=10.0):
+    """
+    启动时扫描会话根目录，修复所有未结束的会话并加入最近列表；返回修复的目录列表。
+    最近 idle_seconds 秒内仍在写入的目录视为正在录音，跳过。
+    """
+    root = root or default_sessions_root()
+    fixed = []
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return fixed
+    now = time.time()
+    for name in names:
+        d = os.path.join(root, name)
+        if not (name.startswith("session_") and os.path.isdir(d)): continue
+        if os.path.exists(os.path.join(d, "meta.json")): continue
+        audio = session_audio_path(d)
+        if audio is None: continue
+        try:
+            if now - os.path.getmtime(audio) < idle_seconds: continue
+            if recover_session(d):
+                fixed.append(d)
+        except Exception:
+            continue
+    for d in fixed:
+        add_recent(d)
+    return fixed
@@ -0,0 +1,72 @@
+# src/recordtype/stretch.py
+"""
+保持音高的变速（WSOLA，波形相似叠加）：
+- 输出按固定步长 Ha 逐帧叠加（Hann 窗、50% 重叠），输入按 Ha*speed 前进
+- 每帧在理想位置附近 ±tolerance 内找与上一帧“自然延续”最相似的片段（np.correlate），避免相位断裂
+- 只依赖 NumPy，不依赖声卡；播放器的渲染线程调用 render() 预先生成输出
+"""
+import numpy as np
+
+MIN_SPEED = 0.75
+MAX_SPEED = 3.0
+
+
+def clamp_speed(speed: float) -> float:
+    return max(MIN_SPEED, min(MAX_SPEED, float(speed)))
+
+
+class WsolaStretcher:
+    def __init__(self, samplerate: int, channels: int, frame_ms: float = 40.0, tolerance_ms: float = 10.0):
+        n = int(samplerate * frame_ms / 1000.0) // 2 * 2
+        self.N = max(64, n)
+        self.Ha = self.N // 2
+        self.tol = max(1, int(samplerate * tolerance_ms / 1000.0))
+        self.channels = channels
+        # 周期 Hann 窗：步长 N/2 时各帧窗函数之和恒为 1
+        self.win = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.N) / self.N)).astype(np.float32)[:, None]
+        self.reset(0)
+
+    def reset(self, src_pos: int):
+        """从源位置 src_pos（帧）重新开始：清掉重叠尾巴和上一帧的延续位置。"""
+        self.in_pos = float(src_pos)
+        self._prev_nat = None
+        self._tail = np.zeros((self.N - self.Ha, self.channels), np.float32)
+
+    def _segment(self, frames, pos):
+        seg = np.asarray(frames[pos:pos + self.N], dtype=np.float32)
+        if len(seg) < self.N:
+            seg = np.concatenate([seg, np.zeros((self.N - len(seg), self.channels), np.float32)])
+        return seg
+
+    def _mono(self, frames, a, b):
+        x = np.asarray(frames[max(0, a):b], dtype=np.float32)
+        return x.mean(axis=1) if x.ndim > 1 and x.shape[1] > 1 else x.reshape(-1)
+
+    def render(self, frames, speed: float, hops: int):
+        """
+        生成 hops*Ha 帧输出。返回 (int16 [m, ch], 本块起点的源位置, 结束后的源位置)；
+        源已读完返回的块为空。frames 为 int16 [n, ch]（memmap/分段映射均可，只按需切片）。
+        """
+        n = len(frames)
+        start = self.in_pos
+        out = np.empty((hops * self.Ha, self.channels), np.float32)
+        m = 0
+        for _ in range(hops):
+            if self.in_pos >= n:
+                break
+            ideal = int(round(self.in_pos))
+            pos = ideal
+            if self._prev_nat is not None and self._prev_nat + self.N <= n:
+                tmpl = self._mono(frames, self._prev_nat, self._prev_nat + self.N)
+                lo = max(0, ideal - self.tol)
+                region = self._mono(frames, lo, min(n, ideal + self.tol + self.N))
+                if len(region) >= self.N:
+                    pos = lo + int(np.argmax(np.correlate(region, tmpl, "valid")))
+            buf = self._segment(frames, pos) * self.win
+            buf[:self.N - self.Ha] += self._tail
+            out[m:m + self.Ha] = buf[:self.Ha]
+            self._tail = buf[self.Ha:]
+            m += self.Ha
+            self._prev_nat = pos + self.Ha
+            self.in_pos += self.Ha * speed
+        return np.clip(out[:m], -32768, 32767).astype(np.int16), start, min(self.in_pos, float(n))
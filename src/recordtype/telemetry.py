@@ -0,0 +1,132 @@
+# src/recordtype/telemetry.py
+"""
+录音健康统计：
+- 回调线程：溢出/欠载标志计数、回调间隔抖动（与 frames/sr 的偏差）、严重迟到的回调次数
+- 写线程：每次落盘耗时、累计写入字节
+- 环形缓冲（原来的队列）的占用峰值由 ByteRing 自己统计，这里汇总
+各字段只由一个线程写入，读取方拿到的快照允许略有滞后；记录路径只做整数运算，不分配列表。
+"""
+import time
+
+N_BUCKETS = 24              # 以微秒为单位的 2 的幂分桶：第 k 桶为 [2^(k-1), 2^k) us，最后一桶兜底
+LATE_FACTOR = 2.0           # 回调间隔超过期望值这么多倍记为迟到（GIL 停顿 / 调度问题的迹象）
+
+
+class Histogram:
+    """对数分桶直方图（微秒），记录 count/sum/max，可估算分位数。"""
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def add_us(self, us: int):
+        if us < 0: us = 0
+        k = us.bit_length()
+        self.counts[k if k < N_BUCKETS else N_BUCKETS - 1] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us: self.max_us = us
+
+    def percentile_ms(self, q: float) -> float:
+        """第 q 分位（0–100）所在桶的上界（毫秒）。"""
+        if not self.count: return 0.0
+        target, acc = self.count * q / 100.0, 0
+        for k, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return min(float(1 << k), float(self.max_us)) / 1000.0
+        return self.max_us / 1000.0
+
+    def summary(self) -> dict:
+        mean = self.total_us / self.count / 1000.0 if self.count else 0.0
+        return {"count": self.count, "mean_ms": round(mean, 3), "p50_ms": round(self.percentile_ms(50), 3),
+                "p95_ms": round(self.percentile_ms(95), 3), "p99_ms": round(self.percentile_ms(99), 3),
+                "max_ms": round(self.max_us / 1000.0, 3),
+                "buckets_us": {str(1 << k): c for k, c in enumerate(self.counts) if c}}
+
+
+class RecorderTelemetry:
+    def __init__(self, samplerate: int, frame_bytes: int):
+        self.sr = samplerate
+        self.frame_bytes = frame_bytes
+        # 回调线程
+        self.callbacks = 0
+        self.frames_in = 0
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self.late_callbacks = 0
+        self.jitter = Histogram()
+        self._last_cb = None
+        self._last_frames = 0
+        # 写线程
+        self.writes = 0
+        self.bytes_written = 0
+        self.write_latency = Histogram()
+        self._t0 = time.perf_counter()
+
+    # ---------- 回调线程 ----------
+    def on_callback(self, frames: int, status):
+        now = time.perf_counter()
+        if status:
+            if status.input_overflow: self.input_overflows += 1
+            if status.input_underflow: self.input_underflows += 1
+        if self._last_cb is not None and self._last_frames:
+            # 本次到达时间与上一块时长之差：正常应接近 0
+            expected = self._last_frames / self.sr
+            interval = now - self._last_cb
+            self.jitter.add_us(int(abs(interval - expected) * 1e6))
+            if interval > expected * LATE_FACTOR: self.late_callbacks += 1
+        self._last_cb = now
+        self._last_frames = frames
+        self.callbacks += 1
+        self.frames_in += frames
+
+    # ---------- 写线程 ----------
+    def on_write(self, nbytes: int, seconds: float):
+        self.writes += 1
+        self.bytes_written += nbytes
+        self.write_latency.add_us(int(seconds * 1e6))
+
+    # ---------- 读取 ----------
+    def snapshot(self, ring_stats: dict = None) -> dict:
+        """当前统计；ring_stats 为 AudioRecorder.ring_stats() 的结果。"""
+        rs = ring_stats or {}
+        cap = rs.get("capacity") or 0
+        return {
+            "elapsed_seconds": round(time.perf_counter() - self._t0, 3),
+            "callbacks": self.callbacks,
+            "frames_in": self.frames_in,
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows,
+            "late_callbacks": self.late_callbacks,
+            "callback_jitter": self.jitter.summary(),
+            "ring_capacity_bytes": cap,
+            "ring_high_water_bytes": rs.get("high_water", 0),
+            "ring_high_water_ratio": round(rs.get("high_water", 0) / cap, 4) if cap else 0.0,
+            "ring_overflows": rs.get("overflows", 0),
+            "ring_dropped_bytes": rs.get("dropped_bytes", 0),
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "write_latency": self.write_latency.summary(),
+        }
+
+
+def format_status(snap: dict) -> str:
+    """状态栏用的一行摘要。"""
+    return (f"溢出 {snap['input_overflows']} / 丢弃 {snap['ring_dropped_bytes'] // 1024} KB"
+            f" | 缓冲峰值 {snap['ring_high_water_ratio'] * 100:.0f}%"
+            f" | 抖动 p95 {snap['callback_jitter']['p95_ms']:.1f} ms"
+            f" | 写入 p95 {snap['write_latency']['p95_ms']:.1f} ms"
+            f" | 已写 {snap['bytes_written'] / 1048576:.1f} MB")
+
+
+def format_log(snap: dict) -> str:
+    """app.log 用的一行 key=value。"""
+    j, w = snap["callback_jitter"], snap["write_latency"]
+    return ("telemetry callbacks=%d overflows=%d underflows=%d late=%d jitter_p95_ms=%.3f jitter_max_ms=%.3f "
+            "ring_hw=%d/%d ring_dropped=%d writes=%d bytes=%d write_p95_ms=%.3f write_max_ms=%.3f" % (
+                snap["callbacks"], snap["input_overflows"], snap["input_underflows"], snap["late_callbacks"],
+                j["p95_ms"], j["max_ms"], snap["ring_high_water_bytes"], snap["ring_capacity_bytes"],
+                snap["ring_dropped_bytes"], snap["writes"], snap["bytes_written"], w["p95_ms"], w["max_ms"]))
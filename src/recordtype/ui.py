@@ -1,15 +1,35 @@
 ﻿import tkinter as tk
 from tkinter import messagebox, filedialog
 from tkinter import ttk
-import os, logging, traceback, re, json
+import os, json, logging, traceback, bisect, threading
+from array import array
 
 from .audio import AudioRecorder
+from .multitrack import MultiRecorder, MULTICHANNEL_NAME, merge_tracks
+from .devices import DeviceRegistry, device_label
 from .storage import (
     new_session_dir, save_text, save_json, export_dir,
-    load_recent, add_recent, remove_recent, default_sessions_root
+    add_recent, remove_recent, default_sessions_root,
+    session_audio_path, recover_sessions, scan_sessions, query_sessions, count_sessions, catalog_paths
 )
+from .search import search as search_notes, index_session, update_index
+from .wavio import SEGMENTS_DIRNAME, TRACKS_DIRNAME
+from .codec import EXTENSION as RTLC_EXT, compress_sessions
 from .autosave import AutoSaver
 from .player import WavPlayer
+from .refresh import RefreshScheduler
+from .clips import marker_segments, segment_title, export_clips
+from .notes import (
+    parse_notes, parse_notes_file, sorted_markers, load_anchor_markers, save_anchors, NOTES_HEADER, ANCHORS_BIN
+)
+from .peaks import PEAKS_FILENAME, PeakPyramid, build_peaks, finalize_peaks
+from .vad import SPEECH_FILENAME, load_speech, analyze_session, analyze_audio
+from .bundle import (
+    EXTENSION as BUNDLE_EXT, Bundle, is_bundle, export_bundle, import_bundle,
+    bundle_anchor_markers, bundle_peaks, bundle_speech
+)
+from .startup import disabled as startup_disabled
+from .telemetry import format_status as format_telemetry, format_log as format_telemetry_log
 
 # ===== 应用信息（已按你的要求设置）=====
 APP_NAME = "RecordType"
@@ -19,12 +39,22 @@ APP_ORG = "Chia_i_Shen Studio"
 APP_DESC = "语音同步笔记工具：边录音边记笔记，支持回放与时间轴跳转。"
 APP_COPYRIGHT = "© 2025 Chia_i_Shen Studio. All rights reserved."
 ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets")
-
-TIMESTAMP_RE = re.compile(r"\[(\d{2}):(\d{2}):(\d{2})\]")
+SEGMENT_SECONDS = 1800  # 分段录音时每段时长（秒）
+ANCHOR_MIN_INTERVAL = 1.0  # 隐形锚点最小间隔（秒）
+LIB_PAGE = 200             # 会话库每次加载的条目数
+LIB_SORTS = {"最近": "recent", "名称": "name", "时长": "duration", "大小": "size"}
+PLAY_SPEEDS = ["0.75x", "1x", "1.25x", "1.5x", "2x", "2.5x", "3x"]
+PLAY_RETRY_MS = 100         # 设备注册表正在重扫时，首次播放的重试间隔
+TELEMETRY_STATUS_MS = 1000  # 录音中状态栏健康统计的刷新间隔
+TELEMETRY_LOG_SEC = 30      # 录音中健康统计写入 app.log 的间隔（秒）
+# 落盘格式（采样率, 声道数）：设备按原生格式打开，写线程转换；语音笔记用 16 kHz 单声道可省约 2/3 空间
+RECORD_FORMATS = {"44.1 kHz 单声道": (44100, 1), "16 kHz 单声道（语音）": (16000, 1),
+                  "48 kHz 单声道": (48000, 1), "48 kHz 立体声": (48000, 2)}
 
 class MainWindow:
-    def __init__(self, root, app_title="RecordType"):
+    def __init__(self, root, app_title="RecordType", profile=None):
         self.root = root
+        self.profile = profile or startup_disabled()
         self.root.title(f"{APP_NAME} v{APP_VERSION} — by {APP_AUTHOR}")
         self.root.geometry("1000x680")
 
@@ -37,20 +67,38 @@ class MainWindow:
         self.file_handler = None
 
         # 状态
-        self.rec = AudioRecorder()
+        self._single_rec = AudioRecorder()
+        self.rec = self._single_rec         # 多设备录音时换成 MultiRecorder，接口相同
+        self.devices = DeviceRegistry(can_rescan=self._devices_idle)
         self.session_dir = None
         self.meta = {}
         self.player: WavPlayer | None = None
+        self._telemetry_job = None
+        self._telemetry_logged = 0.0
 
         # 自动锚点
-        self.anchors = []
-        self._anchor_timer = None
+        self._anchor_t = array("d")    # 锚点：录音秒数
+        self._anchor_off = array("i")  # 锚点：编辑位置（字符偏移）
 
         # 回放数据
         self.review_markers = []
         self.review_clean_text = ""
         self.review_total = 0.0
-        self._progress_updater = None
+        self.review_session = None
+        # 回放页刷新：只在播放中逐帧刷新，跳转/点击/尺寸变化合并为一次重绘
+        self.refresh = RefreshScheduler(self.root, self._paint_review, self._playback_active)
+        self._layers_dirty = False
+        self._time_text = None
+        # 标记索引（按时间排序的平行数组 + 按偏移排序的查找表）
+        self._mk_times = []
+        self._mk_offs = []
+        self._mk_by_off = []        # 排序后的偏移
+        self._mk_by_off_idx = []    # 对应前缀中最大的时间序号
+        self._hilite_idx = None
+        self._mk_index = []         # 每个标记预先换算好的 Tk 索引 "line.col"
+        self._line_starts = [0]     # 每行首字符的偏移（前缀和）
+        self._has_timestamps = False  # 当前回放会话的笔记里有 [HH:MM:SS] 时间戳
+        self._speech_marks = []     # 无时间戳标记的会话：语音段起点（秒），只用于进度条与上一段/下一段
 
         # ===== 菜单栏（帮助->关于）=====
         menubar = tk.Menu(self.root)
@@ -66,17 +114,50 @@ class MainWindow:
         self.rec_frame = tk.Frame(self.nb); self.nb.add(self.rec_frame, text="录音")
         self.rev_frame = tk.Frame(self.nb); self.nb.add(self.rev_frame, text="回放查看")
 
+        self.profile.mark("menu + notebook")
         self._build_library_tab(self.lib_frame)
+        self.profile.mark("library tab")
         self._build_record_tab(self.rec_frame)
+        self.profile.mark("record tab")
         self._build_review_tab(self.rev_frame)
+        self.profile.mark("review tab")
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # 崩溃恢复与会话库扫描放到窗口画出来之后
+        self.root.after_idle(lambda: self.root.after(0, self._after_first_draw))
+
+    def _after_first_draw(self):
+        self.profile.done("window", self.logger)
+        self._recover_unfinished()
         self.refresh_library()
+        self.profile.mark("recover + library scan started")
 
     # ================= 会话库 =================
     def _build_library_tab(self, parent):
         top = tk.Frame(parent); top.pack(side=tk.TOP, fill=tk.X, padx=10, pady=10)
         tk.Label(top, text=f"默认保存位置：{default_sessions_root()}").pack(side=tk.LEFT)
+        self.lib_sort_var = tk.StringVar(value="最近")
+        sort_box = ttk.Combobox(top, textvariable=self.lib_sort_var, values=list(LIB_SORTS), state="readonly", width=6)
+        sort_box.pack(side=tk.RIGHT)
+        sort_box.bind("<<ComboboxSelected>>", lambda e: self._reload_library())
+        tk.Label(top, text="排序：").pack(side=tk.RIGHT, padx=(10, 0))
+        self.lib_filter_var = tk.StringVar()
+        tk.Entry(top, textvariable=self.lib_filter_var, width=24).pack(side=tk.RIGHT)
+        tk.Label(top, text="筛选：").pack(side=tk.RIGHT, padx=(10, 0))
+        self.lib_filter_var.trace_add("write", lambda *_: self._schedule_library_reload())
+        self._lib_reload_job = None
+        self._lib_scan_thread = None
+        self._lib_items = []
+        self._lib_total = 0
+        self._lib_hits = None          # 非 None 时列表显示的是全文搜索结果
+
+        srch = tk.Frame(parent); srch.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(0, 6))
+        tk.Label(srch, text="全文搜索：").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        ent = tk.Entry(srch, textvariable=self.search_var, width=40); ent.pack(side=tk.LEFT, padx=4)
+        ent.bind("<Return>", lambda e: self.run_search())
+        tk.Button(srch, text="搜索", width=8, command=self.run_search).pack(side=tk.LEFT, padx=4)
+        tk.Button(srch, text="清除", width=8, command=lambda: (self.search_var.set(""), self._reload_library())).pack(side=tk.LEFT, padx=4)
 
         btns = tk.Frame(parent); btns.pack(side=tk.TOP, fill=tk.X, padx=10)
         tk.Button(btns, text="刷新", width=10, command=self.refresh_library).pack(side=tk.LEFT, padx=4)
@@ -86,33 +167,108 @@ class MainWindow:
         self.btn_remove_from_lib = tk.Button(btns, text="从列表删除", width=12, command=self.remove_selected_from_library, state=tk.DISABLED)
         self.btn_remove_from_lib.pack(side=tk.LEFT, padx=4)
         tk.Button(btns, text="关于", width=10, command=self.show_about).pack(side=tk.RIGHT, padx=4)
-
-        self.listbox = tk.Listbox(parent, height=18)
-        self.listbox.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+        self.btn_compress = tk.Button(btns, text="压缩旧会话", width=12, command=self.compress_library)
+        self.btn_compress.pack(side=tk.RIGHT, padx=4)
+        self.btn_import_bundle = tk.Button(btns, text="导入文件包…", width=12, command=self.import_bundle_dialog)
+        self.btn_import_bundle.pack(side=tk.RIGHT, padx=4)
+        self.btn_export_bundle = tk.Button(btns, text="导出为文件包", width=12, command=self.export_selected_bundle, state=tk.DISABLED)
+        self.btn_export_bundle.pack(side=tk.RIGHT, padx=4)
+        self.lib_status = tk.StringVar(value="")
+        tk.Label(parent, textvariable=self.lib_status, anchor="w").pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+
+        body = tk.Frame(parent); body.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+        self.lib_scroll = tk.Scrollbar(body, orient=tk.VERTICAL)
+        self.lib_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(body, height=18, yscrollcommand=self._on_lib_scroll)
+        self.listbox.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        self.lib_scroll.config(command=self.listbox.yview)
         self.listbox.bind("<<ListboxSelect>>", self._on_lib_select)
         self.listbox.bind("<Double-Button-1>", lambda e: self.open_selected_from_library())
 
+    def _recover_unfinished(self):
+        try:
+            fixed = recover_sessions(default_sessions_root())
+        except Exception:
+            self.logger.exception("recover sessions failed"); return
+        for d in fixed:
+            self.logger.info("recovered unfinished session: %s", d)
+        if fixed:
+            self.status.set(f"已修复 {len(fixed)} 个未正常结束的会话，可在“会话库”中打开。")
+
     def refresh_library(self):
-        self.listbox.delete(0, tk.END)
-        self._lib_items = load_recent()
-        for p in self._lib_items:
-            name = os.path.basename(os.path.normpath(p))
-            mtime = ""
+        """先用索引里的缓存立即刷新列表，再在后台增量扫描会话目录，有变化时重新加载。"""
+        self._reload_library()
+        if self._lib_scan_thread and self._lib_scan_thread.is_alive(): return
+        state = {"done": False, "updated": 0}
+        def worker():
             try:
-                ts = os.path.getmtime(p)
-                import datetime as dt
-                mtime = dt.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                pass
-            self.listbox.insert(tk.END, f"{name}    ({mtime})\n{p}")
+                state["updated"] = scan_sessions(default_sessions_root())
+                update_index(catalog_paths())
+            except Exception: self.logger.exception("scan sessions failed")
+            finally: state["done"] = True
+        def poll():
+            if not state["done"]:
+                self.root.after(200, poll); return
+            if state["updated"]: self._reload_library()
+        self._lib_scan_thread = threading.Thread(target=worker, daemon=True)
+        self._lib_scan_thread.start()
+        self.root.after(200, poll)
+
+    def _schedule_library_reload(self):
+        # 输入筛选词时去抖，停顿 250ms 再查询
+        if self._lib_reload_job: self.root.after_cancel(self._lib_reload_job)
+        self._lib_reload_job = self.root.after(250, self._reload_library)
+
+    def run_search(self):
+        q = self.search_var.get().strip()
+        if not q:
+            self._reload_library(); return
+        try:
+            hits = search_notes(q)
+        except Exception:
+            self.logger.exception("search failed"); hits = []
+        self._lib_hits = hits
+        self._lib_items = [h["path"] for h in hits]
+        self._lib_total = len(hits)
+        self.listbox.delete(0, tk.END)
+        for h in hits:
+            name = os.path.basename(os.path.normpath(h["path"]))
+            self.listbox.insert(tk.END, f"{name}    [{self._fmt(h['time'])}]    …{h['snippet']}…")
+        self.lib_status.set(f"找到 {len(hits)} 个相关会话。" if hits else "没有找到匹配的笔记。")
+        self._update_lib_buttons()
+
+    def _reload_library(self):
+        self._lib_reload_job = None
+        self._lib_hits = None
+        self.listbox.delete(0, tk.END)
+        self._lib_items = []
+        self._lib_total = count_sessions(self.lib_filter_var.get().strip())
+        self._load_more_library()
         self._update_lib_buttons()
 
+    def _load_more_library(self):
+        rows = query_sessions(self.lib_filter_var.get().strip(), LIB_SORTS.get(self.lib_sort_var.get(), "recent"),
+                              limit=LIB_PAGE, offset=len(self._lib_items))
+        import datetime as dt
+        for r in rows:
+            mtime = dt.datetime.fromtimestamp(r["mtime"]).strftime("%Y-%m-%d %H:%M") if r["mtime"] else ""
+            dur = self._fmt(r["duration"]) if r["duration"] is not None else "--:--:--"
+            self.listbox.insert(tk.END, f"{r['name']}    ({mtime})    {dur}    {r['markers']} 个标记    {r['preview']}")
+            self._lib_items.append(r["path"])
+
+    def _on_lib_scroll(self, first, last):
+        # 滚动到接近底部时再取下一页，Listbox 里只放看过的条目
+        self.lib_scroll.set(first, last)
+        if self._lib_hits is None and float(last) > 0.9 and len(self._lib_items) < self._lib_total:
+            self.root.after_idle(self._load_more_library)
+
     def _on_lib_select(self, *_): self._update_lib_buttons()
     def _update_lib_buttons(self):
         sel = self.listbox.curselection()
         enabled = tk.NORMAL if sel else tk.DISABLED
         self.btn_open_from_lib.config(state=enabled)
         self.btn_remove_from_lib.config(state=enabled)
+        self.btn_export_bundle.config(state=enabled)
 
     def _get_selected_path(self):
         sel = self.listbox.curselection()
@@ -127,18 +283,115 @@ class MainWindow:
         if not os.path.isdir(p):
             messagebox.showwarning("无效条目", "该路径不存在，已从列表移除。")
             remove_recent(p); self.refresh_library(); return
-        self._open_session_path(p); self.nb.select(self.rev_frame)
+        hit = None
+        if self._lib_hits is not None:
+            sel = self.listbox.curselection()
+            if sel and sel[0] < len(self._lib_hits): hit = self._lib_hits[sel[0]]
+        self._open_session_path(p)
+        if self.review_session != p: return
+        self.nb.select(self.rev_frame)
+        if hit: self._jump_to_hit(hit)
+
+    def _jump_to_hit(self, hit):
+        """定位搜索命中：高亮实际匹配的文字，并跳到覆盖它的标记时间。"""
+        # 按回放页当前的标记（时间戳或隐形锚点）定位；索引里的 time 在只有锚点的会话中为 0
+        t = self._time_at_offset(hit["offset"])
+        self._seek_to(t); self._highlight_at_time(t)
+        start = self._offset_to_index(hit["offset"])
+        self.review_text.tag_remove("search", "1.0", tk.END)
+        if hit["length"]:   # 为 0：正文里没找到原词（只按分词命中），不高亮
+            self.review_text.tag_add("search", start, self._offset_to_index(hit["offset"] + hit["length"]))
+        self.review_text.mark_set(tk.INSERT, start)
+        self.review_text.see(start)
 
     def remove_selected_from_library(self):
         p = self._get_selected_path()
         if not p: return
         remove_recent(p); self.refresh_library()
 
+    def compress_library(self):
+        """后台把默认目录下所有会话的 audio.wav 无损压缩为 RTLC，完成后刷新列表。"""
+        if self._compressing() or self.rec.is_recording: return
+        root_dir = default_sessions_root()
+        if not messagebox.askyesno("压缩旧会话",
+                f"将把 {root_dir} 下所有会话的 audio.wav 无损压缩为 audio{RTLC_EXT}，"
+                "逐一解码校验一致后删除原 WAV。\n是否继续？"):
+            return
+        state = {"done": 0, "total": 0, "errors": 0, "finished": False}
+        def progress(i, n, d, res):
+            state.update(done=i, total=n)
+            if isinstance(res, Exception):
+                state["errors"] += 1
+                self.logger.warning("compress failed: %s (%s)", d, res)
+        def worker():
+            try: compress_sessions(root_dir, progress=progress, skip=skip)
+            finally: state["finished"] = True
+        def poll():
+            if state["finished"]:
+                if not self.rec.is_recording: self.btn_compress.config(state=tk.NORMAL)
+                self.lib_status.set(f"压缩完成：{state['done']} 个会话，失败 {state['errors']} 个。")
+                self.refresh_library(); return
+            self.lib_status.set(f"正在压缩… {state['done']}/{state['total']}")
+            self.root.after(500, poll)
+        # 正在录音的会话与回放页打开（播放器映射着 WAV）的会话不压缩
+        skip = [self.session_dir, self.review_session]
+        self.btn_compress.config(state=tk.DISABLED)
+        self._compress_thread = threading.Thread(target=worker, daemon=True)
+        self._compress_thread.start()
+        poll()
+
+    def _compressing(self):
+        return bool(getattr(self, "_compress_thread", None) and self._compress_thread.is_alive())
+
+    def _run_bundle_job(self, label, job, on_done):
+        """后台执行文件包导出/导入 job(progress)，在会话库状态栏显示进度；完成后在主线程调用 on_done(result)。"""
+        state = {"done": 0, "total": 0, "result": None, "error": None, "finished": False}
+        def progress(done, total):
+            state["done"], state["total"] = done, total
+        def worker():
+            try: state["result"] = job(progress)
+            except Exception as e: state["error"] = e
+            finally: state["finished"] = True
+        def poll():
+            if state["finished"]:
+                self.btn_export_bundle.config(state=tk.NORMAL); self.btn_import_bundle.config(state=tk.NORMAL)
+                if state["error"] is not None:
+                    self.lib_status.set(f"{label}失败：{state['error']}")
+                    self.logger.warning("%s failed: %s", label, state["error"])
+                    messagebox.showerror(f"{label}失败", str(state["error"])); return
+                self.lib_status.set(f"{label}完成：{state['result']}")
+                on_done(state["result"]); return
+            pct = state["done"] * 100 // state["total"] if state["total"] else 0
+            self.lib_status.set(f"正在{label}… {pct}%（{state['done'] // 1048576}/{state['total'] // 1048576} MB）")
+            self.root.after(200, poll)
+        self.btn_export_bundle.config(state=tk.DISABLED); self.btn_import_bundle.config(state=tk.DISABLED)
+        threading.Thread(target=worker, daemon=True).start()
+        poll()
+
+    def export_selected_bundle(self):
+        """把所选会话打包为单个 .rtsb 文件（带校验和）。"""
+        p = self._get_selected_path()
+        if not p or not os.path.isdir(p): return
+        dst = filedialog.askdirectory(title="选择导出位置")
+        if not dst: return
+        if os.path.exists(os.path.join(dst, os.path.basename(os.path.normpath(p)) + BUNDLE_EXT)):
+            messagebox.showwarning("已存在", "目标已存在同名文件包"); return
+        self._run_bundle_job("导出文件包", lambda progress: export_bundle(p, dst, progress=progress),
+                             lambda target: messagebox.showinfo("导出成功", f"已导出到：\n{target}"))
+
+    def import_bundle_dialog(self):
+        """把 .rtsb 文件包解到默认保存位置（校验 CRC），并加入会话库。"""
+        path = filedialog.askopenfilename(title="选择会话文件包", filetypes=[("RecordType 文件包", "*" + BUNDLE_EXT)])
+        if not path: return
+        root_dir = default_sessions_root()
+        def done(d):
+            add_recent(d); self.refresh_library()
+        self._run_bundle_job("导入文件包", lambda progress: import_bundle(path, root_dir, progress=progress), done)
+
     def browse_add_session(self):
         d = filedialog.askdirectory(title="选择 session_XXXX 目录")
         if not d: return
-        audio_ok = os.path.exists(os.path.join(d, "audio.wav")) or os.path.exists(os.path.join(d, "audio"))
-        if not audio_ok:
+        if session_audio_path(d) is None:
             messagebox.showwarning("不是会话目录", "未找到 audio.wav"); return
         add_recent(d); self.refresh_library()
 
@@ -150,6 +403,18 @@ class MainWindow:
         self.device_box = ttk.Combobox(top, textvariable=self.device_var, state="readonly", width=46)
         self.device_box.pack(side=tk.LEFT, padx=(0,6))
         tk.Button(top, text="刷新设备", command=self.refresh_devices).pack(side=tk.LEFT, padx=4)
+        self.btn_multi = tk.Button(top, text="多设备…", command=self.choose_multi_devices)
+        self.btn_multi.pack(side=tk.LEFT, padx=4)
+        self.segmented_var = tk.BooleanVar(value=False)
+        self.chk_segmented = tk.Checkbutton(top, text="分段存储", variable=self.segmented_var)
+        self.chk_segmented.pack(side=tk.LEFT, padx=4)
+        self.compress_var = tk.BooleanVar(value=False)
+        self.chk_compress = tk.Checkbutton(top, text="无损压缩", variable=self.compress_var)
+        self.chk_compress.pack(side=tk.LEFT, padx=4)
+        self.format_var = tk.StringVar(value=next(iter(RECORD_FORMATS)))
+        self.format_box = ttk.Combobox(top, textvariable=self.format_var, values=list(RECORD_FORMATS),
+                                       state="readonly", width=16)
+        self.format_box.pack(side=tk.LEFT, padx=4)
 
         self.btn_start = tk.Button(top, text="▶ 开始录音", width=12, command=self.start); self.btn_start.pack(side=tk.LEFT, padx=6)
         self.btn_mark  = tk.Button(top, text="⏱ 插入时间戳(Ctrl+M)", width=20, command=self.mark, state=tk.DISABLED); self.btn_mark.pack(side=tk.LEFT, padx=6)
@@ -164,38 +429,113 @@ class MainWindow:
         tk.Label(parent, textvariable=self.status, anchor="w").pack(side=tk.BOTTOM, fill=tk.X)
 
         self.autosaver = AutoSaver(
-            get_text_fn=lambda: self.text.get("1.0", tk.END),
-            save_fn=lambda t: save_text(os.path.join(self.session_dir, "_autosave.md"), t) if self.session_dir else None,
+            self.root, self.text,
+            dir_fn=lambda: self.session_dir if self.rec.is_recording else None,
+            save_fn=save_text,
             interval_sec=20
         )
 
+        self.text.bind("<<Modified>>", self._on_text_modified)
+
         parent.bind("<Control-s>", lambda e: self.stop())
         parent.bind("<Control-S>", lambda e: self.stop())
         parent.bind("<Control-m>", lambda e: self.mark())
         parent.bind("<Control-M>", lambda e: self.mark())
 
-        self.refresh_devices()
+        self._dev_labels = {}       # 下拉框文字 -> 设备身份 key
+        self._multi_keys = []       # 多设备录音选中的设备身份（少于两个时为单设备录音）
+        self._multi_merge = False   # 停止后在后台另存一个多声道 WAV
+        self._dev_gen = -1
+        self._dev_error_shown = False
+        self.devices.start()
+        self._poll_devices()
+
+    def _devices_idle(self):
+        """没有录音/播放流打开时，设备注册表才可以重新初始化 PortAudio（在后台线程调用）。"""
+        player = self.player
+        return not self.rec.is_recording and not (player and player.stream_open())
 
     def refresh_devices(self):
-        try:
-            items = AudioRecorder.list_input_devices()
-            labels = [label for _, label in items]
-            self.device_box["values"] = labels
-            if labels:
+        """“刷新设备”：让注册表在后台重新扫描（插拔后的新设备），结果由 _poll_devices 填入下拉框。"""
+        self.devices.request_rescan()
+        if not self.rec.is_recording: self.status.set("正在查找输入设备…")
+
+    def _poll_devices(self):
+        if self.devices.ready and self.devices.generation != self._dev_gen:
+            self._dev_gen = self.devices.generation
+            self._apply_devices(list(self.devices.devices), self.devices.error)
+            self.profile.done("devices", self.logger)
+        elif self.devices.ready and not self.devices.devices and self.devices.error and not self._dev_error_shown:
+            self._apply_devices([], self.devices.error)
+            self.profile.done("devices", self.logger)
+        self.root.after(100 if not self.devices.ready else 1000, self._poll_devices)
+
+    def _apply_devices(self, devices, error):
+        if error is not None and not devices:
+            self.status.set(f"加载设备失败：{error}")
+            if not self._dev_error_shown:
+                self._dev_error_shown = True
+                messagebox.showerror("加载设备失败",
+                    f"无法获取输入设备列表：\n{error}\n\n请检查：设置→隐私与安全性→麦克风、声音设置、是否有其他程序独占设备。")
+            return
+        self._dev_labels = {device_label(d): d.key for d in devices}
+        labels = list(self._dev_labels)
+        self.device_box["values"] = labels
+        if labels:
+            if self.device_var.get() not in self._dev_labels:
                 self.device_box.current(0); self.device_var.set(labels[0])
+            if not self.rec.is_recording:
                 self.status.set(f"已加载 {len(labels)} 个输入设备。")
-            else:
+        else:
+            self.device_var.set("")
+            if not self.rec.is_recording:
                 self.status.set("未发现可用输入设备。请检查系统声音设置。")
-        except Exception as e:
-            self.status.set(f"加载设备失败：{e}")
-            messagebox.showerror("加载设备失败",
-                f"无法获取输入设备列表：\n{e}\n\n请检查：设置→隐私与安全性→麦克风、声音设置、是否有其他程序独占设备。")
 
-    def _selected_device_index(self):
-        txt = self.device_var.get().strip()
-        if not txt or " - " not in txt: return None
-        try: return int(txt.split(" - ", 1)[0])
-        except: return None
+    def _selected_device_key(self):
+        return self._dev_labels.get(self.device_var.get().strip())
+
+    def _device_name(self, key):
+        dev = self.devices.find(key)
+        return device_label(dev) if dev else key[1]
+
+    def choose_multi_devices(self):
+        """“多设备…”：勾选两个以上输入设备同时录音（每个设备一轨，按公共时间轴对齐）；少于两个时恢复单设备录音。"""
+        if self.rec.is_recording: return
+        if len(self._dev_labels) < 2:
+            messagebox.showinfo("多设备录音", "需要至少两个输入设备。"); return
+        win = tk.Toplevel(self.root); win.title("多设备录音")
+        win.transient(self.root); win.resizable(False, False)
+        tk.Label(win, text="勾选要同时录音的输入设备（至少两个）：", anchor="w").pack(fill=tk.X, padx=12, pady=(10, 4))
+        checks = []
+        for label, key in self._dev_labels.items():
+            v = tk.BooleanVar(value=key in self._multi_keys)
+            tk.Checkbutton(win, text=label, variable=v, anchor="w").pack(fill=tk.X, padx=16)
+            checks.append((key, v))
+        merge_var = tk.BooleanVar(value=self._multi_merge)
+        tk.Checkbutton(win, text="停止后另存一个多声道文件（后台进行，回放仍用各轨混音）", variable=merge_var,
+                       anchor="w").pack(fill=tk.X, padx=12, pady=(8, 0))
+
+        def ok():
+            keys = [k for k, v in checks if v.get()]
+            self._multi_keys = keys if len(keys) >= 2 else []
+            self._multi_merge = bool(merge_var.get())
+            win.destroy()
+            self._apply_multi_state()
+
+        btns = tk.Frame(win); btns.pack(fill=tk.X, padx=12, pady=10)
+        tk.Button(btns, text="确定", width=10, command=ok).pack(side=tk.RIGHT, padx=4)
+        tk.Button(btns, text="取消", width=10, command=win.destroy).pack(side=tk.RIGHT)
+        win.grab_set()
+
+    def _apply_multi_state(self):
+        """多设备模式下不用单设备下拉框；分段存储与无损压缩只用于单设备录音。"""
+        multi = bool(self._multi_keys)
+        self.device_box.config(state="disabled" if multi else "readonly")
+        self.chk_segmented.config(state=tk.DISABLED if multi else tk.NORMAL)
+        self.chk_compress.config(state=tk.DISABLED if multi else tk.NORMAL)
+        self.btn_multi.config(text=f"多设备（{len(self._multi_keys)}）…" if multi else "多设备…")
+        if multi and not self.rec.is_recording:
+            self.status.set("多设备录音：" + "、".join(self._device_name(k) for k in self._multi_keys))
 
     def set_state(self, recording: bool):
         if recording:
@@ -204,17 +544,52 @@ class MainWindow:
             self.btn_stop.config(state=tk.NORMAL)
             self.btn_export.config(state=tk.DISABLED)
             self.device_box.config(state="disabled")
+            self.btn_multi.config(state=tk.DISABLED)
+            self.btn_compress.config(state=tk.DISABLED)
+            self.format_box.config(state="disabled")
+            self.chk_segmented.config(state=tk.DISABLED)
+            self.chk_compress.config(state=tk.DISABLED)
         else:
             self.btn_start.config(state=tk.NORMAL)
             self.btn_mark.config(state=tk.DISABLED)
             self.btn_stop.config(state=tk.DISABLED)
             self.btn_export.config(state=tk.NORMAL)
-            self.device_box.config(state="readonly")
+            self.btn_multi.config(state=tk.NORMAL)
+            if not self._compressing(): self.btn_compress.config(state=tk.NORMAL)
+            self.format_box.config(state="readonly")
+            self._apply_multi_state()
 
     def start(self):
+        # 后台正在重新初始化 PortAudio（持有注册表锁）时不在 Tk 线程上等待，提示稍后再试
+        if not self.devices.lock.acquire(blocking=False):
+            self.status.set("正在刷新设备列表，请稍后再开始录音。"); return
+        try:
+            self._start()
+        finally:
+            self.devices.lock.release()
+
+    def _start(self):
         # 1) 创建会话目录
         self.session_dir = new_session_dir()
-        audio_path = os.path.join(self.session_dir, "audio.wav")
+        # 分段模式写入 audio_segments/ 目录；否则单个 audio.wav，勾选压缩时为 audio.rtlc
+        # 多设备录音写入 audio_tracks/ 目录（每个设备一轨）
+        multi = len(self._multi_keys) >= 2
+        sr, channels = RECORD_FORMATS.get(self.format_var.get(), (44100, 1))
+        if multi:
+            self.rec = MultiRecorder([], samplerate=sr, channels=channels,
+                                     labels=[self._device_name(k) for k in self._multi_keys])
+        else:
+            self.rec = self._single_rec
+            self.rec.sr, self.rec.channels = sr, channels
+        segmented = bool(self.segmented_var.get()) and not multi
+        compressed = bool(self.compress_var.get()) and not segmented and not multi
+        self.rec.segment_seconds = SEGMENT_SECONDS if segmented else None
+        self.rec.codec = "rtlc" if compressed else None
+        if multi: name = TRACKS_DIRNAME
+        elif segmented: name = SEGMENTS_DIRNAME
+        elif compressed: name = "audio" + RTLC_EXT
+        else: name = "audio.wav"
+        audio_path = os.path.join(self.session_dir, name)
 
         # 2) 开会话日志（可选）
         try:
@@ -228,9 +603,16 @@ class MainWindow:
             pass
 
         # 3) 打开录音设备并开始
+        key = None if multi else self._selected_device_key()
         try:
-            self.rec.set_device(self._selected_device_index())
-            self.rec.start(audio_path)
+            # 按设备身份重新解析序号（插拔后旧序号可能已指向别的设备）；start() 已持锁，不会与后台重扫并发
+            with self.devices.lock:
+                if multi:
+                    self.rec.set_device(self.devices.resolve_all(self._multi_keys))
+                else:
+                    self.rec.set_device(self.devices.resolve(key))
+                self.rec.start(audio_path, peaks_path=os.path.join(self.session_dir, PEAKS_FILENAME),
+                               speech_path=os.path.join(self.session_dir, SPEECH_FILENAME))
         except Exception as e:
             messagebox.showerror("设备错误", f"无法打开录音设备：\n{e}")
             return
@@ -238,31 +620,51 @@ class MainWindow:
         # 4) 元信息 + UI 状态
         self.meta = {
             "sample_rate": self.rec.sr, "channels": self.rec.channels, "sample_width": self.rec.sample_width,
-            "device_index": self._selected_device_index(), "audio_path": audio_path, "duration_seconds": None,
+            "device_index": self.rec.device, "device_name": key[1] if key else None,
+            "device_hostapi": key[0] if key else None, "audio_path": audio_path, "duration_seconds": None,
+            "segment_seconds": self.rec.segment_seconds,
         }
         self.autosaver.start()
         self.set_state(True); self.status.set("录音中… 你可以开始输入笔记。")
-
-        # 5) 启动“隐形锚点”采集
-        self.anchors = []
-        self._start_anchor_timer()
-
-    def _start_anchor_timer(self, interval_ms: int = 2000):
-        try:
-            t = float(self.rec.elapsed_seconds())
-            text_len = len(self.text.get("1.0", "end-1c"))
-            if not self.anchors or (t - self.anchors[-1][0] >= 1.0 or text_len != self.anchors[-1][1]):
-                self.anchors.append((t, text_len))
-        except Exception:
-            pass
-        finally:
-            self._anchor_timer = self.root.after(interval_ms, self._start_anchor_timer, interval_ms)
-
-    def _stop_anchor_timer(self):
-        if self._anchor_timer:
-            try: self.root.after_cancel(self._anchor_timer)
-            except Exception: pass
-            self._anchor_timer = None
+        self._telemetry_logged = 0.0
+        self._telemetry_job = self.root.after(TELEMETRY_STATUS_MS, self._telemetry_tick)
+
+        # 5) “隐形锚点”从这里开始由文本修改事件采集
+        self._anchor_t = array("d"); self._anchor_off = array("i")
+        self._anchor_t.append(0.0); self._anchor_off.append(self._insert_offset())
+
+    def _telemetry_tick(self):
+        """录音中定期把健康统计显示到状态栏，并按较长间隔写一行到 app.log。"""
+        self._telemetry_job = None
+        if not self.rec.is_recording: return
+        snap = self.rec.telemetry_snapshot()
+        if snap:
+            self.status.set(f"录音中 {self.rec.elapsed_hms()} | {format_telemetry(snap)}")
+            if snap["elapsed_seconds"] - self._telemetry_logged >= TELEMETRY_LOG_SEC:
+                self._telemetry_logged = snap["elapsed_seconds"]
+                self.logger.info(format_telemetry_log(snap))
+        self._telemetry_job = self.root.after(TELEMETRY_STATUS_MS, self._telemetry_tick)
+
+    def _cancel_telemetry(self):
+        if self._telemetry_job:
+            self.root.after_cancel(self._telemetry_job); self._telemetry_job = None
+
+    def _insert_offset(self):
+        n = self.text.count("1.0", tk.INSERT, "chars")
+        return int(n[0]) if n else 0
+
+    def _on_text_modified(self, _event=None):
+        # 重置 modified 标志本身也会触发 <<Modified>>，此时标志为 False，直接跳过
+        if not self.text.edit_modified(): return
+        self.text.edit_modified(False)
+        if not self.rec.is_recording: return
+        self.autosaver.notify_modified()
+        # 记录“何时在何处编辑”：限频，且同一位置的连续输入只留一个
+        t = float(self.rec.elapsed_seconds())
+        if self._anchor_t and t - self._anchor_t[-1] < ANCHOR_MIN_INTERVAL: return
+        off = self._insert_offset()
+        if self._anchor_off and off == self._anchor_off[-1]: return
+        self._anchor_t.append(t); self._anchor_off.append(off)
 
     def mark(self):
         tag = f"[{self.rec.elapsed_hms()}]"
@@ -273,29 +675,77 @@ class MainWindow:
         if not self.session_dir: return
         try:
             # 1) 停止录音
+            self._cancel_telemetry()
             duration = self.rec.stop()
             self.meta["duration_seconds"] = duration
-
-            # 2) 保存 anchors / notes / meta
-            self._stop_anchor_timer()
-            save_json(os.path.join(self.session_dir, "anchors.json"),
-                      [{"t": round(t,3), "len": ln} for (t, ln) in self.anchors])
+            if self.rec.sink_stats:
+                self.meta["compression"] = self.rec.sink_stats
+            if self.rec.capture_stats:
+                self.meta["capture"] = self.rec.capture_stats
+            if self.rec.telemetry_summary:
+                self.meta["telemetry"] = self.rec.telemetry_summary
+                self.logger.info(format_telemetry_log(self.rec.telemetry_summary))
+            if isinstance(self.rec, MultiRecorder):
+                # 各轨的设备、起点偏移与漂移校正
+                self.meta["tracks"] = self.rec.tracks_info
+
+            # 2) 保存 anchors / notes / meta（锚点偏移换算到 notes.md 中的位置）
+            head = len(NOTES_HEADER)
+            save_anchors(self.session_dir, self._anchor_t, array("i", (o + head for o in self._anchor_off)))
 
             save_text(os.path.join(self.session_dir, "notes.md"),
-                      "# 笔记\n\n" + self.text.get("1.0", tk.END))
+                      NOTES_HEADER + self.text.get("1.0", tk.END))
             save_json(os.path.join(self.session_dir, "meta.json"), self.meta)
 
-            # 3) 自动加入“会话库”
+            # 3) 自动加入“会话库”与全文索引
             add_recent(self.session_dir)
+            try: index_session(self.session_dir)
+            except Exception: self.logger.exception("index session failed")
 
             self.autosaver.stop()
             self.set_state(False)
             self.status.set(f"已保存：{self.session_dir}")
+            if isinstance(self.rec, MultiRecorder) and self._multi_merge:
+                self._export_multichannel(self.session_dir, self.rec.audio_path)
             messagebox.showinfo("完成", f"音频与笔记已保存：\n{self.session_dir}\n可在“会话库”一键打开。")
             self.refresh_library()
         except Exception:
             messagebox.showerror("保存失败", traceback.format_exc())
 
+    def _export_multichannel(self, session_dir, tracks_dir):
+        """
+        后台把各轨并排写成 <会话>/audio_multichannel.wav，在录音页状态栏显示进度（录音中不覆盖状态栏）。
+        会话音频仍是 audio_tracks/；完成后把文件名记入 meta.json 的 multichannel_file。
+        """
+        state = {"done": 0, "total": 0, "error": None, "finished": False}
+        out = os.path.join(session_dir, MULTICHANNEL_NAME)
+        def progress(done, total):
+            state["done"], state["total"] = done, total
+        def worker():
+            try: merge_tracks(tracks_dir, out, progress=progress)
+            except Exception as e: state["error"] = e
+            finally: state["finished"] = True
+        def poll():
+            quiet = self.rec.is_recording
+            if not state["finished"]:
+                if not quiet and state["total"]:
+                    self.status.set(f"正在导出多声道文件… {state['done'] * 100 // state['total']}%")
+                self.root.after(500, poll); return
+            if state["error"] is not None:
+                self.logger.warning("multichannel export failed: %s", state["error"])
+                if not quiet: self.status.set(f"多声道文件导出失败：{state['error']}")
+                return
+            meta_path = os.path.join(session_dir, "meta.json")
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f: meta = json.load(f)
+                meta["multichannel_file"] = MULTICHANNEL_NAME
+                save_json(meta_path, meta)
+            except (OSError, ValueError):
+                self.logger.exception("update meta failed")
+            if not quiet: self.status.set(f"已导出多声道文件：{out}")
+        threading.Thread(target=worker, daemon=True).start()
+        poll()
+
     def export(self):
         if not self.session_dir: return
         dst = filedialog.askdirectory(title="选择导出位置")
@@ -312,18 +762,37 @@ class MainWindow:
     def _build_review_tab(self, parent):
         top = tk.Frame(parent); top.pack(side=tk.TOP, fill=tk.X, padx=10, pady=10)
         tk.Button(top, text="打开会话…", command=self.open_session_dialog).pack(side=tk.LEFT, padx=4)
+        tk.Button(top, text="打开文件包…", command=self.open_bundle_dialog).pack(side=tk.LEFT, padx=4)
         self.btn_play = tk.Button(top, text="▶ 播放", state=tk.DISABLED, command=self.toggle_play); self.btn_play.pack(side=tk.LEFT, padx=6)
         self.btn_stop2 = tk.Button(top, text="⏹ 停止", state=tk.DISABLED, command=self.stop_playback); self.btn_stop2.pack(side=tk.LEFT, padx=6)
+        tk.Button(top, text="⏮", command=lambda: self.jump_marker(-1)).pack(side=tk.LEFT, padx=2)
+        tk.Button(top, text="⏭", command=lambda: self.jump_marker(1)).pack(side=tk.LEFT, padx=2)
         self.time_var = tk.StringVar(value="00:00 / 00:00")
         tk.Label(top, textvariable=self.time_var).pack(side=tk.LEFT, padx=10)
-
-        self.progress = tk.Canvas(parent, height=26, bg="#F2F3F5", highlightthickness=0)
+        tk.Label(top, text="倍速").pack(side=tk.LEFT, padx=(10, 2))
+        self.speed_var = tk.StringVar(value="1x")
+        speed_box = ttk.Combobox(top, textvariable=self.speed_var, values=PLAY_SPEEDS, state="readonly", width=6)
+        speed_box.pack(side=tk.LEFT)
+        speed_box.bind("<<ComboboxSelected>>", lambda e: self._apply_speed())
+        self.skip_silence_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(top, text="跳过静音", variable=self.skip_silence_var,
+                       command=self._apply_skip_silence).pack(side=tk.LEFT, padx=8)
+        tk.Button(top, text="✂ 导出片段…", command=self.export_clips_dialog).pack(side=tk.LEFT, padx=6)
+
+        self.progress = tk.Canvas(parent, height=44, bg="#F2F3F5", highlightthickness=0)
         self.progress.pack(fill=tk.X, padx=10, pady=4)
         self.progress.bind("<Button-1>", self.on_progress_click)
+        self.progress.bind("<Configure>", lambda e: self._invalidate_layers())
+        self._progress_fill = None
+        self._progress_t = 0.0
+        self._peaks = None
+        self._peaks_session = None
 
         self.review_text = tk.Text(parent, wrap="word", font=("Segoe UI", 12))
         self.review_text.pack(expand=True, fill=tk.BOTH, padx=10, pady=(0,10))
         self.review_text.tag_configure("hilite", background="#FFF3B0")
+        self.review_text.tag_configure("search", background="#FDBA74")
+        self.review_text.tag_raise("search")
         self.review_text.bind("<Button-1>", self.on_text_click)
 
     def open_session_dialog(self):
@@ -331,54 +800,53 @@ class MainWindow:
         if not d: return
         self._open_session_path(d)
 
+    def open_bundle_dialog(self):
+        path = filedialog.askopenfilename(title="选择会话文件包", filetypes=[("RecordType 文件包", "*" + BUNDLE_EXT)])
+        if not path: return
+        self._open_session_path(path)
+
     def _open_session_path(self, d):
-        audio = os.path.join(d, "audio.wav")
-        if not os.path.exists(audio):  # 兼容扩展名被隐藏
-            audio = os.path.join(d, "audio")
+        # d 可以是会话目录，也可以是 .rtsb 文件包：后者只读目录表，音频直接映射、其余各段按偏移读取
+        try:
+            bundle = Bundle(d) if is_bundle(d) else None
+        except ValueError as e:
+            messagebox.showwarning("无法打开文件包", str(e)); return
+        audio = session_audio_path(d)  # audio.wav / 扩展名被隐藏 / 分段目录 / 文件包
         notes = os.path.join(d, "notes.md")
-        if not (os.path.exists(audio) and os.path.exists(notes)):
+        has_notes = bundle.has("notes.md") if bundle else os.path.exists(notes)
+        if not (audio and has_notes):
             messagebox.showwarning("缺少文件", "未找到 audio.wav 或 notes.md"); return
 
+        self.refresh.cancel()
         if self.player: self.player.close()
         self.player = WavPlayer(audio)
+        self._apply_speed()
         self.review_total = self.player.duration()
 
-        raw = open(notes, "r", encoding="utf-8").read()
-        times = []
-        out_chars = []; i = 0
-        for m in TIMESTAMP_RE.finditer(raw):
-            h, m2, s = map(int, m.groups())
-            sec = h*3600 + m2*60 + s
-            out_chars.append(raw[i:m.start()])
-            i = m.end()
-            current_clean_len = len("".join(out_chars))
-            times.append((sec, current_clean_len))
-        out_chars.append(raw[i:])
-        clean = "".join(out_chars)
+        clean, times, offsets = parse_notes(bundle.read_text("notes.md")) if bundle else parse_notes_file(notes)
         self.review_clean_text = clean
-        self.review_markers = sorted(times, key=lambda x: x[0])
+        self.review_markers = sorted_markers(times, offsets)
 
+        self._speech_marks = []
+        self._has_timestamps = bool(self.review_markers)
         if not self.review_markers:
-            anchors_path = os.path.join(d, "anchors.json")
-            if os.path.exists(anchors_path):
-                anchors = json.load(open(anchors_path, "r", encoding="utf-8"))
-                self.review_markers = [(float(a["t"]), int(a["len"])) for a in anchors]
-                self.review_markers.sort(key=lambda x: x[0])
-                dedup, last_off = [], -1
-                for sec, off in self.review_markers:
-                    if off != last_off:
-                        dedup.append((sec, off)); last_off = off
-                self.review_markers = dedup
+            if bundle:
+                self.review_markers = bundle_anchor_markers(bundle) or [(0.0, 0)]
+            elif any(os.path.exists(os.path.join(d, n)) for n in (ANCHORS_BIN, "anchors.json")):
+                self.review_markers = load_anchor_markers(d)
             else:
                 self.review_markers = [(0.0, 0)]
 
         self.review_text.delete("1.0", tk.END)
         self.review_text.insert("1.0", clean)
+        self._build_line_index(clean)
+        self._build_marker_index()
+        self.review_session = d
+        self._load_peaks(d, audio, bundle)
+        self._load_speech(d, bundle)
+        self._progress_t = 0.0; self._time_text = None; self._invalidate_layers()
         self.btn_play.config(state=tk.NORMAL, text="▶ 播放")
         self.btn_stop2.config(state=tk.NORMAL)
-        self.update_progress_bar(0.0)
-        self.time_var.set(f"{self._fmt(0)} / {self._fmt(self.review_total)}")
-        self._schedule_progress_updater(True)
 
     # —— 播放联动 —— #
     def _fmt(self, t):
@@ -387,94 +855,335 @@ class MainWindow:
     def toggle_play(self):
         if not self.player: return
         if self.btn_play["text"].startswith("▶"):
-            self.player.play(); self.btn_play.config(text="⏸ 暂停")
+            self.btn_play.config(text="⏸ 暂停"); self._play()
+            self.refresh.start()
         else:
             self.player.pause(); self.btn_play.config(text="▶ 播放")
+            self.refresh.request()
+
+    def _play(self):
+        # 首次播放会打开输出流：与设备注册表的后台重扫互斥。重扫进行中时不阻塞 Tk 线程，
+        # 稍后重试（其间按了暂停就不再播放）
+        if not self.player or not self.btn_play["text"].startswith("⏸"): return
+        if self.player.stream_open():
+            self.player.play(); return
+        if not self.devices.lock.acquire(blocking=False):
+            self.root.after(PLAY_RETRY_MS, self._play); return
+        try:
+            self.player.play()
+        finally:
+            self.devices.lock.release()
+        self.refresh.start()
+
+    def _apply_speed(self):
+        if not self.player: return
+        try: self.player.set_speed(float(self.speed_var.get().rstrip("x")))
+        except ValueError: pass
+
+    def _apply_skip_silence(self):
+        if not self.player: return
+        self.player.set_skip_silence(self.skip_silence_var.get())
+
+    def _load_speech(self, d, bundle=None):
+        """读取语音段；旧会话没有 speech.json 时后台检测，完成后再应用（文件包只检测、不写回）。"""
+        segs = bundle_speech(bundle) if bundle else load_speech(d)
+        if segs is not None:
+            self._apply_speech(segs); return
+        state = {"done": False, "segs": None}
+        def worker():
+            try:
+                state["segs"] = analyze_audio(d)[0] if bundle else analyze_session(d)
+            except Exception as e:
+                self.logger.warning("speech analysis failed: %s (%s)", d, e)
+            finally:
+                state["done"] = True
+        def poll():
+            if self.review_session != d: return   # 已切换到别的会话
+            if not state["done"]:
+                self.root.after(300, poll); return
+            if state["segs"] is not None: self._apply_speech(state["segs"])
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(300, poll)
+
+    def _apply_speech(self, segs):
+        """把语音段交给播放器；没有 [HH:MM:SS] 标记的会话用各段起点作为额外标记。"""
+        if not self.player: return
+        self.player.set_speech(segs)
+        self.player.set_skip_silence(self.skip_silence_var.get())
+        if not self._has_timestamps and segs:
+            self._speech_marks = [a for a, _b in segs]
+            self._invalidate_layers()
+
+    def _nav_times(self):
+        return sorted(set(self._mk_times) | set(self._speech_marks))
+
+    def jump_marker(self, step):
+        """跳到上一个（step=-1）/下一个（step=1）标记或语音段起点。"""
+        if not self.player: return
+        times, t = self._nav_times(), self.player.current_time()
+        if not times: return
+        if step > 0:
+            i = bisect.bisect_right(times, t + 0.05)
+            if i >= len(times): return
+        else:
+            # 刚过段首不久时回到再前一段，和常见播放器一致
+            i = max(0, bisect.bisect_left(times, t - 1.0) - 1)
+        self._seek_to(times[i])
 
     def stop_playback(self):
         if not self.player: return
         self.player.stop(); self.btn_play.config(text="▶ 播放")
-        self.update_progress_bar(0.0); self._highlight_at_time(0.0)
-        self.time_var.set(f"{self._fmt(0)} / {self._fmt(self.review_total)}")
+        self._progress_t = 0.0; self.refresh.request()
 
     def on_progress_click(self, event):
         if not self.player: return
         width = self.progress.winfo_width()
         ratio = max(0.0, min(1.0, event.x / max(1, width)))
-        t = ratio * self.review_total
-        self.player.seek(t); self._highlight_at_time(t); self.update_progress_bar(t)
+        self._seek_to(ratio * self.review_total)
 
     def on_text_click(self, event):
         if not self.player: return
         index = self.review_text.index(f"@{event.x},{event.y}")
         line, col = map(int, index.split("."))
         char_offset = self._index_to_offset(line, col)
-        sec = 0.0
-        for i in range(len(self.review_markers)-1, -1, -1):
-            ts, off = self.review_markers[i]
-            if char_offset >= off: sec = float(ts); break
-        self.player.seek(sec); self._highlight_at_time(sec); self.update_progress_bar(sec)
-        self.btn_play.config(text="⏸ 暂停"); self.player.play()
+        self._seek_to(self._time_at_offset(char_offset))
+        self.btn_play.config(text="⏸ 暂停"); self._play()
+        self.refresh.start()
+
+    def _build_marker_index(self):
+        """打开会话时构建一次：时间→段落、偏移→时间都走二分查找。"""
+        self._mk_times = [float(sec) for sec, _off in self.review_markers]
+        self._mk_offs = [int(off) for _sec, off in self.review_markers]
+        # 偏移→时间：取“偏移 <= x 的标记中时间最晚者”，与原先倒序扫描语义一致
+        order = sorted(range(len(self._mk_offs)), key=lambda i: (self._mk_offs[i], i))
+        self._mk_by_off = [self._mk_offs[i] for i in order]
+        self._mk_by_off_idx, best = [], -1
+        for i in order:
+            best = max(best, i); self._mk_by_off_idx.append(best)
+        self._mk_index = [self._offset_to_index(o) for o in self._mk_offs]
+        self._hilite_idx = None
+
+    def _build_line_index(self, text):
+        """插入正文时构建一次行首偏移表，之后偏移↔索引换算不再访问 Tk。"""
+        starts = [0]
+        pos = text.find("\n")
+        while pos != -1:
+            starts.append(pos + 1)
+            pos = text.find("\n", pos + 1)
+        self._line_starts = starts
+
+    def _segment_at_time(self, t):
+        i = bisect.bisect_right(self._mk_times, t) - 1
+        return max(0, i)
+
+    def _time_at_offset(self, off):
+        k = bisect.bisect_right(self._mk_by_off, off) - 1
+        if k < 0: return 0.0
+        return self._mk_times[self._mk_by_off_idx[k]]
 
     def _index_to_offset(self, line, col):
-        total = 0
-        for ln in range(1, line):
-            total += len(self.review_text.get(f"{ln}.0", f"{ln}.end")) + 1
-        total += col; return total
+        starts = self._line_starts
+        line = max(1, min(line, len(starts)))
+        return starts[line-1] + col
 
     def _offset_to_index(self, off):
-        text = self.review_text.get("1.0", tk.END)
-        off = max(0, min(off, len(text)))
-        run = 0; line = 1
-        for ch in text.splitlines(True):
-            ln = len(ch)
-            if run + ln > off:
-                col = off - run; return f"{line}.{col}"
-            run += ln; line += 1
-        return f"{line}.0"
+        off = max(0, min(off, len(self.review_clean_text)))
+        line = bisect.bisect_right(self._line_starts, off)
+        return f"{line}.{off - self._line_starts[line-1]}"
 
     def _highlight_at_time(self, t):
+        if not self._mk_times:
+            if self._hilite_idx is not None:
+                self.review_text.tag_remove("hilite", "1.0", tk.END); self._hilite_idx = None
+            return
+        current_idx = self._segment_at_time(t)
+        if current_idx == self._hilite_idx: return   # 段落未变化时不动 Tk 标签
+        self._hilite_idx = current_idx
         self.review_text.tag_remove("hilite", "1.0", tk.END)
-        if not self.review_markers: return
-        current_idx = 0
-        for i, (sec, _off) in enumerate(self.review_markers):
-            if t >= sec: current_idx = i
-            else: break
-        start_off = self.review_markers[current_idx][1]
-        end_off = len(self.review_clean_text)
-        if current_idx + 1 < len(self.review_markers):
-            end_off = self.review_markers[current_idx+1][1]
-        start = self._offset_to_index(start_off)
-        end = self._offset_to_index(end_off)
+        start = self._mk_index[current_idx]
+        if current_idx + 1 < len(self._mk_index):
+            end = self._mk_index[current_idx+1]
+        else:
+            end = self._offset_to_index(len(self.review_clean_text))
         self.review_text.tag_add("hilite", start, end)
         self.review_text.see(start)
 
+    def _load_peaks(self, d, audio, bundle=None):
+        """读取波形峰值；旧会话没有 peaks.bin 时后台生成，完成后再重绘。文件包只读取、不生成。"""
+        self._peaks = None; self._peaks_session = d
+        if bundle:
+            self._peaks = bundle_peaks(bundle); return
+        path = os.path.join(d, PEAKS_FILENAME)
+        try:
+            if os.path.exists(path):
+                finalize_peaks(path)   # 崩溃遗留的半成品先补全
+                self._peaks = PeakPyramid(path); return
+        except Exception:
+            self.logger.warning("peaks unreadable, rebuilding: %s", path)
+        state = {"done": False, "peaks": None}
+        def worker():
+            try:
+                build_peaks(audio, path); state["peaks"] = PeakPyramid(path)
+            except Exception as e:
+                self.logger.warning("build peaks failed: %s (%s)", d, e)
+            finally:
+                state["done"] = True
+        def poll():
+            if self._peaks_session != d: return   # 已切换到别的会话
+            if not state["done"]:
+                self.root.after(300, poll); return
+            self._peaks = state["peaks"]
+            if self._peaks is not None: self._invalidate_layers()
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(300, poll)
+
+    def _redraw_progress_layers(self):
+        """重建背景/进度/波形/标记图层：仅在打开会话、画布尺寸变化或峰值就绪时调用。"""
+        self.progress.delete("all"); self._progress_fill = None
+        if not self.player: return
+        w = self.progress.winfo_width(); h = self.progress.winfo_height()
+        self.progress.create_rectangle(2, h//3, w-2, h//3*2, fill="#E5E7EB", width=0)
+        self._progress_fill = self.progress.create_rectangle(2, h//3, 2, h//3*2, fill="#3B82F6", width=0)
+        # 波形：按画布宽度从峰值金字塔取一层，每个像素列一条竖线
+        if self._peaks is not None and w > 4:
+            mins, maxs = self._peaks.columns(w - 4)
+            mid, amp = h / 2.0, h / 2.0 - 3
+            for i in range(len(mins)):
+                y0 = int(mid - maxs[i] * amp); y1 = int(mid - mins[i] * amp) + 1
+                self.progress.create_line(2 + i, y0, 2 + i, y1, fill="#64748B")
+        # 按像素列归并：标记再密，图元数量也不超过画布宽度
+        span = max(1e-6, self.review_total)
+        cols = {2 + int((w-4) * (sec / span)) for sec in self._mk_times}
+        for x in sorted(cols):
+            self.progress.create_line(x, 4, x, h-4, fill="#9CA3AF")
+        for x in sorted({2 + int((w-4) * (sec / span)) for sec in self._speech_marks} - cols):
+            self.progress.create_line(x, 4, x, h-4, fill="#10B981")
+        self.update_progress_bar(self._progress_t)
+
     def update_progress_bar(self, t=None):
         if not self.player:
-            self.progress.delete("all"); return
+            self.progress.delete("all"); self._progress_fill = None; return
         if t is None: t = self.player.current_time()
+        self._progress_t = t
+        if self._progress_fill is None: return
         w = self.progress.winfo_width(); h = self.progress.winfo_height()
-        self.progress.delete("all")
-        self.progress.create_rectangle(2, h//3, w-2, h//3*2, fill="#E5E7EB", width=0)
         ratio = 0 if self.review_total <= 0 else t / self.review_total
-        self.progress.create_rectangle(2, h//3, 2 + int((w-4)*ratio), h//3*2, fill="#3B82F6", width=0)
-        for sec, _off in self.review_markers:
-            x = 2 + int((w-4) * (sec / max(1e-6, self.review_total)))
-            self.progress.create_line(x, 4, x, h-4, fill="#9CA3AF")
-
-    def _schedule_progress_updater(self, enable):
-        if enable:
-            def _tick():
-                if self.player:
-                    t = self.player.current_time()
-                    self.update_progress_bar(t)
-                    self.time_var.set(f"{self._fmt(t)} / {self._fmt(self.review_total)}")
-                    self._highlight_at_time(t)
-                self._progress_updater = self.root.after(80, _tick)
-            if self._progress_updater is None: _tick()
-        else:
-            if self._progress_updater:
-                self.root.after_cancel(self._progress_updater); self._progress_updater = None
+        self.progress.coords(self._progress_fill, 2, h//3, 2 + int((w-4)*ratio), h//3*2)
+
+    # —— 导出片段 —— #
+    def export_clips_dialog(self):
+        """
+        按标记把录音切段，所选各段分别导出为 WAV（后台线程池写出，带进度条）。
+        打开前在笔记中选中一段文字时，预先选中它覆盖的各段；“按全部标记切分”一次导出所有段。
+        """
+        if not self.player or not self.review_session: return
+        session, text = self.review_session, self.review_clean_text
+        segs = marker_segments(self.review_markers, self.review_total)
+        if not segs:
+            messagebox.showinfo("导出片段", "没有可导出的片段。"); return
+        pre = []
+        try:
+            a = self._index_to_offset(*map(int, self.review_text.index("sel.first").split(".")))
+            b = self._index_to_offset(*map(int, self.review_text.index("sel.last").split(".")))
+            ta, tb = self._time_at_offset(a), self._time_at_offset(b)
+            pre = [i for i, (start, _end, _off) in enumerate(segs) if ta <= start <= tb]
+        except tk.TclError:
+            pass    # 没有选中文字
+
+        win = tk.Toplevel(self.root); win.title("导出片段"); win.transient(self.root)
+        tk.Label(win, text="选择要导出的片段（可多选；每段单独保存为一个 WAV）：", anchor="w")\
+            .pack(fill=tk.X, padx=12, pady=(10, 4))
+        box = tk.Frame(win); box.pack(fill=tk.BOTH, expand=True, padx=12)
+        lb = tk.Listbox(box, selectmode=tk.EXTENDED, width=72, height=14, exportselection=False)
+        sb = tk.Scrollbar(box, orient="vertical", command=lb.yview); lb.config(yscrollcommand=sb.set)
+        lb.pack(side=tk.LEFT, fill=tk.BOTH, expand=True); sb.pack(side=tk.RIGHT, fill=tk.Y)
+        lb.insert(tk.END, *(f"[{self._fmt(start)} – {self._fmt(end)}]  {segment_title(text, off)}"
+                            for start, end, off in segs))
+        for i in pre: lb.selection_set(i)
+        if pre: lb.see(pre[0])
+        bar = ttk.Progressbar(win, mode="determinate", maximum=1000)
+        bar.pack(fill=tk.X, padx=12, pady=(8, 0))
+        status = tk.StringVar(value=f"共 {len(segs)} 段，已选 {len(pre)} 段。")
+        tk.Label(win, textvariable=status, anchor="w").pack(fill=tk.X, padx=12)
+        lb.bind("<<ListboxSelect>>", lambda e: status.set(f"共 {len(segs)} 段，已选 {len(lb.curselection())} 段。"))
+        btns = tk.Frame(win); btns.pack(fill=tk.X, padx=12, pady=10)
+        stop_event = threading.Event()
+
+        def run(chosen):
+            # chosen：所选各段在 segs 中的序号，片段文件按它命名
+            if not chosen:
+                messagebox.showinfo("导出片段", "请先选择片段。", parent=win); return
+            dst = filedialog.askdirectory(title="选择片段保存位置", parent=win)
+            if not dst: return
+            name = os.path.basename(os.path.normpath(session))
+            if name.endswith(BUNDLE_EXT): name = name[:-len(BUNDLE_EXT)]
+            out_dir = os.path.join(dst, name + "_clips")
+            audio = session_audio_path(session)
+            state = {"done": 0, "total": 0, "result": None, "error": None, "finished": False}
+            def progress(done, total):
+                state["done"], state["total"] = done, total
+            def worker():
+                try: state["result"] = export_clips(audio, [segs[i] for i in chosen], out_dir, text=text,
+                                                    indices=chosen, progress=progress, stop_event=stop_event)
+                except Exception as e: state["error"] = e
+                finally: state["finished"] = True
+            def poll():
+                if not win.winfo_exists(): return
+                if state["finished"]:
+                    for w in btns.winfo_children(): w.config(state=tk.NORMAL)
+                    if state["error"] is not None:
+                        self.logger.warning("export clips failed: %s", state["error"])
+                        status.set(f"导出失败：{state['error']}")
+                        messagebox.showerror("导出片段失败", str(state["error"]), parent=win); return
+                    bar["value"] = 1000
+                    status.set(f"已导出 {len(state['result'])} 个片段到：{out_dir}")
+                    return
+                if state["total"]:
+                    bar["value"] = state["done"] * 1000 // state["total"]
+                status.set(f"正在导出 {len(chosen)} 个片段… {int(bar['value']) // 10}%")
+                self.root.after(200, poll)
+            for w in btns.winfo_children(): w.config(state=tk.DISABLED)
+            bar["value"] = 0
+            threading.Thread(target=worker, daemon=True).start()
+            poll()
+
+        def close():
+            stop_event.set(); win.destroy()   # 关闭窗口即取消未完成的导出
+
+        tk.Button(btns, text="全选", width=8, command=lambda: (lb.selection_set(0, tk.END),
+                  status.set(f"共 {len(segs)} 段，已选 {len(segs)} 段。"))).pack(side=tk.LEFT)
+        tk.Button(btns, text="按全部标记切分…", command=lambda: run(list(range(len(segs))))).pack(side=tk.RIGHT, padx=4)
+        tk.Button(btns, text="导出所选…", command=lambda: run(list(lb.curselection())))\
+            .pack(side=tk.RIGHT, padx=4)
+        win.protocol("WM_DELETE_WINDOW", close)
+
+    # —— 刷新调度 —— #
+    def _seek_to(self, t):
+        """跳转播放位置；界面在空闲时统一重绘一次（连续点击/跳转只画最后一次）。"""
+        self.player.seek(t); self._progress_t = t
+        self.refresh.request()
+
+    def _invalidate_layers(self):
+        """画布尺寸变化、峰值或语音段就绪：下次重绘时重建图层（连续多次只重建一次）。"""
+        self._layers_dirty = True
+        self.refresh.request()
+
+    def _playback_active(self):
+        return bool(self.player and self.player.is_playing())
+
+    def _paint_review(self):
+        """一帧回放界面：进度条、时间文字、高亮段落；播放到末尾时把按钮复原。"""
+        if not self.player: return
+        if self._layers_dirty:
+            self._layers_dirty = False; self._redraw_progress_layers()
+        t = self.player.current_time()
+        self.update_progress_bar(t)
+        text = f"{self._fmt(t)} / {self._fmt(self.review_total)}"
+        if text != self._time_text:
+            self._time_text = text; self.time_var.set(text)
+        self._highlight_at_time(t)
+        if not self.player.is_playing() and self.btn_play["text"].startswith("⏸"):
+            self.btn_play.config(text="▶ 播放")
 
     # ================= 关于 =================
     def show_about(self):
@@ -524,6 +1233,9 @@ class MainWindow:
                 else:
                     return
         finally:
+            self._cancel_telemetry()
+            self.refresh.cancel()
+            self.devices.stop()
             if self.player: self.player.close()
             try:
                 if self.file_handler:
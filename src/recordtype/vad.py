@@ -0,0 +1,172 @@
+# src/recordtype/vad.py
+"""
+语音活动检测（不依赖 Tk / 声卡）：
+- 每 30 ms 一帧，整块 NumPy 计算帧能量（dBFS）与谱平坦度
+- 能量高于自适应噪声底且频谱不“平”（平坦度低，接近白噪声时高）判为语音；特别响的帧直接算语音
+- 相邻语音间隔很短时合并，过短的片段丢弃，两端各留一点余量
+录音写线程边录边 feed()，旧会话用 analyze_session() 批量补算；结果存为会话目录下的 speech.json。
+"""
+import json
+import os
+
+import numpy as np
+
+from .storage import save_json, session_audio_path
+
+SPEECH_FILENAME = "speech.json"
+FRAME_MS = 30.0
+ABS_MIN_DB = -55.0          # 低于此电平一律视为静音
+ONSET_DB = 10.0             # 高于噪声底多少 dB 才可能是语音
+LOUD_DB = 25.0              # 高于噪声底这么多时不再看平坦度
+FLATNESS_MAX = 0.45         # 谱平坦度上限（白噪声约 0.56，浊音远低于此）
+FLOOR_RISE_DB_PER_S = 0.5   # 噪声底上升速度（下降立即跟随）
+MIN_GAP_S = 0.35            # 间隔短于此的相邻片段合并
+MIN_SPEECH_S = 0.2          # 短于此的片段丢弃
+PAD_S = 0.1                 # 片段两端余量
+
+
+class VoiceDetector:
+    """增量检测器：feed() 喂入 int16 [n, channels]，segments()/finish() 返回 [(start_s, end_s), ...]。"""
+
+    def __init__(self, samplerate: int, frame_ms: float = FRAME_MS):
+        self.sr = samplerate
+        self.frame_ms = frame_ms
+        self.flen = max(32, int(samplerate * frame_ms / 1000.0))
+        self._win = np.hanning(self.flen).astype(np.float32)
+        self._carry = np.zeros(0, np.float32)
+        self._frames_done = 0
+        self._floor = None
+        self._open = None           # 尚未结束的语音段起点（帧序号）
+        self._runs = []             # 已合并的 [start, end)（帧序号）
+        self._gap = int(MIN_GAP_S * 1000 / frame_ms)
+
+    def _classify(self, x: np.ndarray) -> np.ndarray:
+        fr = x.reshape(-1, self.flen)
+        rms = np.sqrt(np.mean(fr * fr, axis=1)) / 32768.0
+        db = 20.0 * np.log10(rms + 1e-9)
+        p = np.abs(np.fft.rfft(fr * self._win, axis=1)) ** 2 + 1e-12
+        flat = np.exp(np.mean(np.log(p), axis=1)) / np.mean(p, axis=1)
+        p10 = float(np.percentile(db, 10))
+        if self._floor is None:
+            self._floor = p10
+        else:
+            self._floor = min(p10, self._floor + FLOOR_RISE_DB_PER_S * len(fr) * self.frame_ms / 1000.0)
+        floor = max(self._floor, -90.0)
+        loud = db > floor + ONSET_DB
+        return (db > ABS_MIN_DB) & loud & ((flat < FLATNESS_MAX) | (db > floor + LOUD_DB))
+
+    def _add_run(self, s, e):
+        if self._runs and s - self._runs[-1][1] <= self._gap:
+            self._runs[-1][1] = e
+        else:
+            self._runs.append([s, e])
+
+    def feed(self, frames: np.ndarray):
+        x = np.asarray(frames, dtype=np.float32)
+        if x.ndim > 1:
+            x = x.mean(axis=1)
+        if len(self._carry):
+            x = np.concatenate([self._carry, x])
+        full = len(x) // self.flen * self.flen
+        self._carry = x[full:].copy()
+        if not full:
+            return
+        flags = self._classify(x[:full]).astype(np.int8)
+        base = self._frames_done
+        self._frames_done += len(flags)
+        prev = 1 if self._open is not None else 0
+        d = np.diff(np.concatenate(([prev], flags)))
+        ups = (np.flatnonzero(d == 1) + base).tolist()
+        downs = (np.flatnonzero(d == -1) + base).tolist()
+        if self._open is not None and downs:
+            self._add_run(self._open, downs.pop(0)); self._open = None
+        for s, e in zip(ups, downs):
+            self._add_run(s, e)
+        if len(ups) > len(downs):
+            self._open = ups[-1]
+
+    def segments(self):
+        """到目前为止已结束的语音段（秒），已过滤过短片段并加余量。"""
+        fs = self.frame_ms / 1000.0
+        total = (self._frames_done * self.flen + len(self._carry)) / float(self.sr)
+        out = []
+        for s, e in self._runs:
+            if (e - s) * fs < MIN_SPEECH_S:
+                continue
+            a, b = max(0.0, s * fs - PAD_S), min(total, e * fs + PAD_S)
+            if out and a <= out[-1][1]:
+                out[-1] = (out[-1][0], b)
+            else:
+                out.append((a, b))
+        return out
+
+    def finish(self):
+        if self._open is not None:
+            self._add_run(self._open, self._frames_done); self._open = None
+        return self.segments()
+
+
+def save_speech(path: str, segments, samplerate: int):
+    save_json(path, {"version": 1, "samplerate": samplerate, "frame_ms": FRAME_MS,
+                     "segments": [[round(a, 3), round(b, 3)] for a, b in segments]})
+
+
+def load_speech(session_dir: str):
+    """读取 speech.json -> [(start_s, end_s), ...]；没有或损坏返回 None。"""
+    path = os.path.join(session_dir, SPEECH_FILENAME)
+    try:
+        data = json.load(open(path, "r", encoding="utf-8"))
+        return [(float(a), float(b)) for a, b in data["segments"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def analyze_audio(audio_path: str, chunk_seconds: float = 30.0, stop_event=None):
+    """批量检测：分块读取音频（WAV/分段目录/.rtlc 均可），内存占用与时长无关。"""
+    from .wavio import open_frames
+    frames, sr, _ch = open_frames(audio_path)
+    det = VoiceDetector(sr)
+    step = int(sr * chunk_seconds)
+    try:
+        for a in range(0, len(frames), step):
+            if stop_event is not None and stop_event.is_set():
+                raise RuntimeError("cancelled")
+            det.feed(np.asarray(frames[a:a + step]))
+    finally:
+        if hasattr(frames, "close"): frames.close()
+    return det.finish(), sr
+
+
+def analyze_session(session_dir: str, force: bool = False):
+    """为旧会话补算 speech.json；已存在且不强制时直接读取。返回语音段列表。"""
+    if not force:
+        segs = load_speech(session_dir)
+        if segs is not None:
+            return segs
+    audio = session_audio_path(session_dir)
+    if not audio:
+        raise FileNotFoundError("未找到音频")
+    segs, sr = analyze_audio(audio)
+    save_speech(os.path.join(session_dir, SPEECH_FILENAME), segs, sr)
+    return segs
+
+
+def analyze_sessions(root, progress=None, stop_event=None, force=False):
+    """
+    批量检测 root 下所有会话（供后台线程调用）。
+    progress(done, total, session_dir, segments_or_error) 每完成一个会话回调一次。
+    """
+    dirs = [os.path.join(root, n) for n in sorted(os.listdir(root))
+            if n.startswith("session_") and os.path.isdir(os.path.join(root, n))]
+    results = {}
+    for i, d in enumerate(dirs, 1):
+        if stop_event is not None and stop_event.is_set():
+            break
+        try:
+            res = analyze_session(d, force=force)
+        except Exception as e:
+            res = e
+        results[d] = res
+        if progress:
+            progress(i, len(dirs), d, res)
+    return results
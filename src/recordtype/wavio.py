@@ -0,0 +1,288 @@
+# src/recordtype/wavio.py
+"""
+WAV 读写工具（不依赖 sounddevice / Tk）：
+- 头部生成、长度回填、只读头部解析
+- 单文件 / 分段两种落盘方式（录音写线程使用）
+- 分段录音按一条连续时间轴读取（回放使用）
+
+分段目录结构：
+    audio_segments/
+        index.jsonl      第一行格式信息，之后每封存一个分段追加一行 {"file", "frames"}
+        seg_00000.wav
+        seg_00001.wav ...
+"""
+import os
+import json
+import struct
+from typing import BinaryIO
+
+import numpy as np
+
+SEGMENTS_DIRNAME = "audio_segments"
+SEGMENT_INDEX = "index.jsonl"
+TRACKS_DIRNAME = "audio_tracks"     # 多设备录音的各轨（见 multitrack.py）
+TRACKS_INDEX = "tracks.json"
+WAV_HEADER_BYTES = 44
+
+
+def wav_header(channels: int, samplerate: int, sample_width: int, data_bytes: int) -> bytes:
+    """标准 44 字节 PCM WAV 头。"""
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, samplerate, samplerate * block_align, block_align, sample_width * 8,
+        b"data", data_bytes,
+    )
+
+
+def patch_wav_header(f: BinaryIO, data_bytes: int):
+    """回填 RIFF / data 长度，文件指针保持不变。"""
+    pos = f.tell()
+    f.seek(4); f.write(struct.pack("<I", 36 + data_bytes))
+    f.seek(40); f.write(struct.pack("<I", data_bytes))
+    f.seek(pos)
+
+
+def find_wav_data(path, base=0, size=None):
+    """
+    解析 RIFF 头，返回 (channels, samplerate, sample_width, data_offset, nframes)。
+    - 只读头部若干字节，不读取音频数据
+    - data 块长度异常（录音中途崩溃未回填）时按文件实际大小截断
+    - base/size 给出时解析嵌在大文件中的一段 WAV（会话文件包），data_offset 为文件内绝对偏移
+    """
+    end = base + (os.path.getsize(path) - base if size is None else size)
+    with open(path, "rb") as f:
+        f.seek(base)
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError("不是有效的 WAV 文件")
+        fmt = None
+        while True:
+            hdr = f.read(8)
+            if len(hdr) < 8:
+                raise ValueError("WAV 文件缺少 data 块")
+            cid, clen = struct.unpack("<4sI", hdr)
+            if cid == b"fmt ":
+                body = f.read(clen)
+                tag, ch, sr, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                fmt = (ch, sr, bits // 8)
+                if clen % 2: f.seek(1, 1)
+            elif cid == b"data":
+                if fmt is None:
+                    raise ValueError("WAV 文件缺少 fmt 块")
+                ch, sr, sw = fmt
+                off = f.tell()
+                avail = end - off
+                if clen == 0 or clen > avail:
+                    clen = avail
+                return ch, sr, sw, off, clen // (ch * sw)
+            else:
+                f.seek(clen + (clen % 2), 1)
+
+
+def repair_wav_header(path) -> bool:
+    """按文件实际大小修正 44 字节头中的长度字段；有改动返回 True。"""
+    ch, sr, sw, off, nframes = find_wav_data(path)
+    if off != WAV_HEADER_BYTES:
+        return False
+    data_bytes = nframes * ch * sw
+    with open(path, "r+b") as f:
+        f.seek(4); riff_len = struct.unpack("<I", f.read(4))[0]
+        f.seek(40); data_len = struct.unpack("<I", f.read(4))[0]
+        if riff_len == 36 + data_bytes and data_len == data_bytes:
+            return False
+        f.seek(0, 2)
+        patch_wav_header(f, data_bytes)
+    return True
+
+
+# ----------------------------------------------------------------------
+# 写入（录音写线程）
+# ----------------------------------------------------------------------
+class WavSink:
+    """单个 WAV 文件：写占位头，数据直接追加，长度按需回填。"""
+
+    def __init__(self, path, channels, samplerate, sample_width):
+        self.path = path
+        self.f = open(path, "wb")
+        self.f.write(wav_header(channels, samplerate, sample_width, 0))
+        self.data_bytes = 0
+
+    def write(self, buf):
+        self.f.write(buf)
+        self.data_bytes += len(buf)
+
+    def patch(self):
+        self.f.flush()
+        patch_wav_header(self.f, self.data_bytes)
+
+    def close(self):
+        try:
+            patch_wav_header(self.f, self.data_bytes)
+        finally:
+            self.f.close()
+
+
+class SegmentedWavSink:
+    """
+    分段写入：每 segment_seconds 切换到新的 seg_XXXXX.wav，
+    封存一段就往 index.jsonl 追加一行。单段远小于 4 GiB，崩溃最多影响最后一段。
+    """
+
+    def __init__(self, dirpath, channels, samplerate, sample_width, segment_seconds=1800.0):
+        os.makedirs(dirpath, exist_ok=True)
+        self.path = dirpath
+        self.channels = channels
+        self.sr = samplerate
+        self.sample_width = sample_width
+        self.frame_bytes = channels * sample_width
+        self.segment_bytes = max(1, int(samplerate * segment_seconds)) * self.frame_bytes
+        self.data_bytes = 0
+        self._seq = 0
+        self._cur = None
+        self._index = open(os.path.join(dirpath, SEGMENT_INDEX), "a", encoding="utf-8")
+        self._index.write(json.dumps({"version": 1, "sample_rate": samplerate,
+                                      "channels": channels, "sample_width": sample_width}) + "\n")
+        self._index.flush()
+
+    def _open_next(self):
+        name = f"seg_{self._seq:05d}.wav"
+        self._seq += 1
+        self._cur = WavSink(os.path.join(self.path, name), self.channels, self.sr, self.sample_width)
+
+    def _seal(self):
+        cur, self._cur = self._cur, None
+        cur.close()
+        frames = cur.data_bytes // self.frame_bytes
+        self._index.write(json.dumps({"file": os.path.basename(cur.path), "frames": frames}) + "\n")
+        self._index.flush()
+
+    def write(self, buf):
+        mv = memoryview(buf)
+        while mv.nbytes:
+            if self._cur is None:
+                self._open_next()
+            room = self.segment_bytes - self._cur.data_bytes
+            part = mv[:room]
+            self._cur.write(part)
+            self.data_bytes += part.nbytes
+            mv = mv[part.nbytes:]
+            if self._cur.data_bytes >= self.segment_bytes:
+                self._seal()
+
+    def patch(self):
+        if self._cur is not None:
+            self._cur.patch()
+
+    def close(self):
+        try:
+            if self._cur is not None:
+                self._seal()
+        finally:
+            self._index.close()
+
+
+# ----------------------------------------------------------------------
+# 读取（回放）
+# ----------------------------------------------------------------------
+def read_segment_index(dirpath):
+    """返回 (fmt, sealed)：fmt 为格式信息 dict，sealed 为 {文件名: 帧数}。"""
+    fmt, sealed = None, {}
+    p = os.path.join(dirpath, SEGMENT_INDEX)
+    if not os.path.exists(p):
+        return fmt, sealed
+    with open(p, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue   # 崩溃时可能留下半行
+            if "file" in rec:
+                sealed[rec["file"]] = int(rec["frames"])
+            elif fmt is None:
+                fmt = rec
+    return fmt, sealed
+
+
+def list_segments(dirpath):
+    return sorted(n for n in os.listdir(dirpath) if n.startswith("seg_") and n.endswith(".wav"))
+
+
+def _map_wav(path, base=0, size=None):
+    ch, sr, sw, off, nframes = find_wav_data(path, base, size)
+    if sw != 2:
+        raise ValueError("仅支持 16-bit PCM WAV")
+    if nframes > 0:
+        data = np.memmap(path, dtype="<i2", mode="r", offset=off, shape=(nframes, ch))
+    else:
+        data = np.zeros((0, ch), dtype=np.int16)
+    return data, sr, ch
+
+
+class SegmentedFrames:
+    """
+    把多个分段 WAV 的内存映射拼成一条时间轴：
+    支持 len() 与 [a:b] 切片；不跨段时返回映射视图，跨段时只拼接这一小段。
+    """
+
+    def __init__(self, dirpath):
+        self._add_parts(_map_wav(os.path.join(dirpath, name)) for name in list_segments(dirpath))
+
+    @classmethod
+    def from_maps(cls, maps):
+        """由已映射的 (data, sr, ch) 序列构造（会话文件包中的分段）。"""
+        self = cls.__new__(cls)
+        self._add_parts(maps)
+        return self
+
+    def _add_parts(self, maps):
+        self.parts = []
+        self.starts = []
+        self.sr, self.channels = 44100, 1
+        total = 0
+        for data, sr, ch in maps:
+            self.sr, self.channels = sr, ch
+            if len(data) == 0: continue
+            self.parts.append(data); self.starts.append(total)
+            total += len(data)
+        self._len = total
+        self.shape = (total, self.channels)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, sl):
+        if not isinstance(sl, slice):
+            raise TypeError("SegmentedFrames 只支持切片")
+        a, b, _ = sl.indices(self._len)
+        if b <= a:
+            return np.zeros((0, self.channels), dtype=np.int16)
+        i = int(np.searchsorted(self.starts, a, side="right")) - 1
+        out = []
+        while a < b and i < len(self.parts):
+            base = self.starts[i]; part = self.parts[i]
+            hi = min(b, base + len(part))
+            out.append(part[a - base:hi - base])
+            a = hi; i += 1
+        return out[0] if len(out) == 1 else np.concatenate(out)
+
+
+def open_frames(path):
+    """打开会话音频：单个 WAV、分段目录、多轨目录、RTLC 压缩文件或会话文件包；返回 (frames, samplerate, channels)。"""
+    if os.path.isdir(path):
+        from .multitrack import is_tracks_dir, open_tracks
+        if is_tracks_dir(path):
+            return open_tracks(path)
+        fr = SegmentedFrames(path)
+        return fr, fr.sr, fr.channels
+    if path.endswith(".rtlc"):
+        from .codec import RtlcFrames
+        fr = RtlcFrames(path)
+        return fr, fr.sr, fr.channels
+    from .bundle import is_bundle, open_bundle_frames
+    if is_bundle(path):
+        return open_bundle_frames(path)
+    return _map_wav(path)
@@ -0,0 +1,29 @@
+# tests/conftest.py
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from recordtype.bench import install_sounddevice_stub   # noqa: E402
+
+# 不碰真实音频设备：播放器 / 录音器导入 sounddevice 时拿到的是桩模块
+install_sounddevice_stub()
+
+
+def write_wav(path, frames, sr=8000):
+    from recordtype.wavio import WavSink
+    frames = np.asarray(frames, dtype="<i2")
+    if frames.ndim == 1:
+        frames = frames[:, None]
+    sink = WavSink(path, frames.shape[1], sr, 2)
+    sink.write(np.ascontiguousarray(frames).tobytes())
+    sink.close()
+    return path
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(1234)
@@ -0,0 +1,27 @@
+import random
+
+from recordtype.autosave import _single_edit
+
+
+def _apply(old, edit):
+    o, d, ins = edit
+    return old[:o] + ins + old[o + d:]
+
+
+def test_single_edit_is_minimal_and_reproduces_new():
+    r = random.Random(7)
+    for _ in range(2000):
+        a = "".join(r.choice("ab中\n") for _ in range(r.randint(0, 15)))
+        o = r.randint(0, len(a)); d = r.randint(0, len(a) - o)
+        b = a[:o] + "".join(r.choice("ab中") for _ in range(r.randint(0, 3))) + a[o + d:]
+        i, dl, ins = e = _single_edit(a, b)
+        assert _apply(a, e) == b
+        assert a[:i] == b[:i] and (i == min(len(a), len(b)) or a[i] != b[i])     # 前缀取到最长
+        assert len(ins) == len(b) - len(a) + dl
+
+
+def test_single_edit_large_note():
+    old = "笔记内容 abc\n" * 20000
+    new = old[:100000] + "插入" + old[100003:]
+    assert _single_edit(old, new) == (100000, 3, "插入")
+    assert _single_edit(old, old) == (len(old), 0, "")
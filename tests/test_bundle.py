@@ -0,0 +1,91 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from recordtype.bundle import Bundle, HEADER, NAME, export_bundle, import_bundle, is_bundle, EXTENSION
+
+from .conftest import write_wav
+
+
+@pytest.fixture
+def session(tmp_path):
+    d = tmp_path / "src" / "session_ab"
+    d.mkdir(parents=True)
+    (d / "notes.md").write_text("# 笔记\n[00:00:01] 你好\n", encoding="utf-8")
+    (d / "meta.json").write_text('{"duration_seconds": 1.0}', encoding="utf-8")
+    (d / "sub").mkdir()
+    (d / "sub" / "x.bin").write_bytes(bytes(range(256)) * 50)
+    (d / "skip.tmp").write_bytes(b"partial")
+    write_wav(str(d / "audio.wav"), np.arange(8000) % 1000)
+    return str(d)
+
+
+def _tree(root):
+    out = {}
+    for dirpath, _dirs, files in os.walk(root):
+        for fn in files:
+            full = os.path.join(dirpath, fn)
+            out[os.path.relpath(full, root)] = open(full, "rb").read()
+    return out
+
+
+def test_roundtrip(tmp_path, session):
+    path = export_bundle(session, str(tmp_path))
+    assert path.endswith("session_ab" + EXTENSION) and is_bundle(path)
+    b = Bundle(path)
+    assert b.name == "session_ab"
+    assert "skip.tmp" not in b.sections
+    assert b.read_text("notes.md").startswith("# 笔记")
+    dest = tmp_path / "dest"; dest.mkdir()
+    out = import_bundle(path, str(dest))
+    assert out == os.path.join(str(dest), "session_ab")
+    expected = _tree(session); del expected["skip.tmp"]
+    assert _tree(out) == expected
+
+
+def test_export_refuses_existing(tmp_path, session):
+    export_bundle(session, str(tmp_path))
+    with pytest.raises(FileExistsError):
+        export_bundle(session, str(tmp_path))
+
+
+def test_import_detects_corruption(tmp_path, session):
+    path = export_bundle(session, str(tmp_path))
+    off, size, _crc = Bundle(path).sections["sub/x.bin"]
+    with open(path, "r+b") as f:
+        f.seek(off + size // 2); f.write(b"\xff\x00")
+    dest = tmp_path / "dest"; dest.mkdir()
+    with pytest.raises(ValueError):
+        import_bundle(path, str(dest))
+    assert os.listdir(dest) == []       # 临时目录已清掉
+
+
+def _rename(path, new: bytes):
+    """把文件包目录表中的会话名换成等长的 new。"""
+    with open(path, "r+b") as f:
+        toc_off = HEADER.unpack(f.read(HEADER.size))[4]
+        f.seek(toc_off)
+        (n,) = NAME.unpack(f.read(NAME.size))
+        assert n == len(new)
+        f.write(new)
+
+
+@pytest.mark.parametrize("name", [b"..////////", b"../escaped", b"C:escaped_", b"a\\b_______", b"/abs/olute"])
+def test_import_rejects_unsafe_names(tmp_path, session, name):
+    os.rename(session, os.path.join(os.path.dirname(session), "s" * len(name)))
+    path = export_bundle(os.path.join(os.path.dirname(session), "s" * len(name)), str(tmp_path))
+    _rename(path, name)
+    dest = tmp_path / "root" / "dest"; dest.mkdir(parents=True)
+    with pytest.raises(ValueError):
+        import_bundle(path, str(dest))
+    assert os.listdir(tmp_path / "root") == ["dest"] and os.listdir(dest) == []
+
+
+def test_not_a_bundle(tmp_path):
+    p = tmp_path / ("x" + EXTENSION)
+    p.write_bytes(struct.pack("<4s", b"NOPE") + bytes(60))
+    assert not is_bundle(str(p))
+    with pytest.raises(ValueError):
+        Bundle(str(p))
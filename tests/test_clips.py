@@ -0,0 +1,91 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from recordtype.clips import marker_segments, export_clips, segment_title, split_session, clip_name, CLIPS_INDEX
+from recordtype.wavio import open_frames
+
+from .conftest import write_wav
+
+SR = 8000
+
+
+def test_marker_segments_edges():
+    assert marker_segments([(0.0, 0), (2.0, 5), (2.0, 9), (5.0, 12)], 4.0) == \
+        [(0.0, 2.0, 0), (2.0, 4.0, 9)]                  # 零长度段与超出末尾的标记略去
+    assert marker_segments([(-1.0, 0)], 3.0) == [(0.0, 3.0, 0)]
+    assert marker_segments([], 3.0) == []
+
+
+def test_segment_title():
+    text = "first\n\n   second line  \nthird"
+    assert segment_title(text, 6) == "second line"
+    assert segment_title(text, -5) == "first"
+    assert segment_title("x" * 100, 0) == "x" * 40
+
+
+@pytest.fixture
+def audio(tmp_path):
+    return write_wav(str(tmp_path / "audio.wav"), np.arange(SR * 10) % 20000, SR)
+
+
+def _read(path):
+    frames, sr, _ch = open_frames(path)
+    try:
+        return sr, np.array(frames[0:len(frames)])
+    finally:
+        if hasattr(frames, "close"): frames.close()
+
+
+def test_export_slices_exact_frames(tmp_path, audio):
+    segs = marker_segments([(0.0, 0), (2.5, 0), (7.0, 0)], 10.0)
+    paths = export_clips(audio, segs, str(tmp_path / "out"), workers=3)
+    src = np.arange(SR * 10) % 20000
+    for p, (a, b, _off) in zip(paths, segs):
+        sr, got = _read(p)
+        assert sr == SR and np.array_equal(got[:, 0], src[int(a * SR):int(b * SR)])
+
+
+def test_subset_uses_global_index_and_merges_index(tmp_path, audio):
+    text = "intro\nmiddle\nend"
+    segs = marker_segments([(0.0, 0), (3.0, 6), (7.0, 13)], 10.0)
+    out = str(tmp_path / "out")
+    p = export_clips(audio, [segs[2]], out, text, indices=[2])
+    assert [os.path.basename(x) for x in p] == [clip_name(2, 7.0)]
+    export_clips(audio, [segs[0]], out, text, indices=[0])
+    export_clips(audio, [segs[0]], out, text, indices=[0])          # 重复导出覆盖同名条目
+    index = json.load(open(os.path.join(out, CLIPS_INDEX), encoding="utf-8"))
+    assert [(c["file"], c["title"]) for c in index["clips"]] == \
+        [(clip_name(0, 0.0), "intro"), (clip_name(2, 7.0), "end")]
+    assert sorted(os.listdir(out)) == sorted([clip_name(0, 0.0), clip_name(2, 7.0), CLIPS_INDEX])
+
+
+def test_cancel_leaves_no_partial_files(tmp_path, audio):
+    import threading
+    ev = threading.Event(); ev.set()
+    out = str(tmp_path / "out")
+    with pytest.raises(RuntimeError):
+        export_clips(audio, [(0.0, 10.0, 0)], out, stop_event=ev)
+    assert os.listdir(out) == []
+
+
+def test_split_session_uses_timestamps(tmp_path):
+    d = tmp_path / "session_x"; d.mkdir()
+    write_wav(str(d / "audio.wav"), np.zeros(SR * 6), SR)
+    (d / "notes.md").write_text("[00:00:00] a\n[00:00:04] b\n", encoding="utf-8")
+    paths = split_session(str(d), str(tmp_path / "out"))
+    assert [os.path.basename(p) for p in paths] == [clip_name(0, 0.0), clip_name(1, 4.0)]
+    assert len(_read(paths[1])[1]) == 2 * SR
+
+
+def test_parallel_export_from_rtlc(tmp_path):
+    from recordtype.codec import RtlcSink, EXTENSION
+    src = (np.arange(SR * 20) % 20000).astype("<i2")
+    path = str(tmp_path / ("audio" + EXTENSION))
+    sink = RtlcSink(path, 1, SR, 2, block_frames=512); sink.write(src.tobytes()); sink.close()
+    segs = marker_segments([(float(t), 0) for t in range(0, 20, 2)], 20.0)
+    paths = export_clips(path, segs, str(tmp_path / "out"), workers=8)
+    for p, (a, b, _off) in zip(paths, segs):
+        assert np.array_equal(_read(p)[1][:, 0], src[int(a * SR):int(b * SR)])
@@ -0,0 +1,91 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from recordtype.codec import RtlcSink, RtlcFrames, encode_block, decode_block, compress_sessions, EXTENSION
+from recordtype.wavio import open_frames
+
+from .conftest import write_wav
+
+
+def _roundtrip(tmp_path, frames, block_frames=256):
+    path = str(tmp_path / ("a" + EXTENSION))
+    sink = RtlcSink(path, frames.shape[1], 8000, 2, block_frames)
+    for a in range(0, len(frames), 1000):      # 写入块与编码块不对齐
+        sink.write(np.ascontiguousarray(frames[a:a + 1000]).tobytes())
+    sink.close()
+    out = RtlcFrames(path)
+    try:
+        return len(out), out[0:len(out)]
+    finally:
+        out.close()
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+def test_roundtrip_random(tmp_path, rng, channels):
+    x = rng.integers(-32768, 32768, size=(5003, channels)).astype(np.int16)
+    n, y = _roundtrip(tmp_path, x)
+    assert n == len(x)
+    assert np.array_equal(y, x)
+
+
+def test_roundtrip_extremes_and_silence(tmp_path):
+    x = np.zeros((3000, 1), np.int16)
+    x[100::2] = 32767; x[101::2] = -32768      # 残差最大，走逃逸编码
+    n, y = _roundtrip(tmp_path, x)
+    assert n == len(x) and np.array_equal(y, x)
+
+
+def test_empty_file(tmp_path):
+    n, y = _roundtrip(tmp_path, np.zeros((0, 1), np.int16))
+    assert n == 0 and len(y) == 0
+
+
+def test_block_roundtrip_and_corrupt_header(rng):
+    x = rng.integers(-200, 200, size=(777, 2)).astype(np.int16)
+    blk = encode_block(x)
+    assert np.array_equal(decode_block(blk, 2), x)
+    with pytest.raises(ValueError):
+        decode_block(b"XXXX" + blk[4:], 2)
+
+
+def test_random_access_slices(tmp_path, rng):
+    x = rng.integers(-1000, 1000, size=(4000, 1)).astype(np.int16)
+    path = str(tmp_path / ("a" + EXTENSION))
+    sink = RtlcSink(path, 1, 8000, 2, 256); sink.write(x.tobytes()); sink.close()
+    out = RtlcFrames(path)
+    try:
+        for a, b in [(0, 1), (255, 257), (1000, 3999), (3990, 4000)]:
+            assert np.array_equal(out[a:b], x[a:b])
+    finally:
+        out.close()
+
+
+def _session(root, name, meta):
+    d = root / name
+    d.mkdir()
+    write_wav(str(d / "audio.wav"), np.arange(2000) % 300)
+    if meta is not None:
+        (d / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    return str(d)
+
+
+def test_compress_sessions_skips_unfinished_and_open(tmp_path):
+    done = _session(tmp_path, "session_1", {"duration_seconds": 0.25})
+    recording = _session(tmp_path, "session_2", {"start_time": "x"})
+    no_meta = _session(tmp_path, "session_3", None)
+    opened = _session(tmp_path, "session_4", {"duration_seconds": 0.25})
+    results = compress_sessions(str(tmp_path), skip=[opened, None])
+    assert list(results) == [done]
+    assert os.path.exists(os.path.join(done, "audio" + EXTENSION))
+    assert not os.path.exists(os.path.join(done, "audio.wav"))
+    for d in (recording, no_meta, opened):
+        assert os.path.exists(os.path.join(d, "audio.wav"))
+    frames, sr, ch = open_frames(os.path.join(done, "audio" + EXTENSION))
+    try:
+        assert (sr, ch) == (8000, 1)
+        assert np.array_equal(frames[0:len(frames)][:, 0], np.arange(2000) % 300)
+    finally:
+        frames.close()
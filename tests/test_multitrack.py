@@ -0,0 +1,110 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from recordtype.multitrack import AlignedSink, MAX_CORRECTION, DRIFT_MIN_SECONDS, merge_tracks, track_name
+from recordtype.wavio import open_frames
+
+from .conftest import write_wav
+
+
+class ListSink:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, buf):
+        self.data += bytes(buf)
+
+    def frames(self):
+        return np.frombuffer(bytes(self.data), "<i2")
+
+
+def _track(sr=1000, first=None, clock=None, in_sr=None):
+    return SimpleNamespace(sr=sr, in_sr=in_sr or sr, first_perf=first, clock=clock, frame_bytes=lambda: 2)
+
+
+def _block(a, n):
+    return (np.arange(a, a + n) % 30000).astype("<i2").tobytes()
+
+
+def test_pads_start_to_shared_timeline():
+    inner = ListSink()
+    s = AlignedSink(inner, _track(first=10.25), t0=10.0)
+    s.write(_block(1, 100))
+    out = inner.frames()
+    assert len(out) == 350
+    assert not out[:250].any() and np.array_equal(out[250:], np.arange(1, 101))
+    assert s.stats()["offset_frames"] == 250
+
+
+def test_no_padding_when_started_before_t0_or_unknown():
+    for first in (9.5, None):
+        inner = ListSink()
+        AlignedSink(inner, _track(first=first), t0=10.0).write(_block(0, 10))
+        assert len(inner.frames()) == 10
+
+
+def test_no_correction_without_baseline():
+    inner = ListSink()
+    track = _track(first=0.0, clock=(1000, 1.0))
+    s = AlignedSink(inner, track, t0=0.0)
+    for i in range(10):
+        s.write(_block(i * 100, 100))
+    st = s.stats()
+    assert st["inserted_frames"] == st["dropped_frames"] == 0 and st["frames_out"] == 1000
+
+
+def _drift(measured_rate):
+    sr = 1000
+    inner = ListSink()
+    span = DRIFT_MIN_SECONDS * 2
+    track = _track(sr=sr, first=0.0, clock=(int(measured_rate * span), span))
+    s = AlignedSink(inner, track, t0=0.0)
+    n, blocks = 1000, 60
+    for i in range(blocks):
+        s.write(_block(i * n, n))
+    return s, inner, n, blocks
+
+
+def test_slow_device_inserts_frames_with_per_block_limit():
+    s, inner, n, blocks = _drift(999.0)                # 慢 1000 ppm
+    st = s.stats()
+    assert st["dropped_frames"] == 0
+    assert 0 < st["inserted_frames"] <= blocks * max(1, int(n * MAX_CORRECTION))
+    assert len(inner.frames()) == st["frames_out"] == n * blocks + st["inserted_frames"]
+    assert abs(st["frames_out"] - round(n * blocks * s.ratio)) <= 1
+    assert st["drift_ppm"] < 0
+
+
+def test_fast_device_drops_frames():
+    s, inner, n, blocks = _drift(1001.0)
+    st = s.stats()
+    assert st["inserted_frames"] == 0 and st["dropped_frames"] > 0
+    assert len(inner.frames()) == n * blocks - st["dropped_frames"]
+    assert abs(st["frames_out"] - round(n * blocks * s.ratio)) <= 1
+
+
+def test_merge_tracks_side_by_side_with_progress(tmp_path):
+    d = tmp_path / "audio_tracks"; d.mkdir()
+    a = np.arange(1000) % 300 + 1
+    b = np.stack([-np.arange(600), np.arange(600)], axis=1)
+    write_wav(str(d / track_name(0)), a, 8000)
+    write_wav(str(d / track_name(1)), b, 8000)
+    out = str(tmp_path / "multi.wav")
+    seen = []
+    merge_tracks(str(d), out, chunk_frames=256, progress=lambda done, total: seen.append((done, total)))
+    assert seen[-1] == (1000, 1000) and len(seen) == 4
+    frames, sr, ch = open_frames(out)
+    x = np.array(frames[0:len(frames)])
+    assert (sr, ch, len(x)) == (8000, 3, 1000)
+    assert np.array_equal(x[:, 0], a)
+    assert np.array_equal(x[:600, 1:], b) and not x[600:, 1:].any()      # 短的轨补零
+
+    ev = threading.Event(); ev.set()
+    out2 = str(tmp_path / "cancelled.wav")
+    with pytest.raises(RuntimeError):
+        merge_tracks(str(d), out2, stop_event=ev)
+    assert not os.path.exists(out2) and not os.path.exists(out2 + ".tmp")
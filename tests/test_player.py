@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+import pytest
+
+from recordtype.player import WavPlayer
+
+from .conftest import write_wav
+
+SR = 8000
+BLOCK = 400                 # 每次回调的帧数
+
+
+@pytest.fixture
+def player(tmp_path):
+    p = WavPlayer(write_wav(str(tmp_path / "a.wav"), np.arange(SR) % 20000 + 1, SR))   # 1 秒，没有 0 样本
+    yield p
+    p.close()
+
+
+def _pull(p, frames=BLOCK):
+    """像 PortAudio 一样调用一次回调，返回输出的样本。"""
+    out = bytearray(frames * 2)
+    p._callback(out, frames, None, None)
+    return np.frombuffer(bytes(out), "<i2")
+
+
+def _wait_for(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > end:
+            raise AssertionError("timeout")
+        time.sleep(0.002)
+
+
+def _play_to_end(p):
+    p.play()
+    end = time.monotonic() + 5.0
+    while p.is_playing():
+        assert time.monotonic() < end
+        _pull(p); time.sleep(0.001)
+
+
+def _first_sound(p):
+    """播放开始后第一段非静音输出的首个样本。"""
+    end = time.monotonic() + 2.0
+    while time.monotonic() < end:
+        x = _pull(p)
+        if x.any():
+            return int(x[np.flatnonzero(x)[0]])
+        time.sleep(0.002)
+    raise AssertionError("no output")
+
+
+def test_plays_whole_file_then_stops(player):
+    player.play()
+    got = []
+    while player.is_playing():
+        x = _pull(player); got.append(x[x != 0]); time.sleep(0.001)
+    assert np.array_equal(np.concatenate(got), np.arange(SR) % 20000 + 1)
+
+
+def test_play_after_eof_restarts_from_beginning(player):
+    _play_to_end(player)
+    player.play()
+    assert _first_sound(player) == 1
+
+
+def test_seek_after_eof_is_kept(player):
+    _play_to_end(player)
+    player.seek(0.5)
+    player.play()
+    assert _first_sound(player) == SR // 2 + 1
+    _wait_for(lambda: player.current_time() >= 0.5)
+
+
+def test_seek_while_playing(player):
+    player.play()
+    _first_sound(player)
+    player.seek(0.25)
+    _wait_for(lambda: player._flush_req == player._gen)     # 渲染线程已请求清空旧数据
+    assert _first_sound(player) == SR // 4 + 1
+
+
+def test_seek_clamps_to_duration(player):
+    player.seek(5.0)
+    assert player._seek_frame == SR
+    player.seek(-1.0)
+    assert player._seek_frame == 0 and player.current_time() == 0.0
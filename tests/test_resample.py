@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from recordtype.resample import Resampler, downmix
+
+
+def _run(r, x, sizes):
+    out, a = [], 0
+    for n in sizes:
+        out.append(r.process(x[a:a + n])); a += n
+    out.append(r.process(x[a:]))
+    return np.concatenate(out)
+
+
+@pytest.mark.parametrize("rates", [(48000, 44100), (44100, 48000), (44100, 16000), (16000, 44100)])
+def test_chunked_matches_one_shot(rng, rates):
+    x = rng.integers(-20000, 20000, size=(9000, 2)).astype(np.int16)
+    whole = Resampler(*rates, 2, 1).process(x)
+    sizes = rng.integers(0, 700, size=30)
+    assert np.array_equal(_run(Resampler(*rates, 2, 1), x, sizes), whole)
+
+
+@pytest.mark.parametrize("rates", [(48000, 44100), (44100, 16000), (22050, 44100)])
+def test_output_length_and_dc_gain(rates):
+    src, dst = rates
+    x = np.full((src, 1), 10000, np.int16)            # 1 秒直流
+    r = Resampler(src, dst, 1, 1)
+    y = r.process(x)
+    assert abs(len(y) - dst) <= 1
+    assert y.dtype == np.dtype("<i2") and y.flags.c_contiguous
+    mid = y[len(y) // 4: 3 * len(y) // 4, 0]
+    assert np.abs(mid.astype(np.int32) - 10000).max() <= 2
+    assert r.stats()["frames_in"] == src
+
+
+def test_tone_survives_resampling():
+    src, dst, f = 48000, 44100, 440.0
+    t = np.arange(src) / src
+    x = (8000 * np.sin(2 * np.pi * f * t)).astype(np.int16)[:, None]
+    y = Resampler(src, dst, 1, 1).process(x)[:, 0].astype(np.float64)
+    y = y[2000:len(y) - 2000]                         # 去掉首尾的滤波器过渡
+    spec = np.abs(np.fft.rfft(y * np.hanning(len(y))))
+    peak = np.argmax(spec) * dst / len(y)
+    assert abs(peak - f) < 2.0
+    assert abs(np.sqrt(np.mean(y ** 2)) - 8000 / np.sqrt(2)) < 60     # 通带内增益约为 1
+
+
+def test_passthrough_and_channel_conversion(rng):
+    x = rng.integers(-32768, 32768, size=(500, 2)).astype(np.int16)
+    assert Resampler(44100, 44100, 2, 2).passthrough
+    assert np.array_equal(Resampler(44100, 44100, 2, 2).process(x), x)
+    mono = Resampler(44100, 44100, 2, 1).process(x)
+    assert np.array_equal(mono[:, 0], np.rint(x.astype(np.float32).mean(axis=1)).astype(np.int16))
+    assert Resampler(44100, 44100, 2, 1).process(x[:0]).shape == (0, 1)
+
+
+def test_downmix_upmixes_by_cycling():
+    x = np.array([[1], [2]], np.int16)
+    assert np.array_equal(downmix(x, 2), np.array([[1, 1], [2, 2]], np.float32))
@@ -0,0 +1,16 @@
+from recordtype.search import _locate
+
+
+def test_locate_prefers_whole_phrase():
+    assert _locate("Alpha beta Gamma", "beta gamma") == (6, 10)
+
+
+def test_locate_falls_back_to_first_token_length():
+    clean = "会议纪要：预算讨论"
+    assert _locate("one two three", "two zzz") == (4, 3)
+    assert _locate(clean, "预算 明年") == (5, 2)
+
+
+def test_locate_nothing_found():
+    assert _locate("hello", "zzz") == (0, 0)
+    assert _locate("hello", "   ") == (0, 0)
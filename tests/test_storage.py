@@ -0,0 +1,22 @@
+import sqlite3
+
+import pytest
+
+from recordtype.storage import _LIKE_FILTER, _like_pattern
+
+NAMES = ["100% done", "100 done", "a_b", "axb", "back\\slash", "backslash", "plain"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("%", ["100% done"]),
+    ("_", ["a_b"]),
+    ("\\", ["back\\slash"]),
+    ("0% d", ["100% done"]),
+    ("DONE", ["100% done", "100 done"]),       # LIKE 对 ASCII 不区分大小写
+])
+def test_library_filter_matches_literally(text, expected):
+    con = sqlite3.connect(":memory:")
+    con.execute("CREATE TABLE sessions (name TEXT, preview TEXT)")
+    con.executemany("INSERT INTO sessions VALUES (?, '')", [(n,) for n in NAMES])
+    sql = "SELECT name FROM sessions WHERE 1" + _LIKE_FILTER
+    assert [r[0] for r in con.execute(sql, [_like_pattern(text)] * 2)] == expected